@@ -1,9 +1,15 @@
+import sys
 import streamlit as st
 import pandas as pd
 import plotly.graph_objects as go
 from pathlib import Path
 
-FORECAST_PATH = Path("data/exports/forecast_output.csv")
+# `streamlit run app/app.py` only puts app/ on sys.path
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from src.etl.forecast_store import ForecastStore, format_thousands
+from src.etl.forecast_paths import MANIFEST_NAME
+from src.etl.storage import FORECAST_CSV_PATH, FORECAST_DIR, FORECAST_PATH
 
 st.set_page_config(
     page_title="EduPredict",
@@ -13,15 +19,23 @@ st.set_page_config(
 
 # ── Load Data ──────────────────────────────────────────────────────────────────
 
-@st.cache_data
-def load_forecasts() -> pd.DataFrame:
-    if not FORECAST_PATH.exists():
-        st.error("Forecast data not found. Run `python src/models/predict.py` first.")
+# cache_resource shares one store, which holds only the selector catalog,
+# across reruns and sessions
+@st.cache_resource
+def load_store() -> ForecastStore:
+    if not any(p.exists() for p in (FORECAST_PATH, FORECAST_CSV_PATH, FORECAST_DIR / MANIFEST_NAME)):
+        st.error("Forecast data not found. Run `python -m src.etl.predict` first.")
         st.stop()
-    return pd.read_csv(FORECAST_PATH)
+    return ForecastStore.load()
+
 
+store = load_store()
 
-df = load_forecasts()
+
+# Each rerun reads one country and horizon from disk, or reuses a recent read
+@st.cache_data(max_entries=256)
+def select(country: str, horizon: int) -> pd.DataFrame:
+    return store.select(country, horizon)
 
 # ── Sidebar Controls ───────────────────────────────────────────────────────────
 
@@ -29,11 +43,10 @@ st.sidebar.title("🎓 EduPredict")
 st.sidebar.markdown("Global Enrollment Forecasting System")
 st.sidebar.divider()
 
-regions = sorted(df["region"].dropna().unique())
+regions = store.regions
 selected_regions = st.sidebar.multiselect("Region", regions, default=regions[:2])
 
-filtered_countries = df[df["region"].isin(selected_regions)]["country_name"].dropna().unique()
-selected_country = st.sidebar.selectbox("Country", sorted(filtered_countries))
+selected_country = st.sidebar.selectbox("Country", store.countries(selected_regions))
 
 scenario = st.sidebar.selectbox(
     "Scenario",
@@ -44,7 +57,7 @@ horizon = st.sidebar.selectbox("Forecast Horizon (years)", [5, 10, 15], index=1)
 
 # ── Filter ─────────────────────────────────────────────────────────────────────
 
-view = df[(df["country_name"] == selected_country) & (df["horizon"] == horizon)]
+view = select(selected_country, horizon)
 
 # ── Header ─────────────────────────────────────────────────────────────────────
 
@@ -69,7 +82,7 @@ scenarios_to_plot = (
 )
 
 for s in scenarios_to_plot:
-    s_data = view[view["scenario"] == s].sort_values("forecast_year")
+    s_data = view[view["scenario"] == s]
     if s_data.empty:
         continue
     line_color = COLORS[s]["line"]
@@ -116,13 +129,12 @@ else:
         ["forecast_year", "predicted_enrollment", "lower_bound", "upper_bound"]
     ]
 
-table_data = table_data.sort_values("forecast_year")
+table_data = table_data.sort_values("forecast_year", kind="stable")
+table_data = table_data.assign(**{
+    col: format_thousands(table_data[col]) for col in ["predicted_enrollment", "lower_bound", "upper_bound"]
+})
 table_data.columns = [c.replace("_", " ").title() for c in table_data.columns]
 
-for col in ["Predicted Enrollment", "Lower Bound", "Upper Bound"]:
-    if col in table_data.columns:
-        table_data[col] = table_data[col].apply(lambda x: f"{x:,.0f}")
-
 st.dataframe(table_data, use_container_width=True, hide_index=True)
 
 # ── Export ─────────────────────────────────────────────────────────────────────
@@ -0,0 +1,110 @@
+import asyncio
+from collections import Counter, OrderedDict
+
+from app.metrics import BATCH_ROWS
+
+
+class MicroBatcher:
+    """Coalesce concurrent async requests into batched calls of a blocking function.
+
+    submit(group, item) queues the item and waits for its result. The first
+    item to reach an idle batcher opens a window of `window` seconds; then
+    everything queued, up to max_rows rows, goes to run(group, items) in a
+    worker thread, one call per group, and each waiting request is resolved
+    with its own result. Results are kept in an LRU cache of cache_size
+    entries, and concurrent submits of the same item share one computation.
+    Both are keyed by group_key(group), so a cached result does not keep a
+    superseded group, e.g. a reloaded model, alive.
+
+    Batches run one at a time, so the model's own thread pool is never
+    contended by parallel requests; requests arriving meanwhile queue up
+    for the next batch. A batch that fails, wherever it fails, fails each
+    of its requests with the exception and the next batch runs as usual.
+    """
+
+    def __init__(self, name: str, run, window: float, max_rows: int, rows=lambda item: 1, cache_size: int = 1024,
+                 group_key=lambda group: group):
+        self.name, self.run, self.window, self.max_rows, self.rows = name, run, window, max_rows, rows
+        self.cache_size, self.group_key = cache_size, group_key
+        self.stats = Counter()
+        self._cache = OrderedDict()
+        self._loop = None
+
+    async def submit(self, group, item):
+        key = (self.group_key(group), item)
+        if key in self._cache:
+            self._cache.move_to_end(key)
+            self.stats["hit"] += 1
+            return self._cache[key]
+
+        self._bind_loop()
+        future = self._pending.get(key)
+        if future is None:
+            rows = self.rows(item)
+            self.stats["miss"] += 1
+            future = self._pending[key] = self._loop.create_future()
+            self._queue.append((key, group, rows))
+            self._wakeup.set()
+        else:
+            self.stats["shared"] += 1
+        # Shielded: a client disconnecting must not cancel a result others wait for
+        return await asyncio.shield(future)
+
+    def _bind_loop(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is loop:
+            return
+        # First use, or a new event loop (test clients, repeated asyncio.run): start over on it
+        self._loop = loop
+        self._pending, self._queue = {}, []
+        self._wakeup = asyncio.Event()
+        self._worker = loop.create_task(self._drain())
+
+    def _next_batch(self) -> tuple:
+        batch, total = [], 0
+        while self._queue and (not batch or total + self._queue[0][2] <= self.max_rows):
+            key, group, rows = self._queue.pop(0)
+            batch.append((key, group))
+            total += rows
+        return batch, total
+
+    async def _drain(self) -> None:
+        while True:
+            await self._wakeup.wait()
+            await asyncio.sleep(self.window)
+            batch, rows = self._next_batch()
+            if not self._queue:
+                self._wakeup.clear()
+            try:
+                BATCH_ROWS.observe(rows, batcher=self.name)
+                await self._run_batch(batch)
+            except Exception as e:
+                # Requests already resolved are no longer pending
+                for key, _ in batch:
+                    future = self._pending.pop(key, None)
+                    if future is not None and not future.done():
+                        future.set_exception(e)
+            # Idle until the next batch without pinning this one's groups
+            del batch
+
+    async def _run_batch(self, batch: list) -> None:
+        groups = {}
+        for (group_key, item), group in batch:
+            groups.setdefault(group_key, (group, []))[1].append(item)
+        for group_key, (group, items) in groups.items():
+            try:
+                results = await asyncio.to_thread(self.run, group, items)
+                if len(results) != len(items):
+                    raise ValueError(f"{self.name}: run returned {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for item in items:
+                    self._pending.pop((group_key, item)).set_exception(e)
+                continue
+            for item, result in zip(items, results):
+                self._store((group_key, item), result)
+                self._pending.pop((group_key, item)).set_result(result)
+
+    def _store(self, key, result) -> None:
+        self._cache[key] = result
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
@@ -0,0 +1,117 @@
+import csv
+import io
+import numpy as np
+import orjson
+
+from src.etl.forecast_paths import long_columns
+from src.etl.predict import BASE_YEAR
+
+# Same layout as the nightly forecast_output export
+COLUMNS = [
+    "country_code", "country_name", "region", "forecast_year", "horizon",
+    "predicted_enrollment", "lower_bound", "upper_bound", "model_version", "scenario",
+]
+BOUND_COLUMNS = ["lower_bound", "upper_bound"]
+TEXT_COLUMNS = {"country_code", "country_name", "region", "model_version", "scenario"}
+
+
+def forecast_columns(state, paths: np.ndarray, version: str, positions: np.ndarray, scenarios: list,
+                     scenario_index: list, horizons: list, lower=None, upper=None) -> dict:
+    """Forecast rows of the countries at positions as {column: array}, one block per (country, scenario).
+
+    Each horizon block lists its years 1..horizon, like the nightly export.
+    lower and upper, shaped (countries, scenarios, steps), are optional.
+    """
+    return long_columns(
+        state.codes[positions], state.names[positions], state.regions[positions], scenarios, BASE_YEAR, horizons,
+        version, paths[positions][:, scenario_index], lower, upper,
+    )
+
+
+# ── Encoders ───────────────────────────────────────────────────────────────────
+# start() -> bytes, encode(columns) -> bytes per chunk, finish() -> bytes
+
+class CsvEncoder:
+    media_type = "text/csv"
+    extension = "csv"
+
+    def __init__(self, columns: list):
+        self.columns = columns
+        self._buffer = io.StringIO()
+        self._writer = csv.writer(self._buffer, lineterminator="\n")
+
+    def _flush(self) -> bytes:
+        data = self._buffer.getvalue().encode()
+        self._buffer.seek(0)
+        self._buffer.truncate()
+        return data
+
+    def start(self) -> bytes:
+        self._writer.writerow(self.columns)
+        return self._flush()
+
+    def encode(self, columns: dict) -> bytes:
+        self._writer.writerows(zip(*(columns[name].tolist() for name in self.columns)))
+        return self._flush()
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class NdjsonEncoder:
+    media_type = "application/x-ndjson"
+    extension = "ndjson"
+
+    def __init__(self, columns: list):
+        self.columns = columns
+
+    def start(self) -> bytes:
+        return b""
+
+    def encode(self, columns: dict) -> bytes:
+        rows = zip(*(columns[name].tolist() for name in self.columns))
+        return b"".join(orjson.dumps(dict(zip(self.columns, row)), option=orjson.OPT_APPEND_NEWLINE) for row in rows)
+
+    def finish(self) -> bytes:
+        return b""
+
+
+class ArrowEncoder:
+    """Arrow IPC stream format: one record batch per chunk."""
+
+    media_type = "application/vnd.apache.arrow.stream"
+    extension = "arrows"
+    TYPES = {"forecast_year": "int16", "horizon": "int8"}
+
+    def __init__(self, columns: list):
+        import pyarrow as pa
+
+        self.pa = pa
+        self.schema = pa.schema([
+            pa.field(name, self.TYPES.get(name, "int64") if name not in TEXT_COLUMNS else pa.string())
+            for name in columns
+        ])
+        self._sink = io.BytesIO()
+        self._writer = None
+
+    def _flush(self) -> bytes:
+        data = self._sink.getvalue()
+        self._sink.seek(0)
+        self._sink.truncate()
+        return data
+
+    def start(self) -> bytes:
+        self._writer = self.pa.ipc.new_stream(self._sink, self.schema)
+        return self._flush()
+
+    def encode(self, columns: dict) -> bytes:
+        arrays = [self.pa.array(columns[f.name], type=f.type) for f in self.schema]
+        self._writer.write_batch(self.pa.record_batch(arrays, schema=self.schema))
+        return self._flush()
+
+    def finish(self) -> bytes:
+        self._writer.close()
+        return self._flush()
+
+
+ENCODERS = {"csv": CsvEncoder, "ndjson": NdjsonEncoder, "arrow": ArrowEncoder}
@@ -1,56 +1,227 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import JSONResponse, ORJSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, model_validator
 from typing import Literal, List
-import pandas as pd
-import numpy as np
-import joblib
+from contextlib import asynccontextmanager
+import asyncio
+from dataclasses import dataclass
+from functools import cached_property
+import hashlib
+import json
+import os
+import threading
 from pathlib import Path
+import numpy as np
 from loguru import logger
 
-MODEL_PATH = Path("src/models/saved/edupredict_v1.pkl")
-DATA_PATH = Path("data/processed/enrollment_ml_ready.csv")
+from src.etl.base_state import BASE_COLUMNS, BaseState, latest_rows
+from src.etl.predict import (
+    BASE_YEAR,
+    HORIZONS,
+    INFERENCE_BACKEND,
+    SCENARIOS,
+    SIM_CHUNK_ROWS,
+    SIM_PATHS,
+    load_model,
+    load_residuals,
+    project_batch,
+    project_grid,
+    simulate_requests,
+)
+from src.etl.storage import LATEST_STATE_PATH, PROCESSED_CSV_PATH, PROCESSED_PATH, load_processed
+from src.etl import snapshot
+from src.etl.telemetry import METRICS, Collector
+from app.batching import MicroBatcher
+from app.export import BOUND_COLUMNS, COLUMNS, ENCODERS, forecast_columns
+from app.metrics import MetricsMiddleware
+from src.models import registry
 
-BASE_YEAR = 2024
-FEATURES = [
-    "year_index", "enrollment_lag1", "enrollment_lag3", "enrollment_rolling3",
-    "gdp_per_capita_log", "edu_expenditure_lag1", "population_school_age", "region_encoded",
-]
-SCENARIOS = {
-    "baseline":    {"gdp_growth": 0.0,   "edu_adj": 0.0},
-    "optimistic":  {"gdp_growth": 0.015, "edu_adj": 0.005},
-    "pessimistic": {"gdp_growth": -0.01, "edu_adj": -0.003},
-}
+SCENARIO_INDEX = {name: i for i, name in enumerate(SCENARIOS)}
+MAX_HORIZON = 15
+MAX_SIM_PATHS = 10_000
+# Upper bound on countries x grid points evaluated by one sweep request
+MAX_SWEEP_ROWS = 200_000
+RELOAD_INTERVAL_SECONDS = 5.0
+# Countries per chunk of a /forecasts stream
+EXPORT_CHUNK_COUNTRIES = 64
+# How long the first uncached /predict interval waits for others to share its batch
+BATCH_WINDOW_SECONDS = float(os.getenv("EDUPREDICT_BATCH_WINDOW_MS", "2")) / 1000
 
-app = FastAPI(
-    title="EduPredict API",
-    description="ML-powered global education enrollment forecasting.",
-    version="1.2.0",
+# ── Load resources at startup ──────────────────────────────────────────────────
+
+# eq=False: two Resources are the same only if they are the same object, not equal arrays
+@dataclass(frozen=True, eq=False)
+class Resources:
+    """Everything a request needs, swapped as one object when the model changes.
+
+    base_state and paths are attached read-only from a shared snapshot, so
+    only the first worker to start on a new model or data file pays for
+    projecting them. With the compiled backend the snapshot also holds the
+    model's node arrays and every worker evaluates those shared maps;
+    otherwise each worker unpickles its own copy of the model, lazily.
+    """
+
+    version: str
+    key: tuple
+    base_state: BaseState
+    paths: np.ndarray
+    shared_model: object = None
+
+    @cached_property
+    def model(self):
+        if self.shared_model is not None:
+            return self.shared_model
+        return load_model(version=self.version)[0]
+
+    @cached_property
+    def residuals(self):
+        return load_residuals(self.model, registry.resolve(self.version)[1])
+
+    def warm(self) -> None:
+        """Load the model and residuals now instead of on the first uncached interval."""
+        self.model, self.residuals
+
+    @property
+    def warmed(self) -> bool:
+        return "model" in self.__dict__ and "residuals" in self.__dict__
+
+
+def interval_bounds(res: Resources, items: list) -> list:
+    """Simulated (lower, upper) paths up to MAX_HORIZON for each (position, scenario, n_paths) item."""
+    bounds = simulate_requests(
+        res.base_state, res.model, [(pos, SCENARIOS[scenario], n) for pos, scenario, n in items],
+        MAX_HORIZON, res.residuals,
+    )
+    return [(lower.tolist(), upper.tolist()) for lower, upper in bounds]
+
+
+# Concurrent cache misses are simulated together, one predict call per step for the whole batch
+intervals = MicroBatcher(
+    "intervals", interval_bounds, BATCH_WINDOW_SECONDS, SIM_CHUNK_ROWS, rows=lambda item: item[2],
+    # The content key (model, data and config hashes): cached intervals must not pin reloaded models
+    group_key=lambda res: res.key,
 )
 
-# ── Load resources at startup ──────────────────────────────────────────────────
 
-model = None
-base_df = None
+resources = None
+# Why the last attempt to load resources failed, reported by /ready
+load_error = None
+_stop_watcher = threading.Event()
+
+
+def serving_config_hash() -> str:
+    # The backend decides whether the snapshot carries the model
+    config = json.dumps([BASE_YEAR, MAX_HORIZON, SCENARIOS, INFERENCE_BACKEND], sort_keys=True)
+    return hashlib.sha256(config.encode()).hexdigest()
+
+
+def base_state_source() -> Path:
+    """The ETL's prebuilt latest state, unless it is missing or older than the processed table."""
+    data_path = PROCESSED_PATH if PROCESSED_PATH.exists() else PROCESSED_CSV_PATH
+    if LATEST_STATE_PATH.exists() and (
+        not data_path.exists() or LATEST_STATE_PATH.stat().st_mtime >= data_path.stat().st_mtime
+    ):
+        return LATEST_STATE_PATH
+    logger.warning(f"{LATEST_STATE_PATH} is missing or stale, deriving the latest state from {data_path}")
+    return data_path
+
+
+def load_base_state(source: Path) -> BaseState:
+    if source == LATEST_STATE_PATH:
+        return BaseState.load(source)
+    return BaseState.from_frame(latest_rows(load_processed(BASE_COLUMNS)))
+
+
+def build_resources(version: str | None = None) -> Resources:
+    _, metadata = registry.resolve(version)
+    version = metadata["version"]
+    source = base_state_source()
+    key = (metadata["hash"], registry.file_hash(source), serving_config_hash())
+
+    def build() -> tuple:
+        model, _ = load_model(version=version)
+        state = load_base_state(source)
+        return state, project_batch(state, model, SCENARIOS, MAX_HORIZON), {"version": version}, model
+
+    base_state, paths, _, model = snapshot.load_or_build(key, build)
+    return Resources(version, key, base_state, paths, model)
+
+
+def watch_registry() -> None:
+    """Swap in the registry's current model whenever the CURRENT pointer moves.
+
+    Also retries loading while nothing could be loaded at start-up.
+    """
+    while not _stop_watcher.wait(RELOAD_INTERVAL_SECONDS):
+        global resources, load_error
+        version = registry.current_version()
+        if resources is not None and version in (None, resources.version):
+            continue
+        try:
+            new = build_resources(version)
+            # Warm before swapping so no request waits for the new model to load
+            new.warm()
+            resources, load_error = new, None
+            logger.success(f"Loaded model {new.version}")
+        except Exception as e:
+            load_error = str(e)
+            logger.error(f"Loading model {version or 'default'} failed, keeping the previous state: {e}")
+
+
+def warm(res: Resources) -> None:
+    global load_error
+    try:
+        res.warm()
+        logger.success(f"Model {res.version} loaded.")
+    except Exception as e:
+        load_error = str(e)
+        logger.error(f"Loading model {res.version} failed: {e}")
 
 
-@app.on_event("startup")
 def load_resources():
-    global model, base_df
+    """Attach the serving snapshot and load the model in the background.
+
+    A failure is logged and reported by /ready; the registry watcher keeps retrying.
+    """
+    global resources, load_error
     try:
-        model = joblib.load(MODEL_PATH)
-        df = pd.read_csv(DATA_PATH)
-        base_df = df.sort_values("year").groupby("country_code").last().reset_index()
-        logger.success("Model and data loaded successfully.")
+        resources = build_resources()
+        logger.success(f"Serving snapshot for model {resources.version} attached.")
+        threading.Thread(target=warm, args=(resources,), name="model-warmup", daemon=True).start()
     except Exception as e:
+        load_error = str(e)
         logger.error(f"Startup error: {e}")
+    _stop_watcher.clear()
+    threading.Thread(target=watch_registry, name="registry-watcher", daemon=True).start()
+
+
+def stop_watcher():
+    _stop_watcher.set()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    load_resources()
+    yield
+    stop_watcher()
+
+
+app = FastAPI(
+    title="EduPredict API",
+    description="ML-powered global education enrollment forecasting.",
+    version="1.2.0",
+    lifespan=lifespan,
+)
+app.add_middleware(MetricsMiddleware)
 
 
 # ── Schemas ────────────────────────────────────────────────────────────────────
 
 class PredictRequest(BaseModel):
-    country_code: str = Field(..., example="USA", description="ISO 3166-1 alpha-3 code")
+    country_code: str = Field(..., example="US", description="ISO 3166-1 alpha-2 code, as in the processed data")
     horizon: Literal[5, 10, 15] = Field(10, description="Forecast horizon in years")
-    scenario: Literal["baseline", "optimistic", "pessimistic"] = "baseline"
+    scenario: Literal[tuple(SCENARIOS)] = "baseline"
+    n_paths: int = Field(SIM_PATHS, ge=100, le=MAX_SIM_PATHS, description="Monte Carlo paths for the interval")
 
 
 class ForecastPoint(BaseModel):
@@ -67,65 +238,212 @@ class PredictResponse(BaseModel):
     scenario: str
     horizon: int
     forecasts: List[ForecastPoint]
-    model_version: str = "v1.2.0"
+    model_version: str
+
+
+class SweepRequest(BaseModel):
+    country_codes: List[str] = Field(default_factory=list, example=["US", "FR"])
+    region: str | None = Field(None, description="Sweep every country in this region instead")
+    gdp_growth: List[float] = Field(..., min_length=1, example=[-0.01, 0.0, 0.01, 0.02])
+    edu_adj: List[float] = Field(..., min_length=1, example=[-0.003, 0.0, 0.005])
+    horizon: int = Field(MAX_HORIZON, ge=1, le=MAX_HORIZON)
+
+    @model_validator(mode="after")
+    def one_selection(self):
+        if bool(self.country_codes) == (self.region is not None):
+            raise ValueError("Provide either country_codes or region.")
+        return self
+
+
+class SweepResponse(BaseModel):
+    """One row per (country, grid point); predicted_enrollment[i] is row i's path over forecast_years."""
+
+    model_version: str
+    forecast_years: List[int]
+    country_code: List[str]
+    gdp_growth: List[float]
+    edu_adj: List[float]
+    predicted_enrollment: List[List[float]]
+
+
+# ── Metrics ────────────────────────────────────────────────────────────────────
+
+METRICS.register(Collector(
+    "edupredict_model_info",
+    "Model version currently served.",
+    "gauge",
+    ("version",),
+    lambda: [((resources.version,), 1)] if resources is not None else [],
+))
+METRICS.register(Collector(
+    "edupredict_interval_cache_requests_total",
+    "Lookups of the simulated-interval cache by result.",
+    "counter",
+    ("result",),
+    lambda: [((result,), intervals.stats[result]) for result in ("hit", "miss", "shared")],
+))
 
 
 # ── Endpoints ──────────────────────────────────────────────────────────────────
 
 @app.get("/health")
 def health():
-    return {"status": "ok", "model_loaded": model is not None}
+    return {
+        "status": "ok",
+        "model_loaded": resources is not None,
+        "model_version": resources.version if resources is not None else None,
+    }
+
+
+@app.get("/ready")
+def ready():
+    """200 once the serving snapshot is attached and the model loaded, 503 until then."""
+    res = resources
+    snapshot_loaded = res is not None
+    model_loaded = snapshot_loaded and res.warmed
+    return JSONResponse(
+        {
+            "ready": model_loaded,
+            "snapshot_loaded": snapshot_loaded,
+            "model_loaded": model_loaded,
+            "model_version": res.version if snapshot_loaded else None,
+            "error": load_error,
+        },
+        status_code=200 if model_loaded else 503,
+    )
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def metrics():
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 
 @app.post("/predict", response_model=PredictResponse)
-def predict(req: PredictRequest):
-    if model is None or base_df is None:
+async def predict(req: PredictRequest):
+    # Read the shared reference once so a concurrent hot reload cannot mix versions
+    res = resources
+    if res is None:
         raise HTTPException(status_code=503, detail="Model not loaded.")
 
-    row = base_df[base_df["country_code"] == req.country_code.upper()]
-    if row.empty:
+    pos = res.base_state.lookup(req.country_code)
+    if pos is None:
         raise HTTPException(status_code=404, detail=f"Country '{req.country_code}' not found.")
 
-    row = row.iloc[0]
-    scenario_params = SCENARIOS[req.scenario]
-
-    prev_enrollment = row["enrollment_total"]
-    rolling_vals = [prev_enrollment] * 3
-    gdp_log = float(row.get("gdp_per_capita_log", np.log1p(10000)))
-    edu_exp = float(row.get("edu_expenditure_lag1", 4.0))
-
-    forecasts = []
-    for step in range(1, req.horizon + 1):
-        year = BASE_YEAR + step
-        gdp_log += scenario_params["gdp_growth"]
-        edu_exp += scenario_params["edu_adj"]
-
-        feat = {
-            "year_index": year - 1970,
-            "enrollment_lag1": rolling_vals[-1],
-            "enrollment_lag3": rolling_vals[-3],
-            "enrollment_rolling3": np.mean(rolling_vals[-3:]),
-            "gdp_per_capita_log": gdp_log,
-            "edu_expenditure_lag1": edu_exp,
-            "population_school_age": float(row.get("population_school_age", 1e7)),
-            "region_encoded": int(row.get("region_encoded", 0)),
-        }
-        X = pd.DataFrame([feat])[FEATURES]
-        pred = float(model.predict(X)[0])
-        rolling_vals.append(pred)
-
-        forecasts.append(ForecastPoint(
-            forecast_year=year,
-            predicted_enrollment=round(pred),
-            lower_bound=round(pred * 0.92),
-            upper_bound=round(pred * 1.08),
-        ))
-
-    return PredictResponse(
-        country_code=row["country_code"],
-        country_name=str(row.get("country_name", "")),
-        region=str(row.get("region", "")),
-        scenario=req.scenario,
-        horizon=req.horizon,
-        forecasts=forecasts,
+    path = np.round(res.paths[pos, SCENARIO_INDEX[req.scenario], :req.horizon]).tolist()
+    lower, upper = await intervals.submit(res, (pos, req.scenario, req.n_paths))
+
+    # Built as plain dicts in the PredictResponse shape and encoded by orjson,
+    # instead of validating one ForecastPoint model per year
+    return ORJSONResponse({
+        "country_code": res.base_state.codes[pos],
+        "country_name": res.base_state.names[pos],
+        "region": res.base_state.regions[pos],
+        "scenario": req.scenario,
+        "horizon": req.horizon,
+        "forecasts": [
+            {
+                "forecast_year": BASE_YEAR + step,
+                "predicted_enrollment": pred,
+                "lower_bound": float(round(lo)),
+                "upper_bound": float(round(hi)),
+            }
+            for step, pred, lo, hi in zip(range(1, req.horizon + 1), path, lower, upper)
+        ],
+        "model_version": res.version,
+    })
+
+
+@app.post("/scenarios/sweep", response_model=SweepResponse)
+def sweep(req: SweepRequest):
+    """Evaluate the full gdp_growth x edu_adj grid for the selected countries in one batch."""
+    res = resources
+    if res is None:
+        raise HTTPException(status_code=503, detail="Model not loaded.")
+
+    state = res.base_state
+    if req.region is not None:
+        positions = np.flatnonzero(state.regions == req.region)
+        if len(positions) == 0:
+            raise HTTPException(status_code=404, detail=f"Region '{req.region}' not found.")
+    else:
+        positions = [state.lookup(code) for code in req.country_codes]
+        missing = [code for code, pos in zip(req.country_codes, positions) if pos is None]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"Countries not found: {', '.join(missing)}.")
+        positions = np.asarray(positions)
+
+    n_pairs = len(req.gdp_growth) * len(req.edu_adj)
+    if len(positions) * n_pairs > MAX_SWEEP_ROWS:
+        raise HTTPException(
+            status_code=422,
+            detail=f"Sweep of {len(positions)} countries x {n_pairs} grid points exceeds {MAX_SWEEP_ROWS:,} rows.",
+        )
+
+    gdp_growth = np.repeat(req.gdp_growth, len(req.edu_adj))
+    edu_adj = np.tile(req.edu_adj, len(req.gdp_growth))
+    paths = project_grid(state, res.model, gdp_growth, edu_adj, req.horizon, positions=positions)
+
+    # The payload is already columnar and typed, so skip re-validating every cell
+    return ORJSONResponse({
+        "model_version": res.version,
+        "forecast_years": list(range(BASE_YEAR + 1, BASE_YEAR + req.horizon + 1)),
+        "country_code": np.repeat(state.codes[positions], n_pairs).tolist(),
+        "gdp_growth": np.tile(gdp_growth, len(positions)).tolist(),
+        "edu_adj": np.tile(edu_adj, len(positions)).tolist(),
+        "predicted_enrollment": np.round(paths.reshape(-1, req.horizon)).tolist(),
+    })
+
+
+@app.get("/forecasts")
+def forecasts(
+    fmt: Literal[tuple(ENCODERS)] = Query("csv", alias="format", description="csv, ndjson or arrow (IPC stream)"),
+    region: str | None = None,
+    scenario: Literal[tuple(SCENARIOS)] | None = None,
+    horizon: int | None = Query(None, description=f"One of {HORIZONS}; all of them if omitted"),
+    include_bounds: bool = Query(False, description="Simulate Monte Carlo bounds, as /predict does"),
+    n_paths: int = Query(SIM_PATHS, ge=100, le=MAX_SIM_PATHS),
+):
+    """Stream the forecasts of every selected country in the nightly export's layout.
+
+    Rows are produced and encoded a chunk of countries at a time, so memory
+    stays flat however many rows are sent.
+    """
+    res = resources
+    if res is None:
+        raise HTTPException(status_code=503, detail="Model not loaded.")
+
+    if horizon is not None and horizon not in HORIZONS:
+        raise HTTPException(status_code=422, detail=f"horizon must be one of {HORIZONS}.")
+    state = res.base_state
+    positions = np.arange(len(state)) if region is None else np.flatnonzero(state.regions == region)
+    if region is not None and len(positions) == 0:
+        raise HTTPException(status_code=404, detail=f"Region '{region}' not found.")
+    scenarios = list(SCENARIOS) if scenario is None else [scenario]
+    scenario_index = [SCENARIO_INDEX[s] for s in scenarios]
+    horizons = HORIZONS if horizon is None else [horizon]
+
+    encoder = ENCODERS[fmt]([c for c in COLUMNS if include_bounds or c not in BOUND_COLUMNS])
+    chunk = EXPORT_CHUNK_COUNTRIES
+    if include_bounds:
+        # Keep each chunk's simulation within one interval batch
+        chunk = max(1, min(chunk, SIM_CHUNK_ROWS // (len(scenarios) * n_paths)))
+
+    async def stream():
+        yield encoder.start()
+        for start in range(0, len(positions), chunk):
+            idx = positions[start:start + chunk]
+            lower = upper = None
+            if include_bounds:
+                bounds = await asyncio.gather(*(
+                    intervals.submit(res, (int(pos), s, n_paths)) for pos in idx for s in scenarios
+                ))
+                lower, upper = np.array(bounds).reshape(len(idx), len(scenarios), 2, MAX_HORIZON).transpose(2, 0, 1, 3)
+            yield encoder.encode(
+                forecast_columns(state, res.paths, res.version, idx, scenarios, scenario_index, horizons, lower, upper)
+            )
+        yield encoder.finish()
+
+    filename = f"forecasts-{res.version}.{encoder.extension}"
+    return StreamingResponse(
+        stream(), media_type=encoder.media_type, headers={"Content-Disposition": f'attachment; filename="{filename}"'},
     )
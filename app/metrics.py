@@ -0,0 +1,46 @@
+import time
+
+from src.etl.telemetry import METRICS, Histogram
+
+REQUEST_SECONDS = METRICS.register(Histogram(
+    "edupredict_http_request_duration_seconds",
+    "HTTP request latency by route template, method and status.",
+    labels=("route", "method", "status"),
+))
+BATCH_ROWS = METRICS.register(Histogram(
+    "edupredict_batch_rows",
+    "Model rows per micro-batch, by batcher.",
+    labels=("batcher",),
+    buckets=(100, 500, 1000, 2000, 5000, 10_000, 20_000, 50_000, 100_000, 200_000),
+))
+
+
+class MetricsMiddleware:
+    """Plain ASGI middleware timing every HTTP request into REQUEST_SECONDS.
+
+    Requests are labelled with the matched route template (e.g. /predict),
+    never the raw path, so label cardinality stays bounded.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            route = getattr(scope.get("route"), "path", "unmatched")
+            REQUEST_SECONDS.observe(time.perf_counter() - start, route=route, method=scope["method"], status=status)
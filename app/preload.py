@@ -0,0 +1,15 @@
+# Build the serving snapshot once before starting several API workers:
+#   python -m app.preload && uvicorn app.main:app --workers 4
+import argparse
+from loguru import logger
+
+from app.main import build_resources
+from src.etl.snapshot import snapshot_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prebuild the API's shared serving snapshot")
+    parser.add_argument("--version", default=None, help="Model version (default: current)")
+    args = parser.parse_args()
+
+    res = build_resources(args.version)
+    logger.success(f"Snapshot for model {res.version} ready in {snapshot_path(res.key)}")
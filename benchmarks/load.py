@@ -0,0 +1,77 @@
+import argparse
+import asyncio
+import json
+import time
+import httpx
+import numpy as np
+
+
+def request_mix(codes: list, n: int, seed: int = 0) -> list:
+    """A reproducible sequence of /predict bodies over the given country codes."""
+    rng = np.random.default_rng(seed)
+    scenarios = np.array(["baseline", "optimistic", "pessimistic"])
+    return [
+        {"country_code": str(code), "scenario": str(scenario), "horizon": int(horizon)}
+        for code, scenario, horizon in zip(
+            rng.choice(codes, n), rng.choice(scenarios, n), rng.choice([5, 10, 15], n)
+        )
+    ]
+
+
+async def run_load(client: httpx.AsyncClient, bodies: list, concurrency: int, path: str = "/predict") -> dict:
+    """Send bodies from `concurrency` concurrent workers; latency percentiles and throughput."""
+    queue = asyncio.Queue()
+    for body in bodies:
+        queue.put_nowait(body)
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        while not queue.empty():
+            body = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post(path, json=body)
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    p50, p95, p99 = np.percentile(np.array(latencies) * 1000, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "concurrency": concurrency,
+        "p50_ms": float(p50),
+        "p95_ms": float(p95),
+        "p99_ms": float(p99),
+        "rps": len(latencies) / elapsed,
+    }
+
+
+def load_in_process(app, codes: list, n: int, concurrency: int, seed: int = 0) -> dict:
+    """Drive an ASGI app directly, without sockets or a server process."""
+    async def main():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            return await run_load(client, request_mix(codes, n, seed), concurrency)
+    return asyncio.run(main())
+
+
+def load_url(url: str, codes: list, n: int, concurrency: int, seed: int = 0) -> dict:
+    async def main():
+        limits = httpx.Limits(max_connections=concurrency)
+        async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+            return await run_load(client, request_mix(codes, n, seed), concurrency)
+    return asyncio.run(main())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load-test a running EduPredict API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--countries", nargs="+", default=["USA", "BRA", "IND", "DEU", "NGA"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    print(json.dumps(load_url(args.url, args.countries, args.requests, args.concurrency), indent=2))
@@ -0,0 +1,163 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from loguru import logger
+
+from benchmarks.load import load_in_process
+from benchmarks.synthetic import synthetic_raw
+from src.etl import pipeline, predict, snapshot, storage, telemetry
+from src.models import registry, train
+
+BASELINE_DIR = Path("benchmarks/baselines")
+# Relative slowdown (or throughput drop) tolerated before a metric is flagged
+DEFAULT_TOLERANCE = 0.25
+# Metrics where larger is better; every other numeric metric is a cost
+HIGHER_IS_BETTER = {"rps"}
+
+
+@contextmanager
+def sandbox(root: Path):
+    """Re-root every relative Path constant of the pipeline modules under root.
+
+    Benchmarks then read and write synthetic data, models, snapshots and
+    forecasts there and never touch the repository's own files.
+    """
+    import app.main
+
+    patched = []
+    for module in (storage, pipeline, predict, snapshot, telemetry, registry, train, app.main):
+        for name, value in vars(module).items():
+            if isinstance(value, Path) and not value.is_absolute():
+                patched.append((module, name, value))
+                setattr(module, name, root / value)
+    try:
+        yield
+    finally:
+        for module, name, value in patched:
+            setattr(module, name, value)
+
+
+def timed(fn, repeat: int = 1) -> tuple:
+    """(result of the last call, {"seconds": best, "median_seconds": median}) over repeat calls."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return result, {"seconds": times[0], "median_seconds": times[len(times) // 2]}
+
+
+def run_suite(countries: int, years: int, repeat: int, n_paths: int, requests: int, concurrency: int) -> dict:
+    results = {}
+    raw = synthetic_raw(countries, years)
+
+    cleaned, results["pipeline.clean"] = timed(lambda: pipeline.clean(raw.copy()), repeat)
+    processed, results["pipeline.engineer_features"] = timed(lambda: pipeline.engineer_features(cleaned), repeat)
+    _, results["pipeline.transform"] = timed(lambda: pipeline.transform(raw.copy()), repeat)
+    # Peak allocations of the fused chain relative to its input, output included
+    frame = raw.copy()
+    with telemetry.traced_peak() as peak:
+        pipeline.transform(frame)
+    results["pipeline.transform"]["peak_multiple"] = peak["bytes"] / frame.memory_usage(deep=True).sum()
+    storage.write_table(processed, storage.PROCESSED_PATH, storage.PROCESSED_SCHEMA, csv_path=storage.PROCESSED_CSV_PATH)
+    pipeline.save_latest_state(storage.LATEST_STATE_PATH)
+
+    train_df, val_df, _ = train.split(train.load_data())
+    model, results["train.train"] = timed(lambda: train.train(train_df))
+    _, results["train.train_sharded"] = timed(lambda: train.train_sharded(train_df, workers=os.cpu_count() or 1))
+    val = train.evaluate(model, val_df, "Validation")
+    registry.register(model, {
+        "val_residuals": val["residuals"].tolist(),
+        "val_predictions": val["predictions"].tolist(),
+    })
+
+    _, results["predict.run"] = timed(lambda: predict.run(n_paths=n_paths))
+    _, results["predict.run_compact"] = timed(lambda: predict.run(n_paths=n_paths, compact=True, legacy=False))
+
+    import app.main
+    app.main.load_resources()
+    app.main.stop_watcher()
+    codes = list(app.main.resources.base_state.codes)
+    # The first pass simulates intervals for each new (country, scenario); the second is served from cache
+    results["api.predict_cold"] = load_in_process(app.main.app, codes, requests, concurrency)
+    results["api.predict"] = load_in_process(app.main.app, codes, requests, concurrency)
+    return results
+
+
+def baseline_path(countries: int, years: int) -> Path:
+    return BASELINE_DIR / f"{countries}x{years}.json"
+
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list:
+    """Human-readable regressions of current against baseline beyond tolerance."""
+    regressions = []
+    for name, metrics in baseline["results"].items():
+        for metric, base in metrics.items():
+            new = current["results"].get(name, {}).get(metric)
+            if new is None or not base or metric in ("requests", "errors", "concurrency"):
+                continue
+            change = new / base - 1
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append(f"{name}.{metric}: {base:.4g} -> {new:.4g} ({change:+.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the EduPredict ETL, training, forecasting and API")
+    parser.add_argument("--countries", type=int, default=500)
+    parser.add_argument("--years", type=int, default=34)
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions of the fast ETL steps (best is reported)")
+    parser.add_argument("--paths", type=int, default=200, help="Monte Carlo paths for predict.run")
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--out", type=Path, default=None, help="Also write results JSON here")
+    parser.add_argument("--save-baseline", action="store_true", help="Store results as the baseline for this scale")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if slower than the baseline for this scale")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE)
+    args = parser.parse_args()
+
+    logger.remove()
+    logger.add(sys.stderr, level="WARNING")
+
+    with tempfile.TemporaryDirectory() as tmp, sandbox(Path(tmp)):
+        results = run_suite(args.countries, args.years, args.repeat, args.paths, args.requests, args.concurrency)
+
+    report = {
+        "meta": {
+            "countries": args.countries,
+            "years": args.years,
+            "paths": args.paths,
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpus": os.cpu_count(),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+    print(json.dumps(report, indent=2))
+    baseline = baseline_path(args.countries, args.years)
+    outputs = [p for p in (args.out, baseline if args.save_baseline else None) if p is not None]
+    for path in outputs:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2) + "\n")
+        logger.success(f"Results written to {path}")
+
+    if args.check:
+        reference = json.loads(baseline.read_text())
+        if reference["meta"]["cpus"] != report["meta"]["cpus"]:
+            logger.warning(f"Baseline was recorded on {reference['meta']['cpus']} CPUs, this machine has {report['meta']['cpus']}")
+        regressions = compare(report, reference, args.tolerance)
+        for line in regressions:
+            logger.error(f"Regression: {line}")
+        if regressions:
+            sys.exit(1)
+        logger.success(f"No regressions beyond {args.tolerance:.0%} against {baseline}")
@@ -0,0 +1,74 @@
+import argparse
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from loguru import logger
+
+from src.etl.feature_engineering import REGION_MAP
+from src.etl.pipeline import clean, engineer_features
+
+# Series end where the real data does, so every scale has validation and test years
+LAST_YEAR = 2023
+# Share of values blanked in the columns the cleaning step imputes or tolerates
+MISSING_RATE = {"gdp_per_capita_usd": 0.05, "gov_edu_expenditure_pct": 0.15, "literacy_rate": 0.3}
+
+
+def synthetic_raw(n_countries: int, n_years: int, seed: int = 0) -> pd.DataFrame:
+    """Raw-schema panel of n_countries x n_years with plausible scales and trends."""
+    rng = np.random.default_rng(seed)
+    n = n_countries * n_years
+    country = np.repeat(np.arange(n_countries), n_years)
+    year = np.tile(np.arange(LAST_YEAR - n_years + 1, LAST_YEAR + 1), n_countries)
+    t = year - year.min()
+
+    # Country-level scale and drift, with yearly noise on top
+    population = np.exp(rng.uniform(np.log(1e5), np.log(1.4e9), n_countries))[country]
+    population *= (1 + rng.normal(0.012, 0.008, n_countries)[country]) ** t
+    school_share = rng.uniform(0.25, 0.45, n_countries)[country]
+    enrolled_share = np.clip(rng.uniform(0.4, 0.95, n_countries)[country] + 0.004 * t + rng.normal(0, 0.01, n), 0.05, 1.1)
+    school_age = population * school_share
+    enrollment = school_age * enrolled_share
+    split = rng.dirichlet([6, 4, 1.5], n_countries)[country]
+    gdp = np.exp(rng.uniform(np.log(300), np.log(90_000), n_countries))[country]
+    gdp *= np.exp(np.cumsum(rng.normal(0.02, 0.04, (n_countries, n_years)), axis=1).ravel())
+
+    regions = np.array(list(REGION_MAP))
+    df = pd.DataFrame({
+        "country_code": np.char.add("C", np.char.zfill(country.astype(str), 5)),
+        "country_name": np.char.add("Country ", country.astype(str)),
+        "year": year,
+        "enrollment_primary": enrollment * split[:, 0],
+        "enrollment_secondary": enrollment * split[:, 1],
+        "enrollment_tertiary": enrollment * split[:, 2],
+        "population_total": population,
+        "gdp_per_capita_usd": gdp,
+        "gov_edu_expenditure_pct": np.clip(rng.normal(4.5, 1.2, n_countries)[country] + rng.normal(0, 0.2, n), 0.5, 15),
+        "literacy_rate": np.clip(rng.uniform(40, 100, n_countries)[country] + 0.3 * t, 0, 100),
+        "enrollment_total": enrollment,
+        "region": regions[rng.integers(len(regions), size=n_countries)][country],
+        "population_school_age": school_age,
+    })
+    for column, rate in MISSING_RATE.items():
+        df.loc[rng.random(n) < rate, column] = np.nan
+    return df
+
+
+def synthetic_processed(n_countries: int, n_years: int, seed: int = 0) -> pd.DataFrame:
+    """Same panel run through the ETL steps, i.e. with the enrollment_ml_ready schema."""
+    return engineer_features(clean(synthetic_raw(n_countries, n_years, seed)))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic EduPredict dataset")
+    parser.add_argument("--countries", type=int, default=1000)
+    parser.add_argument("--years", type=int, default=34)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--raw", action="store_true", help="Write the raw schema instead of the processed one")
+    parser.add_argument("--out", type=Path, required=True)
+    args = parser.parse_args()
+
+    make = synthetic_raw if args.raw else synthetic_processed
+    df = make(args.countries, args.years, args.seed)
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(args.out, index=False)
+    logger.success(f"Wrote {len(df):,} rows to {args.out}")
@@ -1,8 +1,20 @@
-import pandas as pd, urllib.request, json
+import argparse, hashlib, json, os, time, urllib.error, urllib.request
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-OUT = Path("data/raw/enrollment_raw.csv")
-OUT.parent.mkdir(parents=True, exist_ok=True)
+from src.etl.storage import RAW_PATH
+
+OUT = RAW_PATH
+CACHE_DIR = Path("data/raw/.cache/worldbank")
+BASE_URL = os.getenv("WORLD_BANK_API", "https://api.worldbank.org/v2")
+DATE_RANGE = "1990:2023"
+PER_PAGE = 1000
+MAX_CONCURRENCY = 8
+RETRIES = 3
+BACKOFF_SECONDS = 1.0
+CACHE_MAX_AGE = 24 * 3600  # pages younger than this are reused without a request
+KEYS = ["country_code", "country_name", "iso3_code", "year"]
 
 INDICATORS = {
     "SE.PRM.ENRL": "enrollment_primary",
@@ -35,40 +47,99 @@ REGIONS = {
     "IRQ":"Middle East & North Africa","JOR":"Middle East & North Africa","LBN":"Middle East & North Africa",
 }
 
-def fetch(code, name):
-    print(f"  Fetching {name}...")
-    records, page = [], 1
-    while True:
-        url = f"https://api.worldbank.org/v2/country/all/indicator/{code}?format=json&per_page=1000&page={page}&date=1990:2023"
+def page_url(base_url, code, page):
+    return f"{base_url}/country/all/indicator/{code}?format=json&per_page={PER_PAGE}&page={page}&date={DATE_RANGE}"
+
+def get_page(base_url, code, page, max_age=CACHE_MAX_AGE):
+    """Fetch one API page through the on-disk cache.
+
+    Fresh cached pages are returned without a request, stale ones are
+    revalidated with ETag / Last-Modified, and a page that still fails after
+    RETRIES attempts falls back to its cached copy (or raises if there is none).
+    Pages are cached under a hash of their full URL, so another API root,
+    date range or page size never reuses them.
+    """
+    url = page_url(base_url, code, page)
+    path = CACHE_DIR / code / f"page_{page}-{hashlib.sha256(url.encode()).hexdigest()[:16]}.json"
+    cached = json.loads(path.read_text()) if path.exists() else None
+    if cached and time.time() - cached["fetched_at"] < max_age:
+        return cached["body"]
+
+    req = urllib.request.Request(url)
+    if cached and cached.get("etag"): req.add_header("If-None-Match", cached["etag"])
+    if cached and cached.get("last_modified"): req.add_header("If-Modified-Since", cached["last_modified"])
+
+    error = None
+    for attempt in range(RETRIES):
         try:
-            with urllib.request.urlopen(url, timeout=30) as r:
-                data = json.loads(r.read())
-        except Exception as e:
-            print(f"    error: {e}"); break
-        if not data or len(data) < 2 or not data[1]: break
-        for item in data[1]:
-            if item.get("value") is not None:
-                records.append({"country_code": item["country"]["id"], "country_name": item["country"]["value"], "year": int(item["date"]), name: float(item["value"])})
-        if page >= data[0].get("pages", 1): break
-        page += 1
-    print(f"    {len(records):,} records")
-    return pd.DataFrame(records)
-
-dfs = []
-for code, name in INDICATORS.items():
-    df = fetch(code, name)
-    if not df.empty:
-        dfs.append(df.set_index(["country_code","country_name","year"]))
-
-combined = dfs[0]
-for df in dfs[1:]:
-    combined = combined.join(df, how="outer")
-combined = combined.reset_index()
-
-cols = [c for c in ["enrollment_primary","enrollment_secondary","enrollment_tertiary"] if c in combined.columns]
-combined["enrollment_total"] = combined[cols].sum(axis=1, min_count=1)
-combined["region"] = combined["country_code"].map(REGIONS).fillna("Other")
-combined["population_school_age"] = combined["population_total"] * 0.28
-combined = combined.dropna(subset=["enrollment_total"])
-combined.to_csv(OUT, index=False)
-print(f"\nDone! {len(combined):,} rows saved to {OUT}")
+            with urllib.request.urlopen(req, timeout=30) as r:
+                entry = {"fetched_at": time.time(), "etag": r.headers.get("ETag"),
+                         "last_modified": r.headers.get("Last-Modified"), "body": json.loads(r.read())}
+            break
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached:
+                entry = {**cached, "fetched_at": time.time()}; break
+            if e.code < 500 and e.code != 429: raise
+            error = e
+        except (urllib.error.URLError, TimeoutError, json.JSONDecodeError) as e:
+            error = e
+        time.sleep(BACKOFF_SECONDS * 2 ** attempt)
+    else:
+        if cached:
+            print(f"    {code} page {page}: {error}; using cached copy")
+            return cached["body"]
+        raise RuntimeError(f"{code} page {page} failed after {RETRIES} attempts: {error}")
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(entry))
+    tmp.replace(path)
+    return entry["body"]
+
+def n_pages(body):
+    return body[0].get("pages", 1) if body and len(body) >= 2 and body[1] else 0
+
+def to_frame(name, bodies):
+    records = [
+        {"country_code": item["country"]["id"], "country_name": item["country"]["value"],
+         "iso3_code": item.get("countryiso3code") or "", "year": int(item["date"]), name: float(item["value"])}
+        for body in bodies if n_pages(body) for item in body[1] if item.get("value") is not None
+    ]
+    print(f"  {name}: {len(records):,} records")
+    return pd.DataFrame(records, columns=KEYS + [name])
+
+def fetch_all(base_url=BASE_URL, workers=MAX_CONCURRENCY, max_age=CACHE_MAX_AGE):
+    """Fetch every page of every indicator with at most `workers` requests in flight."""
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        first = dict(zip(INDICATORS, pool.map(lambda code: get_page(base_url, code, 1, max_age), INDICATORS)))
+        rest = [(code, page) for code, body in first.items() for page in range(2, n_pages(body) + 1)]
+        bodies = {code: [body] for code, body in first.items()}
+        for (code, _), body in zip(rest, pool.map(lambda cp: get_page(base_url, *cp, max_age), rest)):
+            bodies[code].append(body)
+
+    frames = [to_frame(name, bodies[code]) for code, name in INDICATORS.items()]
+    # One outer join across all indicators on the full key
+    combined = pd.concat([f.set_index(KEYS) for f in frames if not f.empty], axis=1, join="outer")
+    return combined.reset_index()
+
+def build(combined):
+    cols = [c for c in ["enrollment_primary","enrollment_secondary","enrollment_tertiary"] if c in combined.columns]
+    combined["enrollment_total"] = combined[cols].sum(axis=1, min_count=1)
+    combined["region"] = combined["country_code"].map(REGIONS).fillna("Other")
+    combined["population_school_age"] = combined["population_total"] * 0.28
+    return combined.dropna(subset=["enrollment_total"])
+
+def run(base_url=BASE_URL, workers=MAX_CONCURRENCY, refresh=False):
+    print("Fetching indicators...")
+    combined = build(fetch_all(base_url, workers, max_age=0 if refresh else CACHE_MAX_AGE))
+    OUT.parent.mkdir(parents=True, exist_ok=True)
+    combined.to_csv(OUT, index=False)
+    print(f"\nDone! {len(combined):,} rows saved to {OUT}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download World Bank indicators into the raw EduPredict dataset")
+    parser.add_argument("--base-url", default=BASE_URL, help="API root, e.g. a local replay server")
+    parser.add_argument("--workers", type=int, default=MAX_CONCURRENCY, help="Maximum concurrent requests")
+    parser.add_argument("--refresh", action="store_true", help="Revalidate every cached page")
+    args = parser.parse_args()
+    run(args.base_url, args.workers, args.refresh)
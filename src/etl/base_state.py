@@ -0,0 +1,120 @@
+import os
+import numpy as np
+from dataclasses import dataclass
+from pathlib import Path
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Mapping
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# Fallbacks used when the processed data lacks a forecast input column
+FIELD_DEFAULTS = {
+    "gdp_per_capita_log": np.log1p(10000),
+    "edu_expenditure_lag1": 4.0,
+    "population_school_age": 1e7,
+    "region_encoded": 0,
+}
+
+# Alternative country identifiers accepted by BaseState.lookup when present
+ALIAS_COLUMNS = ["iso3_code"]
+
+BASE_COLUMNS = ["country_code", "country_name", "region", "year", "enrollment_total", *FIELD_DEFAULTS, *ALIAS_COLUMNS]
+
+TEXT_FIELDS = ["codes", "names", "regions"]
+NUMERIC_FIELDS = ["enrollment_total", *FIELD_DEFAULTS]
+
+
+def latest_rows(df: "pd.DataFrame") -> "pd.DataFrame":
+    """Most recent non-null value of every column per country."""
+    return df.sort_values("year").groupby("country_code", observed=True).last().reset_index()
+
+
+@dataclass(frozen=True)
+class BaseState:
+    """Immutable struct-of-arrays view of the latest row per country.
+
+    Row i of every array describes the country at position i, and
+    `positions` maps upper-cased codes and aliases to that position, so a
+    lookup is a single dict access and never touches pandas.
+    """
+
+    codes: np.ndarray
+    names: np.ndarray
+    regions: np.ndarray
+    enrollment_total: np.ndarray
+    gdp_per_capita_log: np.ndarray
+    edu_expenditure_lag1: np.ndarray
+    population_school_age: np.ndarray
+    region_encoded: np.ndarray
+    positions: Mapping[str, int]
+
+    @classmethod
+    def from_frame(cls, df: "pd.DataFrame") -> "BaseState":
+        def text(name: str) -> np.ndarray:
+            if name not in df.columns:
+                return np.full(len(df), "", dtype=object)
+            return df[name].astype(str).to_numpy(dtype=object)
+
+        def numeric(name: str) -> np.ndarray:
+            if name not in df.columns:
+                return np.full(len(df), FIELD_DEFAULTS[name], dtype=np.float64)
+            return np.ascontiguousarray(df[name].to_numpy(dtype=np.float64))
+
+        codes = text("country_code")
+        positions = {}
+        for column in ALIAS_COLUMNS:
+            if column in df.columns:
+                for pos, alias in enumerate(df[column]):
+                    if isinstance(alias, str) and alias:
+                        positions[alias.upper()] = pos
+        # Primary codes win over any alias that happens to collide with them
+        positions.update((code.upper(), pos) for pos, code in enumerate(codes))
+
+        arrays = {
+            "codes": codes,
+            "names": text("country_name"),
+            "regions": text("region"),
+            "enrollment_total": np.ascontiguousarray(df["enrollment_total"].to_numpy(dtype=np.float64)),
+            **{name: numeric(name) for name in FIELD_DEFAULTS},
+        }
+        for arr in arrays.values():
+            arr.flags.writeable = False
+        return cls(**arrays, positions=MappingProxyType(positions))
+
+    def to_arrays(self) -> dict:
+        """Plain arrays, text as fixed-width unicode, that from_arrays rebuilds the state from."""
+        arrays = {name: getattr(self, name).astype(str) for name in TEXT_FIELDS}
+        arrays.update({name: getattr(self, name) for name in NUMERIC_FIELDS})
+        arrays["position_keys"] = np.array(list(self.positions), dtype=str)
+        arrays["position_values"] = np.array(list(self.positions.values()), dtype=np.int64)
+        return arrays
+
+    @classmethod
+    def from_arrays(cls, arrays: Mapping[str, np.ndarray]) -> "BaseState":
+        """Inverse of to_arrays; numeric arrays are used as given, e.g. memory-mapped."""
+        fields = {name: np.asarray(arrays[name]).astype(object) for name in TEXT_FIELDS}
+        fields.update({name: arrays[name] for name in NUMERIC_FIELDS})
+        for arr in fields.values():
+            arr.flags.writeable = False
+        positions = dict(zip(arrays["position_keys"].tolist(), arrays["position_values"].tolist()))
+        return cls(**fields, positions=MappingProxyType(positions))
+
+    def save(self, path: Path) -> None:
+        """Write the state to an .npz archive, replacing any previous one atomically."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+        with open(tmp, "wb") as f:
+            np.savez(f, **self.to_arrays())
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BaseState":
+        with np.load(path) as archive:
+            return cls.from_arrays({name: archive[name] for name in archive.files})
+
+    def __len__(self) -> int:
+        return len(self.codes)
+
+    def lookup(self, code: str) -> int | None:
+        return self.positions.get(code.strip().upper())
@@ -7,4 +7,8 @@ class DataLoader:
 
     def load_csv(self, filename):
         path = self.raw_path / filename
-        return pd.read_csv(path)
\ No newline at end of file
+        return pd.read_csv(path)
+
+    def iter_csv(self, filename, chunksize=200_000):
+        path = self.raw_path / filename
+        yield from pd.read_csv(path, chunksize=chunksize)
\ No newline at end of file
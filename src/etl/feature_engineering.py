@@ -1,8 +1,76 @@
+import numpy as np
 import pandas as pd
 
+from src.etl.transformers import Chain, RowFilter, Transformer, shift_within
+
+REGION_MAP = {
+    "North America": "NAM",
+    "Latin America & Caribbean": "LAC",
+    "Europe & Central Asia": "ECA",
+    "Middle East & North Africa": "MENA",
+    "Sub-Saharan Africa": "SSA",
+    "South Asia": "SAS",
+    "East Asia & Pacific": "EAP",
+}
+
+REGION_ENCODE = {v: i for i, v in enumerate(REGION_MAP.values())}
+
+
+def _enrollment_rate(df: pd.DataFrame) -> None:
+    population = df["population_school_age"].to_numpy(dtype=np.float64)
+    df["enrollment_rate"] = df["enrollment_total"].to_numpy(dtype=np.float64) / np.where(population == 0, np.nan, population)
+
+
+def _gdp_log(df: pd.DataFrame) -> None:
+    df["gdp_per_capita_log"] = np.log1p(df["gdp_per_capita_usd"].to_numpy(dtype=np.float64))
+
+
+def _year_index(df: pd.DataFrame) -> None:
+    df["year_index"] = df["year"] - 1970
+
+
+def _enrollment_lags(df: pd.DataFrame) -> None:
+    enrollment = df["enrollment_total"].to_numpy(dtype=np.float64)
+    countries = df["country_code"].to_numpy()
+    df["enrollment_lag1"] = shift_within(enrollment, countries, 1)
+    df["enrollment_lag3"] = shift_within(enrollment, countries, 3)
+    # Mean of the previous (up to) three years
+    rolling = df.groupby("country_code", sort=False)["enrollment_total"].rolling(3, min_periods=1).mean()
+    df["enrollment_rolling3"] = shift_within(rolling.to_numpy(), countries, 1)
+
+
+def _expenditure_lag(df: pd.DataFrame) -> None:
+    df["edu_expenditure_lag1"] = shift_within(
+        df["gov_edu_expenditure_pct"].to_numpy(dtype=np.float64), df["country_code"].to_numpy(), 1
+    )
+
+
+def _encode_region(df: pd.DataFrame) -> None:
+    df["region_code"] = df["region"].map(REGION_MAP).fillna("UNK")
+    df["region_encoded"] = df["region_code"].map(REGION_ENCODE).fillna(-1).astype(int)
+
+
+def _usable(df: pd.DataFrame) -> np.ndarray:
+    # Rows that still can't be used for training
+    return (df["enrollment_lag1"].notna() & df["gdp_per_capita_log"].notna()).to_numpy()
+
+
 class FeatureEngineer:
-    def create_features(self, df: pd.DataFrame):
-        df = df.copy()
-        if 'study_hours' in df.columns and 'attendance' in df.columns:
-            df['engagement_score'] = df['study_hours'] * 0.6 + df['attendance'] * 0.4
-        return df
\ No newline at end of file
+    """Model features of cleaned data as a Chain; rows without a lag or GDP are dropped."""
+
+    def __init__(self):
+        self.chain = Chain("features", [
+            Transformer("enrollment_rate", ("enrollment_total", "population_school_age"), ("enrollment_rate",),
+                        _enrollment_rate),
+            Transformer("gdp_log", ("gdp_per_capita_usd",), ("gdp_per_capita_log",), _gdp_log),
+            Transformer("year_index", ("year",), ("year_index",), _year_index),
+            Transformer("enrollment_lags", ("country_code", "enrollment_total"),
+                        ("enrollment_lag1", "enrollment_lag3", "enrollment_rolling3"), _enrollment_lags),
+            Transformer("expenditure_lag", ("country_code", "gov_edu_expenditure_pct"), ("edu_expenditure_lag1",),
+                        _expenditure_lag),
+            Transformer("encode_region", ("region",), ("region_code", "region_encoded"), _encode_region),
+            RowFilter("drop_unusable", ("enrollment_lag1", "gdp_per_capita_log"), _usable),
+        ])
+
+    def create_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.chain(df)
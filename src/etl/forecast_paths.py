@@ -0,0 +1,253 @@
+import argparse
+import json
+import os
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import TYPE_CHECKING
+import numpy as np
+from loguru import logger
+
+from src.etl.storage import FORECAST_CSV_PATH, FORECAST_DIR, FORECAST_PATH, FORECAST_SCHEMA, apply_schema, write_table
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# ── Compact forecast layout ────────────────────────────────────────────────────
+# One full path per (country, scenario) instead of one row per forecast year:
+#
+#   countries.parquet              country_code, country_name, region
+#   scenario=<name>/paths.parquet  country_code + predicted_enrollment, lower_bound
+#                                  and upper_bound as fixed-length lists of yearly values
+#   manifest.json                  model version, base year, steps, horizons, scenarios
+#
+# Horizons are not stored: horizon h is the first h values of every path.
+MANIFEST_NAME = "manifest.json"
+COUNTRIES_NAME = "countries.parquet"
+PATH_COLUMNS = ["predicted_enrollment", "lower_bound", "upper_bound"]
+
+
+def partition_path(directory: Path, scenario: str) -> Path:
+    return directory / f"scenario={scenario}" / "paths.parquet"
+
+
+def output_files(scenarios: list, directory: Path = FORECAST_DIR) -> list:
+    """Every file of a compact forecast store, manifest first."""
+    return [directory / MANIFEST_NAME, directory / COUNTRIES_NAME,
+            *(partition_path(directory, scenario) for scenario in scenarios)]
+
+
+def _temporary(path: Path) -> Path:
+    return path.with_name(f".{path.name}.tmp")
+
+
+class PathWriter:
+    """Write forecast paths in the compact layout, appending one row group per chunk of countries.
+
+    Chunks arrive in country order, as iter_intervals yields them. Files are
+    written under temporary names and renamed on close, manifest last, so a
+    reader never sees a half-written store.
+    """
+
+    def __init__(self, directory: Path, codes, names, regions, scenarios: list, steps: int, **manifest):
+        self.directory = directory
+        self.codes = np.asarray(codes)
+        self.names = np.asarray(names)
+        self.regions = np.asarray(regions)
+        self.scenarios = list(scenarios)
+        self.steps = steps
+        self.manifest = manifest
+        self.rows = 0
+        self._writers = {}
+
+    def write(self, paths: np.ndarray, lower: np.ndarray, upper: np.ndarray) -> None:
+        """Append the next countries; each array is shaped (countries, scenarios, steps)."""
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        codes = pa.array(self.codes[self.rows:self.rows + len(paths)].astype(str))
+        values = {"predicted_enrollment": paths, "lower_bound": lower, "upper_bound": upper}
+        for s, scenario in enumerate(self.scenarios):
+            columns = [pa.FixedSizeListArray.from_arrays(np.round(values[c][:, s]).astype(np.int64).ravel(), self.steps)
+                       for c in PATH_COLUMNS]
+            table = pa.Table.from_arrays([codes, *columns], names=["country_code", *PATH_COLUMNS])
+            if scenario not in self._writers:
+                path = partition_path(self.directory, scenario)
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # Consecutive years of a path are close, so their deltas pack into a few bits each
+                self._writers[scenario] = pq.ParquetWriter(
+                    _temporary(path), table.schema, compression="zstd", use_dictionary=False,
+                    column_encoding={"country_code": "PLAIN", **dict.fromkeys(PATH_COLUMNS, "DELTA_BINARY_PACKED")},
+                )
+            self._writers[scenario].write_table(table)
+        self.rows += len(paths)
+
+    def close(self) -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        for writer in self._writers.values():
+            writer.close()
+        if self.rows != len(self.codes):
+            # Interrupted: keep whatever complete store was there before
+            for scenario in self._writers:
+                _temporary(partition_path(self.directory, scenario)).unlink(missing_ok=True)
+            logger.warning(f"Compact forecast store not updated: {self.rows:,} of {len(self.codes):,} countries written")
+            return
+
+        countries = pa.table({
+            "country_code": self.codes.astype(str),
+            "country_name": self.names.astype(str),
+            "region": self.regions.astype(str),
+        })
+        pq.write_table(countries, _temporary(self.directory / COUNTRIES_NAME), compression="zstd")
+        manifest = {
+            **self.manifest,
+            "steps": self.steps,
+            "scenarios": self.scenarios,
+            "countries": len(self.codes),
+            "written_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        }
+        _temporary(self.directory / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2) + "\n")
+        for path in output_files(self.scenarios, self.directory)[::-1]:
+            os.replace(_temporary(path), path)
+
+    def __enter__(self) -> "PathWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+@dataclass(frozen=True)
+class ForecastPaths:
+    """A compact forecast store in memory; path arrays are shaped (countries, scenarios, steps)."""
+
+    manifest: dict
+    codes: np.ndarray
+    names: np.ndarray
+    regions: np.ndarray
+    scenarios: list
+    predicted: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+
+    def horizon(self, horizon: int, scenario: str | None = None) -> "pd.DataFrame":
+        """Rows of one horizon in the forecast_output layout, optionally for one scenario."""
+        scenarios = self.scenarios if scenario is None else [scenario]
+        return self.to_frame([horizon], scenarios)
+
+    def to_frame(self, horizons: list | None = None, scenarios: list | None = None) -> "pd.DataFrame":
+        """The forecast_output layout: per country and scenario, one block of years per horizon."""
+        import pandas as pd
+
+        horizons = self.manifest["horizons"] if horizons is None else horizons
+        scenarios = self.scenarios if scenarios is None else scenarios
+        s_idx = [self.scenarios.index(s) for s in scenarios]
+        return pd.DataFrame(long_columns(
+            self.codes, self.names, self.regions, scenarios, self.manifest["base_year"], horizons,
+            self.manifest["model_version"], self.predicted[:, s_idx], self.lower[:, s_idx], self.upper[:, s_idx],
+        ))
+
+
+def long_columns(codes, names, regions, scenarios: list, base_year: int, horizons: list, model_version: str,
+                 predicted: np.ndarray, lower: np.ndarray | None = None, upper: np.ndarray | None = None) -> dict:
+    """Paths in the forecast_output layout as {column: array}, one block per (country, scenario).
+
+    Path arrays are shaped (countries, scenarios, steps) over the given
+    scenarios; each horizon block lists the first `horizon` years of the
+    path. lower and upper are optional.
+    """
+    step_idx = np.concatenate([np.arange(h) for h in horizons])
+    block = len(step_idx)
+    n_blocks = len(codes) * len(scenarios)
+    repeat = len(scenarios) * block
+
+    def values(paths):
+        return np.round(paths[:, :, step_idx]).astype(np.int64).ravel()
+
+    columns = {
+        "country_code": np.repeat(codes, repeat),
+        "country_name": np.repeat(names, repeat),
+        "region": np.repeat(regions, repeat),
+        "forecast_year": np.tile(base_year + 1 + step_idx, n_blocks),
+        "horizon": np.tile(np.repeat(horizons, horizons), n_blocks),
+        "predicted_enrollment": values(predicted),
+    }
+    if lower is not None:
+        columns["lower_bound"] = values(lower)
+        columns["upper_bound"] = values(upper)
+    columns["model_version"] = np.full(block * n_blocks, model_version, dtype=object)
+    columns["scenario"] = np.tile(np.repeat(np.array(scenarios, dtype=object), block), len(codes))
+    return columns
+
+
+def read(directory: Path = FORECAST_DIR, scenarios: list | None = None, codes: list | None = None) -> ForecastPaths:
+    """Load a compact store; only the partitions of `scenarios` (default all) are read,
+    and only the rows of country `codes` (default all) in them."""
+    import pyarrow.parquet as pq
+
+    manifest = json.loads((directory / MANIFEST_NAME).read_text())
+    scenarios = manifest["scenarios"] if scenarios is None else list(scenarios)
+    filters = None if codes is None else [("country_code", "in", list(codes))]
+    countries = pq.read_table(directory / COUNTRIES_NAME, filters=filters)
+    codes = countries["country_code"].to_numpy(zero_copy_only=False)
+    steps = manifest["steps"]
+
+    arrays = {c: np.empty((len(codes), len(scenarios), steps), dtype=np.int64) for c in PATH_COLUMNS}
+    for s, scenario in enumerate(scenarios):
+        table = pq.read_table(partition_path(directory, scenario), filters=filters)
+        rows = _positions(codes, table["country_code"].to_numpy(zero_copy_only=False))
+        for c in PATH_COLUMNS:
+            arrays[c][rows, s] = table[c].combine_chunks().flatten().to_numpy().reshape(-1, steps)
+
+    return ForecastPaths(
+        manifest=manifest,
+        codes=codes,
+        names=countries["country_name"].to_numpy(zero_copy_only=False),
+        regions=countries["region"].to_numpy(zero_copy_only=False),
+        scenarios=scenarios,
+        predicted=arrays["predicted_enrollment"],
+        lower=arrays["lower_bound"],
+        upper=arrays["upper_bound"],
+    )
+
+
+def _positions(codes: np.ndarray, partition_codes: np.ndarray) -> np.ndarray:
+    """Row of the dimension table for every partition row (they are written in the same order)."""
+    if len(codes) == len(partition_codes) and (codes == partition_codes).all():
+        return np.arange(len(codes))
+    lookup = {code: i for i, code in enumerate(codes)}
+    return np.array([lookup[code] for code in partition_codes], dtype=np.intp)
+
+
+def is_current(directory: Path = FORECAST_DIR) -> bool:
+    """Whether the compact store exists and is at least as new as the forecast_output files."""
+    manifest = directory / MANIFEST_NAME
+    if not manifest.exists():
+        return False
+    written = manifest.stat().st_mtime
+    return all(not p.exists() or p.stat().st_mtime <= written for p in (FORECAST_PATH, FORECAST_CSV_PATH))
+
+
+def load_long(columns: list | None = None, directory: Path = FORECAST_DIR) -> "pd.DataFrame":
+    """The compact store as the forecast_output table, with the columnar schema applied."""
+    df = apply_schema(read(directory).to_frame(), FORECAST_SCHEMA)
+    return df if columns is None else df[[c for c in columns if c in df.columns]]
+
+
+def export_legacy(directory: Path = FORECAST_DIR, path: Path = FORECAST_PATH,
+                  csv_path: Path | None = FORECAST_CSV_PATH) -> int:
+    """Write forecast_output.parquet/.csv from the compact store for existing consumers; returns rows."""
+    df = read(directory).to_frame()
+    write_table(df, path, FORECAST_SCHEMA, csv_path=csv_path)
+    return len(df)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the compact forecast store in the forecast_output layout")
+    parser.add_argument("--no-csv", action="store_true", help="Write only the Parquet export")
+    args = parser.parse_args()
+    rows = export_legacy(csv_path=None if args.no_csv else FORECAST_CSV_PATH)
+    logger.success(f"Exported {rows:,} rows from {FORECAST_DIR} to {FORECAST_PATH}"
+                   + ("" if args.no_csv else f" and {FORECAST_CSV_PATH}"))
@@ -0,0 +1,101 @@
+import json
+from pathlib import Path
+import pandas as pd
+
+from src.etl import forecast_paths
+from src.etl.storage import FORECAST_DIR, FORECAST_PATH, FORECAST_SCHEMA, apply_schema, load_forecasts
+
+COLUMNS = [
+    "country_code", "country_name", "region", "scenario", "horizon", "forecast_year",
+    "predicted_enrollment", "lower_bound", "upper_bound", "model_version",
+]
+
+
+class ForecastStore:
+    """Selector catalog of the forecast table; the rows of a selection are read when asked for.
+
+    Only the region and country lists and the scenarios and horizons are
+    kept in memory. select() reads one country and horizon: from the compact
+    store only that country's rows of the wanted scenario partitions, from
+    forecast_output.parquet only the rows matching a pushed-down filter. The
+    CSV export cannot be read selectively, so without Parquet it is loaded
+    once and filtered in memory.
+    """
+
+    def __init__(self, catalog: pd.DataFrame, scenarios: list, horizons: list, read):
+        catalog = catalog[["region", "country_name"]].drop_duplicates().dropna()
+        self.regions = sorted(catalog["region"].astype(str).unique())
+        self.countries_by_region = {
+            region: sorted(names.astype(str)) for region, names in catalog.groupby("region", observed=True)["country_name"]
+        }
+        self.scenarios = [str(s) for s in scenarios]
+        self.horizons = sorted(int(h) for h in horizons)
+        self._read = read  # (country, horizon, scenarios) -> rows in any order
+        self._countries = {}
+
+    @classmethod
+    def load(cls) -> "ForecastStore":
+        # A compact store written after the last forecast_output export is the newer one
+        if forecast_paths.is_current():
+            return cls.from_paths()
+        if FORECAST_PATH.exists():
+            return cls.from_parquet()
+        return cls.from_frame(load_forecasts(COLUMNS))
+
+    @classmethod
+    def from_paths(cls, directory: Path = FORECAST_DIR) -> "ForecastStore":
+        import pyarrow.parquet as pq
+
+        manifest = json.loads((directory / forecast_paths.MANIFEST_NAME).read_text())
+        catalog = pq.read_table(directory / forecast_paths.COUNTRIES_NAME).to_pandas()
+        code_of = dict(zip(catalog["country_name"], catalog["country_code"]))
+
+        def read(country: str, horizon: int, scenarios: list) -> pd.DataFrame:
+            if country not in code_of:
+                return pd.DataFrame(columns=COLUMNS)
+            paths = forecast_paths.read(directory, scenarios, codes=[code_of[country]])
+            return paths.to_frame([horizon])
+
+        return cls(catalog, manifest["scenarios"], manifest["horizons"], read)
+
+    @classmethod
+    def from_parquet(cls, path: Path = FORECAST_PATH) -> "ForecastStore":
+        import pyarrow.parquet as pq
+
+        # Category codes only; the catalog is small once duplicates are dropped
+        catalog = pd.read_parquet(path, columns=["region", "country_name", "scenario", "horizon"])
+        columns = [c for c in COLUMNS if c in pq.read_schema(path).names]
+
+        def read(country: str, horizon: int, scenarios: list) -> pd.DataFrame:
+            filters = [("country_name", "==", country), ("horizon", "==", horizon), ("scenario", "in", scenarios)]
+            return pd.read_parquet(path, columns=columns, filters=filters)
+
+        return cls(catalog, catalog["scenario"].unique(), catalog["horizon"].unique(), read)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "ForecastStore":
+        """A store over a table already in memory, e.g. the CSV export."""
+        def read(country: str, horizon: int, scenarios: list) -> pd.DataFrame:
+            return df[(df["country_name"] == country) & (df["horizon"] == horizon) & df["scenario"].isin(scenarios)]
+
+        return cls(df, df["scenario"].unique(), df["horizon"].unique(), read)
+
+    def countries(self, regions: list) -> list:
+        """Sorted country names in any of regions."""
+        key = tuple(sorted(regions))
+        if key not in self._countries:
+            self._countries[key] = sorted({name for region in key for name in self.countries_by_region.get(region, [])})
+        return self._countries[key]
+
+    def select(self, country: str, horizon: int, scenario: str | None = None) -> pd.DataFrame:
+        """Rows for one country and horizon, optionally one scenario, ordered by scenario and year."""
+        scenarios = self.scenarios if scenario is None else [scenario]
+        df = apply_schema(self._read(country, horizon, scenarios), FORECAST_SCHEMA)
+        df = df[[c for c in COLUMNS if c in df.columns]]
+        df = df.assign(scenario=pd.Categorical(df["scenario"].astype(str), categories=self.scenarios))
+        return df.sort_values(["scenario", "forecast_year"], kind="stable", ignore_index=True)
+
+
+def format_thousands(values: pd.Series) -> pd.Series:
+    """Round and render as '1,234,567' strings; missing values are left blank."""
+    return values.map("{:,.0f}".format, na_action="ignore").fillna("")
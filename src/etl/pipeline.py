@@ -1,22 +1,37 @@
+import argparse
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
 import pandas as pd
 import numpy as np
 from pathlib import Path
 from loguru import logger
 
-RAW_PATH = Path("data/raw/enrollment_raw.csv")
-PROCESSED_PATH = Path("data/processed/enrollment_ml_ready.csv")
+from src.etl.base_state import BASE_COLUMNS, BaseState, latest_rows
+from src.etl import feature_engineering, preprocessing, transformers
+from src.etl.feature_engineering import FeatureEngineer
+from src.etl.preprocessing import Preprocessor, clean_stats
+from src.etl.storage import (
+    LATEST_STATE_PATH,
+    PROCESSED_CSV_PATH,
+    PROCESSED_PATH,
+    PROCESSED_SCHEMA,
+    RAW_PATH,
+    TableWriter,
+    load_processed,
+    write_table,
+)
+from src.etl.telemetry import run_report, span
+from src.etl.transformers import Chain
 
-REGION_MAP = {
-    "North America": "NAM",
-    "Latin America & Caribbean": "LAC",
-    "Europe & Central Asia": "ECA",
-    "Middle East & North Africa": "MENA",
-    "Sub-Saharan Africa": "SSA",
-    "South Asia": "SAS",
-    "East Asia & Pacific": "EAP",
-}
+PARTITION_CACHE_PATH = Path("data/processed/partition_cache.parquet")
+MANIFEST_PATH = Path("data/processed/partition_manifest.json")
 
-REGION_ENCODE = {v: i for i, v in enumerate(REGION_MAP.values())}
+STREAM_CHUNKSIZE = 200_000
+# Cleaned rows of an unfinished series carried into the next chunk: enough for
+# enrollment_lag3 / enrollment_rolling3, and the last one holds the ffilled literacy
+STREAM_CONTEXT_ROWS = 3
 
 
 def load_raw(path: Path) -> pd.DataFrame:
@@ -26,76 +41,321 @@ def load_raw(path: Path) -> pd.DataFrame:
     return df
 
 
-def clean(df: pd.DataFrame) -> pd.DataFrame:
-    logger.info("Cleaning data...")
-
-    # Standardise column names
+def standardise_columns(df: pd.DataFrame) -> pd.DataFrame:
+    # Renamed on a shallow copy, leaving the caller's frame as it was
+    df = df.copy(deep=False)
     df.columns = [c.strip().lower().replace(" ", "_") for c in df.columns]
+    return df
 
-    # Drop rows missing the target
-    before = len(df)
-    df = df.dropna(subset=["enrollment_total"])
-    logger.info(f"Dropped {before - len(df)} rows missing enrollment_total")
 
-    # Cap enrollment outliers at 99th percentile
-    cap = df["enrollment_total"].quantile(0.99)
-    df["enrollment_total"] = df["enrollment_total"].clip(upper=cap)
+def iter_raw(path: Path, chunksize: int = STREAM_CHUNKSIZE):
+    logger.info(f"Streaming raw data from {path} in chunks of {chunksize:,} rows")
+    yield from pd.read_csv(path, chunksize=chunksize)
 
-    # Impute GDP per capita with regional median
-    df["gdp_per_capita_usd"] = df.groupby("region")["gdp_per_capita_usd"].transform(
-        lambda x: x.fillna(x.median())
-    )
 
-    # Forward-fill literacy rate per country
-    df = df.sort_values(["country_code", "year"])
-    df["literacy_rate"] = df.groupby("country_code")["literacy_rate"].ffill()
+def stream_clean_stats(path: Path, chunksize: int = STREAM_CHUNKSIZE) -> dict:
+    """clean_stats() over a file read in chunks, in memory bounded by the chunk size.
 
-    return df
+    The enrollment cap and the regional GDP medians are order statistics.
+    A counting pass gives the rank of each, then every pass narrows a rank
+    down to the values sharing the next 16 leading bits of its sort key,
+    until its candidates fit in one chunk and are collected. The results
+    are exactly those of clean_stats().
+    """
+    header = pd.read_csv(path, nrows=0).columns
+    names = dict(zip(standardise_columns(pd.DataFrame(columns=header)).columns, header))
+    usecols = [names[c] for c in ["enrollment_total", "region", "gdp_per_capita_usd"]]
 
+    def groups():
+        for chunk in pd.read_csv(path, usecols=usecols, chunksize=chunksize):
+            chunk = standardise_columns(chunk)
+            chunk = chunk[chunk["enrollment_total"].notna()]
+            yield None, chunk["enrollment_total"].to_numpy(dtype=np.float64)
+            gdp = chunk.dropna(subset=["region"])
+            for region, values in gdp.groupby("region")["gdp_per_capita_usd"]:
+                yield region, values.dropna().to_numpy(dtype=np.float64)
 
-def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
-    logger.info("Engineering features...")
+    counts = {}
+    for group, values in groups():
+        counts[group] = counts.get(group, 0) + len(values)
+    n = counts.pop(None, 0)
+
+    # Series.quantile's linear interpolation between the two ranks around (n - 1) * q
+    position = (n - 1) * 0.99
+    below = int(np.floor(position))
+    cap_ranks = [below, min(below + 1, n - 1)] if n else []
+    ranks = {(None, r) for r in cap_ranks}
+    ranks |= {(region, r) for region, count in counts.items() if count for r in {(count - 1) // 2, count // 2}}
+    values = _order_statistics(groups, ranks, counts | {None: n}, chunksize)
 
-    df = df.sort_values(["country_code", "year"]).copy()
+    cap = float(np.quantile([values[None, r] for r in cap_ranks], position - below)) if n else np.nan
+    medians = {
+        region: (values[region, (count - 1) // 2] + values[region, count // 2]) / 2 if count else np.nan
+        for region, count in sorted(counts.items())
+    }
+    return {"enrollment_cap": cap, "gdp_median": medians}
 
-    # Derived features
-    df["enrollment_rate"] = df["enrollment_total"] / df["population_school_age"].replace(0, np.nan)
-    df["gdp_per_capita_log"] = np.log1p(df["gdp_per_capita_usd"])
-    df["year_index"] = df["year"] - 1970
 
-    # Lag features
-    grp = df.groupby("country_code")["enrollment_total"]
-    df["enrollment_lag1"] = grp.shift(1)
-    df["enrollment_lag3"] = grp.shift(3)
-    df["enrollment_rolling3"] = grp.transform(lambda x: x.rolling(3, min_periods=1).mean()).shift(1)
+_SIGN = np.uint64(1 << 63)
+_DIGIT_BITS = 16
 
-    # Expenditure lag
-    df["edu_expenditure_lag1"] = df.groupby("country_code")["gov_edu_expenditure_pct"].shift(1)
 
-    # Encode region
-    df["region_code"] = df["region"].map(REGION_MAP).fillna("UNK")
-    df["region_encoded"] = df["region_code"].map(REGION_ENCODE).fillna(-1).astype(int)
+def _sort_keys(values: np.ndarray) -> np.ndarray:
+    """uint64 keys that order like the float64 values."""
+    bits = values.view(np.uint64)
+    return np.where(bits & _SIGN, ~bits, bits | _SIGN)
 
-    # Drop rows that still can't be used for training
-    df = df.dropna(subset=["enrollment_lag1", "gdp_per_capita_log"])
 
+def _order_statistics(groups, ranks: set, counts: dict, limit: int) -> dict:
+    """{(group, rank): rank-th smallest value of the group} over the (group, values) pairs groups() yields.
+
+    Each pass re-reads groups(). A rank with more than `limit` candidate
+    values left narrows them by the next 16 bits of their sort keys;
+    otherwise its candidates are collected and the rank is resolved.
+    """
+    # (group, rank) -> [key prefix, bits resolved, rank among candidates, candidate count]
+    pending = {key: [np.uint64(0), 0, key[1], counts[key[0]]] for key in ranks}
+    found = {}
+    while pending:
+        histograms, collected = {}, {}
+        for group, values in groups():
+            for key, (prefix, resolved, _, count) in pending.items():
+                if key[0] != group:
+                    continue
+                keys = _sort_keys(values)
+                if resolved:
+                    keys = keys[keys >> np.uint64(64 - resolved) == prefix >> np.uint64(64 - resolved)]
+                if count <= limit or resolved == 64:
+                    collected.setdefault(key, []).append(keys)
+                else:
+                    digits = (keys >> np.uint64(64 - resolved - _DIGIT_BITS)) & np.uint64((1 << _DIGIT_BITS) - 1)
+                    histogram = np.bincount(digits.astype(np.intp), minlength=1 << _DIGIT_BITS)
+                    histograms[key] = histograms.get(key, 0) + histogram
+        for key, parts in collected.items():
+            keys = np.concatenate(parts)
+            rank = pending.pop(key)[2]
+            found[key] = _float_of(np.partition(keys, rank)[rank])
+        for key, histogram in histograms.items():
+            prefix, resolved, rank, _ = pending[key]
+            ends = np.cumsum(histogram)
+            digit = int(np.searchsorted(ends, rank, side="right"))
+            resolved += _DIGIT_BITS
+            prefix |= np.uint64(digit) << np.uint64(64 - resolved)
+            pending[key] = [prefix, resolved, rank - (ends[digit] - histogram[digit]), histogram[digit]]
+    return found
+
+
+def _float_of(key: np.uint64) -> float:
+    bits = np.array([key], dtype=np.uint64)
+    return float(np.where(bits & _SIGN, bits & ~_SIGN, ~bits).view(np.float64)[0])
+
+
+def clean(df: pd.DataFrame, stats: dict | None = None) -> pd.DataFrame:
+    logger.info("Cleaning data...")
+    df = standardise_columns(df)
+    # Statistics come from the full dataset even when cleaning a subset of partitions
+    return Preprocessor(stats or clean_stats(df)).clean(df)
+
+
+def engineer_features(df: pd.DataFrame) -> pd.DataFrame:
+    logger.info("Engineering features...")
+    df = FeatureEngineer().create_features(df)
     logger.info(f"Feature engineering complete. Final shape: {df.shape}")
     return df
 
 
-def save(df: pd.DataFrame, path: Path) -> None:
-    path.parent.mkdir(parents=True, exist_ok=True)
-    df.to_csv(path, index=False)
-    logger.success(f"Saved processed data to {path}")
+def transform_chain(stats: dict) -> Chain:
+    """clean() and engineer_features() fused into one chain: a single sort and no intermediate copies."""
+    return Preprocessor(stats).chain + FeatureEngineer().chain
+
+
+def _transform_shard(df: pd.DataFrame, stats: dict) -> pd.DataFrame:
+    return transform_chain(stats)(df)
+
+
+def shard_by_country(df: pd.DataFrame, n_shards: int) -> list:
+    """Split df into at most n_shards frames of whole countries with similar row counts."""
+    counts = df.groupby("country_code").size()
+    bounds = np.linspace(0, counts.sum(), n_shards + 1)[1:-1]
+    shard_of = pd.Series(np.searchsorted(bounds, counts.cumsum().to_numpy() - counts.to_numpy() / 2), index=counts.index)
+    return [shard for _, shard in df.groupby(df["country_code"].map(shard_of))]
+
+
+def transform(df: pd.DataFrame, stats: dict | None = None, workers: int = 1) -> pd.DataFrame:
+    """clean() + engineer_features(), optionally sharding countries across worker processes.
+
+    Every feature is computed within a country, so the parallel result is
+    identical to the serial one once the shards are merged back in order.
+    """
+    df = standardise_columns(df)
+    if stats is None:
+        stats = clean_stats(df)
+    if workers <= 1:
+        with span("chain"):
+            return transform_chain(stats)(df)
+
+    shards = shard_by_country(df, workers)
+    logger.info(f"Transforming {len(shards)} country shards across {workers} processes")
+    with span("parallel_shards"), ProcessPoolExecutor(max_workers=workers) as pool:
+        parts = list(pool.map(_transform_shard, shards, repeat(stats)))
+    with span("merge"):
+        return pd.concat(parts).sort_values(["country_code", "year"])
+
+
+def stream_transform(path: Path, out_path: Path, csv_path: Path | None = None,
+                     chunksize: int = STREAM_CHUNKSIZE) -> int:
+    """Clean and engineer a raw file sorted by (country_code, year) chunk by chunk.
+
+    The last STREAM_CONTEXT_ROWS cleaned rows of the series open at each
+    chunk boundary are prepended to the next chunk (and dropped from its
+    output), so lag, rolling and forward-fill features match a full pass
+    while memory stays bounded by the chunk size.
+    """
+    stats = stream_clean_stats(path, chunksize)
+    carry, last_key = None, None
+    with TableWriter(out_path, PROCESSED_SCHEMA, csv_path=csv_path) as writer:
+        for chunk in iter_raw(path, chunksize):
+            chunk = standardise_columns(chunk)
+            last_key = _check_sorted(chunk, last_key)
+
+            if carry is not None:
+                chunk = pd.concat([carry, chunk])
+            cleaned = clean(chunk, stats)
+            if cleaned.empty:
+                continue
+            # Carried rows get negative labels so they can be told apart from this chunk's rows
+            open_series = cleaned[cleaned["country_code"] == cleaned["country_code"].iloc[-1]]
+            carry = open_series.tail(STREAM_CONTEXT_ROWS)
+            carry = carry.set_axis(np.arange(-len(carry), 0))
+
+            out = engineer_features(cleaned)
+            writer.write(out[out.index >= 0])
+    logger.info(f"Streamed {writer.rows:,} processed rows to {out_path}")
+    return writer.rows
+
+
+def _check_sorted(chunk: pd.DataFrame, last_key: tuple | None) -> tuple | None:
+    codes = chunk["country_code"].astype(str).to_numpy()
+    years = chunk["year"].to_numpy()
+    if last_key is not None:
+        codes = np.concatenate([[last_key[0]], codes])
+        years = np.concatenate([[last_key[1]], years])
+    ordered = (codes[1:] > codes[:-1]) | ((codes[1:] == codes[:-1]) & (years[1:] >= years[:-1]))
+    if not ordered.all():
+        raise ValueError("Streaming mode requires raw input sorted by (country_code, year).")
+    return (codes[-1], years[-1]) if len(codes) else last_key
+
+
+def save(df: pd.DataFrame, path: Path, csv_path: Path | None = PROCESSED_CSV_PATH) -> None:
+    write_table(df, path, PROCESSED_SCHEMA, csv_path=csv_path)
+    logger.success(f"Saved processed data to {path}" + (f" (CSV export: {csv_path})" if csv_path else ""))
+
+
+def save_latest_state(path: Path) -> None:
+    """Latest row per country in BaseState layout, for the API to load at start-up.
+
+    Read back from the saved processed table, so it is exactly the state the
+    API would otherwise derive from that table itself.
+    """
+    state = BaseState.from_frame(latest_rows(load_processed(BASE_COLUMNS)))
+    state.save(path)
+    logger.info(f"Latest state of {len(state)} countries written to {path}")
+
+
+def etl_version() -> str:
+    # Any change to this module or its transformer chains invalidates every cached partition
+    digest = hashlib.sha256()
+    for module in (__file__, preprocessing.__file__, feature_engineering.__file__, transformers.__file__):
+        digest.update(Path(module).read_bytes())
+    return digest.hexdigest()
+
+
+def partition_hashes(df: pd.DataFrame, stats: dict) -> dict:
+    """Content hash per country over its raw rows as clean() will see them.
+
+    Enrollment is hashed after the dataset-wide cap and a regional GDP
+    median only where it fills a gap, so a new year that moves those
+    statistics invalidates just the countries whose cleaned values change.
+    """
+    capped = np.minimum(df["enrollment_total"].to_numpy(dtype=np.float64), stats["enrollment_cap"])
+    row_hashes = pd.util.hash_pandas_object(df.assign(enrollment_total=capped), index=False)
+    gap_regions = df.loc[df["gdp_per_capita_usd"].isna()].groupby("country_code")["region"].unique()
+    hashes = {}
+    for code, rows in row_hashes.groupby(df["country_code"]):
+        regions = gap_regions.get(code, [])
+        used_stats = {"gdp_median": {str(r): stats["gdp_median"].get(r) for r in sorted(map(str, regions))}}
+        digest = hashlib.sha256(np.sort(rows.to_numpy()).tobytes())
+        digest.update(json.dumps(used_stats, sort_keys=True).encode())
+        hashes[str(code)] = digest.hexdigest()
+    return hashes
+
+
+def build_incremental(df: pd.DataFrame, full_rebuild: bool = False, workers: int = 1) -> pd.DataFrame:
+    """Rebuild only the country partitions whose raw rows, as clean() sees them, changed.
+
+    Engineered rows of every partition are cached at full precision in
+    PARTITION_CACHE_PATH, with one content hash per country in the manifest,
+    so the merged output is identical to running clean() and
+    engineer_features() over the whole file.
+    """
+    df = standardise_columns(df)
+    stats = clean_stats(df)
+    hashes = partition_hashes(df, stats)
+
+    manifest = {}
+    if MANIFEST_PATH.exists() and PARTITION_CACHE_PATH.exists() and not full_rebuild:
+        manifest = json.loads(MANIFEST_PATH.read_text())
+    previous = manifest.get("partitions", {}) if manifest.get("etl_version") == etl_version() else {}
+
+    changed = [code for code, digest in hashes.items() if previous.get(code) != digest]
+    removed = previous.keys() - hashes.keys()
+    logger.info(f"{len(changed):,} of {len(hashes):,} country partitions changed, {len(removed):,} removed")
+
+    frames = []
+    if len(changed) < len(hashes):
+        cached = pd.read_parquet(PARTITION_CACHE_PATH)
+        frames.append(cached[~cached["country_code"].isin(changed) & ~cached["country_code"].isin(removed)])
+    if changed or not frames:
+        frames.append(transform(df[df["country_code"].isin(changed)].copy(), stats, workers))
+    merged = pd.concat(frames, ignore_index=True).sort_values(["country_code", "year"]).reset_index(drop=True)
+
+    if changed or removed:
+        PARTITION_CACHE_PATH.parent.mkdir(parents=True, exist_ok=True)
+        merged.to_parquet(PARTITION_CACHE_PATH, index=False)
+        MANIFEST_PATH.write_text(json.dumps({"etl_version": etl_version(), "partitions": hashes}, indent=2))
+    return merged
 
 
-def run():
-    df = load_raw(RAW_PATH)
-    df = clean(df)
-    df = engineer_features(df)
-    save(df, PROCESSED_PATH)
+def run(incremental: bool = False, full_rebuild: bool = False, workers: int = 1, stream: bool = False,
+        chunksize: int = STREAM_CHUNKSIZE):
+    mode = "stream" if stream else "incremental" if incremental else "full"
+    with run_report("pipeline", mode=mode, workers=workers):
+        if stream:
+            with span("stream_transform"):
+                stream_transform(RAW_PATH, PROCESSED_PATH, PROCESSED_CSV_PATH, chunksize)
+        else:
+            with span("load_raw"):
+                df = load_raw(RAW_PATH)
+            if incremental:
+                with span("build_incremental"):
+                    df = build_incremental(df, full_rebuild=full_rebuild, workers=workers)
+            else:
+                with span("transform"):
+                    df = transform(df, workers=workers)
+            with span("save"):
+                save(df, PROCESSED_PATH, PROCESSED_CSV_PATH)
+        with span("latest_state"):
+            save_latest_state(LATEST_STATE_PATH)
     logger.success("ETL pipeline complete.")
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="EduPredict ETL pipeline")
+    parser.add_argument("--incremental", action="store_true", help="Recompute only changed country partitions")
+    parser.add_argument("--full-rebuild", action="store_true", help="Ignore cached partitions and rebuild all of them")
+    parser.add_argument("--workers", type=int, default=1, help="Shard countries across this many processes")
+    parser.add_argument("--stream", action="store_true", help="Process a sorted raw file in bounded-memory chunks")
+    parser.add_argument("--chunksize", type=int, default=STREAM_CHUNKSIZE, help="Rows per chunk in --stream mode")
+    args = parser.parse_args()
+    run(incremental=args.incremental, full_rebuild=args.full_rebuild, workers=args.workers,
+        stream=args.stream, chunksize=args.chunksize)
@@ -1,12 +1,21 @@
-import pandas as pd
+import argparse
 import numpy as np
-import joblib
-from pathlib import Path
+import os
+from dataclasses import dataclass
+from typing import TYPE_CHECKING
 from loguru import logger
 
-MODEL_PATH = Path("src/models/saved/edupredict_v1.pkl")
-DATA_PATH = Path("data/processed/enrollment_ml_ready.csv")
-EXPORT_PATH = Path("data/exports/forecast_output.csv")
+from src.etl.base_state import BASE_COLUMNS, BaseState, latest_rows
+from src.etl.forecast_paths import PathWriter, export_legacy, long_columns
+from src.etl.storage import FORECAST_CSV_PATH, FORECAST_DIR, FORECAST_PATH, FORECAST_SCHEMA, load_processed, write_table
+from src.etl.telemetry import INFERENCE_ROWS, INFERENCE_SECONDS, run_report, span
+from src.models import registry
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+# "xgboost" uses the pickled XGBRegressor, "compiled" the array-based CompiledEnsemble
+INFERENCE_BACKEND = os.getenv("EDUPREDICT_BACKEND", "xgboost")
 
 FEATURES = [
     "year_index",
@@ -28,82 +37,347 @@ SCENARIOS = {
     "pessimistic": {"gdp_growth": -0.01, "edu_adj": -0.003},
 }
 
+# Monte Carlo intervals: every simulated path draws yearly shocks to the two
+# scenario drivers and a multiplicative model error bootstrapped from the
+# validation log-residuals, and bounds are empirical quantiles over paths.
+SIM_PATHS = 1000
+RESIDUAL_BINS = 4
+SIM_SEED = 42
+INTERVAL = (0.025, 0.975)
+GDP_GROWTH_SD = 0.02   # log GDP per capita, per year
+EDU_ADJ_SD = 0.1       # education expenditure, % of GDP per year
+# Rows advanced per batch, bounding memory at roughly 50 MB per chunk; the
+# compiled backend walks its trees over smaller blocks of each chunk
+SIM_CHUNK_ROWS = 200_000
+
+
+def load_model(backend: str = INFERENCE_BACKEND, version: str | None = None) -> tuple:
+    """(model, metadata) for a registered version, defaulting to the current one."""
+    import joblib
 
-def load_model():
-    logger.info(f"Loading model from {MODEL_PATH}")
-    return joblib.load(MODEL_PATH)
-
-
-def load_base(base_year: int) -> pd.DataFrame:
-    df = pd.read_csv(DATA_PATH)
-    return df[df["year"] == base_year].copy()
-
-
-def project(row: pd.Series, model, horizon: int, scenario: dict) -> list:
-    results = []
-    prev_enrollment = row["enrollment_total"]
-    rolling_vals = [prev_enrollment] * 3
-    gdp_log = row.get("gdp_per_capita_log", np.log1p(10000))
-    edu_exp = row.get("edu_expenditure_lag1", 4.0)
-
-    for step in range(1, horizon + 1):
-        year = BASE_YEAR + step
-        gdp_log += scenario["gdp_growth"]
-        edu_exp += scenario["edu_adj"]
-
-        feat = {
-            "year_index": year - 1970,
-            "enrollment_lag1": rolling_vals[-1],
-            "enrollment_lag3": rolling_vals[-3] if len(rolling_vals) >= 3 else rolling_vals[0],
-            "enrollment_rolling3": np.mean(rolling_vals[-3:]),
-            "gdp_per_capita_log": gdp_log,
-            "edu_expenditure_lag1": edu_exp,
-            "population_school_age": row.get("population_school_age", 1e7),
-            "region_encoded": row.get("region_encoded", 0),
-        }
-        X = pd.DataFrame([feat])[FEATURES]
-        pred = float(model.predict(X)[0])
-        rolling_vals.append(pred)
-
-        # Simple residual-based confidence interval (±8%)
-        results.append({
-            "country_code": row["country_code"],
-            "country_name": row.get("country_name", ""),
-            "region": row.get("region", ""),
-            "forecast_year": year,
-            "horizon": horizon,
-            "predicted_enrollment": round(pred),
-            "lower_bound": round(pred * 0.92),
-            "upper_bound": round(pred * 1.08),
-            "model_version": "v1.2.0",
-        })
-
-    return results
-
-
-def run():
-    model = load_model()
-    base_df = load_base(BASE_YEAR)
+    path, metadata = registry.resolve(version)
+    logger.info(f"Loading model {metadata['version']} from {path} ({backend} backend)")
+    model = joblib.load(path)
+    if backend == "compiled":
+        from src.models.compiled import compile_model
+        return compile_model(model), metadata
+    if backend != "xgboost":
+        raise ValueError(f"Unknown inference backend '{backend}'")
+    return model, metadata
 
+
+def load_base(base_year: int) -> "pd.DataFrame":
+    df = load_processed(BASE_COLUMNS)
+    base_df = df[df["year"] == base_year]
     if base_df.empty:
-        logger.warning(f"No rows found for base year {BASE_YEAR}. Using most recent year per country.")
-        df = pd.read_csv(DATA_PATH)
-        base_df = df.sort_values("year").groupby("country_code").last().reset_index()
+        logger.warning(f"No rows found for base year {base_year}. Using most recent year per country.")
+        base_df = latest_rows(df)
+    return base_df
+
+
+@dataclass(frozen=True)
+class Residuals:
+    """Validation log-residuals binned by the size of the prediction they belong to.
+
+    Relative model error is far larger for small countries than for large
+    ones, so each simulated prediction draws its error from its own bin.
+    """
+
+    edges: np.ndarray   # log-prediction boundaries between bins
+    values: np.ndarray  # residuals ordered by bin
+    starts: np.ndarray
+    counts: np.ndarray
+
+    @classmethod
+    def from_validation(cls, residuals, predictions, n_bins: int = RESIDUAL_BINS) -> "Residuals":
+        log_pred = np.log(np.asarray(predictions, dtype=np.float64))
+        edges = np.quantile(log_pred, np.linspace(0, 1, n_bins + 1)[1:-1])
+        bins = np.searchsorted(edges, log_pred)
+        order = np.argsort(bins, kind="stable")
+        counts = np.bincount(bins, minlength=n_bins)
+        return cls(edges, np.asarray(residuals, dtype=np.float64)[order], np.cumsum(counts) - counts, counts)
+
+    def draw(self, pred: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        bins = np.searchsorted(self.edges, np.log(np.maximum(pred, 1.0)))
+        return self.values[self.starts[bins] + (rng.random(len(pred)) * self.counts[bins]).astype(np.intp)]
+
+
+def _recurse(model, enrollment, gdp_log, edu_exp, population, region, gdp_growth, edu_adj, steps,
+             rng=None, residuals: Residuals | None = None, base_year=BASE_YEAR) -> np.ndarray:
+    """Recursive forecast of n independent rows in lockstep, one predict call per year.
+
+    gdp_log and edu_exp are advanced in place. With rng, each step adds the
+    driver shocks and scales predictions by exp(error) drawn from residuals.
+    base_year is the year each row starts from, a scalar or one per row.
+    Returns an (n, steps) array of forecasts.
+    """
+    n = len(enrollment)
+    kind = "point" if rng is None else "simulation"
+    INFERENCE_ROWS.inc(n * steps, kind=kind)
+
+    # Enrollment history: three seed values followed by the forecast path
+    history = np.empty((n, steps + 3), dtype=np.float64)
+    history[:, :3] = enrollment[:, None]
+
+    # Feature matrix in FEATURES order; columns 6-7 are constant over the horizon
+    X = np.empty((n, len(FEATURES)), dtype=np.float64)
+    X[:, 6] = population
+    X[:, 7] = region
+
+    for step in range(1, steps + 1):
+        gdp_log += gdp_growth
+        edu_exp += edu_adj
+        if rng is not None:
+            gdp_log += GDP_GROWTH_SD * rng.standard_normal(n)
+            edu_exp += EDU_ADJ_SD * rng.standard_normal(n)
+        last = step + 1
+
+        X[:, 0] = base_year + step - 1970
+        X[:, 1] = history[:, last]
+        X[:, 2] = history[:, last - 2]
+        X[:, 3] = (history[:, last - 2] + history[:, last - 1] + history[:, last]) / 3
+        X[:, 4] = gdp_log
+        X[:, 5] = edu_exp
+        with INFERENCE_SECONDS.time(kind=kind, step=step):
+            pred = model.predict(X)
+        if rng is not None:
+            pred = pred * np.exp(residuals.draw(pred, rng))
+        history[:, last + 1] = pred
+
+    return history[:, 3:]
+
+
+def project_grid(state: BaseState, model, gdp_growth, edu_adj, steps: int, positions=None,
+                 base_years=None) -> np.ndarray:
+    """Forecast every country in positions under every (gdp_growth[i], edu_adj[i]) pair.
+
+    All pairs of a chunk of countries advance in lockstep, one predict call
+    per year. base_years, one per row of state, replaces BASE_YEAR as the
+    year each row starts from. Returns an array of shape (countries, pairs, steps).
+    """
+    positions = np.arange(len(state)) if positions is None else np.atleast_1d(positions)
+    gdp_growth = np.asarray(gdp_growth, dtype=np.float64)
+    edu_adj = np.asarray(edu_adj, dtype=np.float64)
+    n_pairs = len(gdp_growth)
+    chunk = max(1, SIM_CHUNK_ROWS // n_pairs)
+
+    paths = np.empty((len(positions), n_pairs, steps))
+    for start in range(0, len(positions), chunk):
+        idx = positions[start:start + chunk]
+        paths[start:start + len(idx)] = _recurse(
+            model,
+            enrollment=np.repeat(state.enrollment_total[idx], n_pairs),
+            gdp_log=np.repeat(state.gdp_per_capita_log[idx], n_pairs),
+            edu_exp=np.repeat(state.edu_expenditure_lag1[idx], n_pairs),
+            population=np.repeat(state.population_school_age[idx], n_pairs),
+            region=np.repeat(state.region_encoded[idx], n_pairs),
+            gdp_growth=np.tile(gdp_growth, len(idx)),
+            edu_adj=np.tile(edu_adj, len(idx)),
+            steps=steps,
+            base_year=BASE_YEAR if base_years is None else np.repeat(base_years[idx], n_pairs),
+        ).reshape(len(idx), n_pairs, steps)
+    return paths
+
+
+def project_batch(state: BaseState, model, scenarios: dict, steps: int) -> np.ndarray:
+    """Recursive forecast path of every (country, scenario) pair, shaped (countries, scenarios, steps).
+
+    Shorter horizons are prefixes of the full path.
+    """
+    return project_grid(
+        state,
+        model,
+        [s["gdp_growth"] for s in scenarios.values()],
+        [s["edu_adj"] for s in scenarios.values()],
+        steps,
+    )
+
+
+def simulate_intervals(state: BaseState, model, scenarios: dict, steps: int, residuals: Residuals,
+                       n_paths: int = SIM_PATHS, positions=None, seed: int = SIM_SEED) -> tuple:
+    """Monte Carlo (lower, upper) bounds, each shaped (countries, scenarios, steps).
+
+    All n_paths paths of a chunk of countries are advanced together as one
+    batch per step. positions restricts the simulation to those countries.
+    The bounds always contain the point forecast of project_batch.
+    """
+    positions = np.arange(len(state)) if positions is None else np.atleast_1d(positions)
+    bounds = np.empty((len(INTERVAL), len(positions), len(scenarios), steps))
+    for start, stop, chunk_bounds in iter_intervals(state, model, scenarios, steps, residuals, n_paths, positions, seed):
+        bounds[:, start:stop] = chunk_bounds
+    return bounds[0], bounds[1]
+
+
+def iter_intervals(state: BaseState, model, scenarios: dict, steps: int, residuals: Residuals,
+                   n_paths: int = SIM_PATHS, positions=None, seed: int = SIM_SEED):
+    """simulate_intervals one chunk of countries at a time.
+
+    Yields (start, stop, bounds) as each chunk finishes, where bounds, shaped
+    (2, stop - start, scenarios, steps), holds the lower and upper bounds of
+    positions[start:stop]. The draws are those of simulate_intervals.
+    """
+    positions = np.arange(len(state)) if positions is None else np.atleast_1d(positions)
+    n_scen = len(scenarios)
+    per_country = n_scen * n_paths
+    chunk = max(1, SIM_CHUNK_ROWS // per_country)
+    scen_gdp_growth = [s["gdp_growth"] for s in scenarios.values()]
+    scen_edu_adj = [s["edu_adj"] for s in scenarios.values()]
+    gdp_growth = np.repeat(scen_gdp_growth, n_paths)
+    edu_adj = np.repeat(scen_edu_adj, n_paths)
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, len(positions), chunk):
+        idx = positions[start:start + chunk]
+        sims = _recurse(
+            model,
+            enrollment=np.repeat(state.enrollment_total[idx], per_country),
+            gdp_log=np.repeat(state.gdp_per_capita_log[idx], per_country),
+            edu_exp=np.repeat(state.edu_expenditure_lag1[idx], per_country),
+            population=np.repeat(state.population_school_age[idx], per_country),
+            region=np.repeat(state.region_encoded[idx], per_country),
+            gdp_growth=np.tile(gdp_growth, len(idx)),
+            edu_adj=np.tile(edu_adj, len(idx)),
+            steps=steps,
+            rng=rng,
+            residuals=residuals,
+        )
+        sims = sims.reshape(len(idx), n_scen, n_paths, steps)
+        point = project_grid(state, model, scen_gdp_growth, scen_edu_adj, steps, idx)
+        yield start, start + len(idx), _contain(np.quantile(sims, INTERVAL, axis=2), point)
+
+
+def _contain(bounds: np.ndarray, point: np.ndarray) -> np.ndarray:
+    """Widen stacked (lower, upper) bounds to contain the point forecast.
+
+    Quantiles of noisy paths can sit just off a point forecast; keep it inside.
+    """
+    return np.stack([np.minimum(bounds[0], point), np.maximum(bounds[1], point)])
+
+
+class RowStreams:
+    """Random source for a batch of independent row blocks, each with its own generator.
+
+    Every draw takes each block's share from that block's generator, so a
+    block sees exactly the numbers it would see if simulated on its own.
+    """
+
+    def __init__(self, generators: list, sizes: list):
+        self.generators = generators
+        self.sizes = sizes
+
+    def standard_normal(self, n: int) -> np.ndarray:
+        return np.concatenate([g.standard_normal(k) for g, k in zip(self.generators, self.sizes)])
+
+    def random(self, n: int) -> np.ndarray:
+        return np.concatenate([g.random(k) for g, k in zip(self.generators, self.sizes)])
+
+
+def simulate_requests(state: BaseState, model, requests: list, steps: int, residuals: Residuals,
+                      seed: int = SIM_SEED) -> list:
+    """Monte Carlo (lower, upper) bounds, each shaped (steps,), for (position, scenario, n_paths) requests.
+
+    All requests advance together, one predict call per step, but each draws
+    from its own generator seeded with seed. A request's bounds therefore
+    equal simulate_intervals for that country and scenario alone, and
+    contain its point forecast.
+    """
+    sizes = [n_paths for _, _, n_paths in requests]
+    rows = np.repeat([pos for pos, _, _ in requests], sizes)
+    sims = _recurse(
+        model,
+        enrollment=state.enrollment_total[rows],
+        gdp_log=state.gdp_per_capita_log[rows],
+        edu_exp=state.edu_expenditure_lag1[rows],
+        population=state.population_school_age[rows],
+        region=state.region_encoded[rows],
+        gdp_growth=np.repeat([s["gdp_growth"] for _, s, _ in requests], sizes),
+        edu_adj=np.repeat([s["edu_adj"] for _, s, _ in requests], sizes),
+        steps=steps,
+        rng=RowStreams([np.random.default_rng(seed) for _ in requests], sizes),
+        residuals=residuals,
+    )
+    positions = np.array([pos for pos, _, _ in requests])
+    point = _recurse(
+        model,
+        enrollment=state.enrollment_total[positions],
+        gdp_log=state.gdp_per_capita_log[positions],
+        edu_exp=state.edu_expenditure_lag1[positions],
+        population=state.population_school_age[positions],
+        region=state.region_encoded[positions],
+        gdp_growth=np.array([s["gdp_growth"] for _, s, _ in requests], dtype=np.float64),
+        edu_adj=np.array([s["edu_adj"] for _, s, _ in requests], dtype=np.float64),
+        steps=steps,
+    )
+    blocks = np.split(sims, np.cumsum(sizes)[:-1])
+    return [tuple(_contain(np.quantile(block, INTERVAL, axis=0), p)) for block, p in zip(blocks, point)]
+
+
+def load_residuals(model, metadata: dict) -> Residuals:
+    """Validation residuals recorded at training time, recomputed for legacy models."""
+    if "val_residuals" in metadata:
+        return Residuals.from_validation(metadata["val_residuals"], metadata["val_predictions"])
+    from src.models.train import evaluate, load_data, split
+
+    logger.info(f"No stored residuals for model {metadata['version']}, recomputing on the validation split")
+    val = evaluate(model, split(load_data())[1], "Validation")
+    return Residuals.from_validation(val["residuals"], val["predictions"])
+
+
+def to_records(state: BaseState, paths: np.ndarray, lower: np.ndarray, upper: np.ndarray,
+               scenarios: dict, model_version: str) -> "pd.DataFrame":
+    import pandas as pd
+
+    return pd.DataFrame(long_columns(
+        state.codes, state.names, state.regions, list(scenarios), BASE_YEAR, HORIZONS, model_version,
+        paths, lower, upper,
+    ))
+
 
-    all_records = []
-    for _, row in base_df.iterrows():
-        for scenario_name, scenario_params in SCENARIOS.items():
-            for horizon in HORIZONS:
-                records = project(row, model, horizon, scenario_params)
-                for r in records:
-                    r["scenario"] = scenario_name
-                all_records.extend(records)
+def run(n_paths: int = SIM_PATHS, compact: bool = False, legacy: bool = True):
+    """Write forecasts for every country and scenario.
 
-    output = pd.DataFrame(all_records)
-    EXPORT_PATH.parent.mkdir(parents=True, exist_ok=True)
-    output.to_csv(EXPORT_PATH, index=False)
-    logger.success(f"Forecasts written to {EXPORT_PATH} ({len(output):,} rows)")
+    compact writes one path per (country, scenario) to the scenario-partitioned
+    store under FORECAST_DIR, appended as each chunk of countries is
+    simulated; legacy then also exports the forecast_output files from it.
+    """
+    with run_report("predict", n_paths=n_paths, compact=compact):
+        with span("load_model"):
+            model, metadata = load_model()
+        with span("load_base"):
+            state = BaseState.from_frame(load_base(BASE_YEAR))
+        with span("project"):
+            paths = project_batch(state, model, SCENARIOS, max(HORIZONS))
+        logger.info(f"Simulating {n_paths:,} paths per country and scenario")
+        if compact:
+            with span("simulate_write"):
+                residuals = load_residuals(model, metadata)
+                writer = PathWriter(FORECAST_DIR, state.codes, state.names, state.regions, list(SCENARIOS),
+                                    max(HORIZONS), model_version=metadata["version"], base_year=BASE_YEAR,
+                                    horizons=HORIZONS, n_paths=n_paths)
+                with writer:
+                    for start, stop, bounds in iter_intervals(state, model, SCENARIOS, max(HORIZONS), residuals, n_paths):
+                        writer.write(paths[start:stop], bounds[0], bounds[1])
+            logger.success(f"Forecast paths written to {FORECAST_DIR} ({writer.rows:,} countries x {len(SCENARIOS)} scenarios)")
+            if legacy:
+                with span("export_legacy"):
+                    rows = export_legacy(FORECAST_DIR, FORECAST_PATH, FORECAST_CSV_PATH)
+                logger.success(f"Forecasts exported to {FORECAST_PATH} and {FORECAST_CSV_PATH} ({rows:,} rows)")
+            return
+        with span("simulate"):
+            residuals = load_residuals(model, metadata)
+            lower, upper = simulate_intervals(state, model, SCENARIOS, max(HORIZONS), residuals, n_paths)
+        with span("write"):
+            output = to_records(state, paths, lower, upper, SCENARIOS, metadata["version"])
+            write_table(output, FORECAST_PATH, FORECAST_SCHEMA, csv_path=FORECAST_CSV_PATH)
+    logger.success(f"Forecasts written to {FORECAST_PATH} and {FORECAST_CSV_PATH} ({len(output):,} rows)")
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Write EduPredict forecasts")
+    parser.add_argument("--paths", type=int, default=SIM_PATHS, help="Monte Carlo paths per country and scenario")
+    parser.add_argument("--compact", action="store_true",
+                        help=f"Write one path per country and scenario to {FORECAST_DIR}, partitioned by scenario")
+    parser.add_argument("--no-legacy", action="store_true",
+                        help="With --compact, skip the forecast_output.parquet/.csv export")
+    args = parser.parse_args()
+    run(n_paths=args.paths, compact=args.compact, legacy=not args.no_legacy)
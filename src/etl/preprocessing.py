@@ -1,8 +1,52 @@
+import numpy as np
 import pandas as pd
+from loguru import logger
+
+from src.etl.transformers import Chain, RowFilter, Transformer, ffill_within
+
+
+def clean_stats(df: pd.DataFrame) -> dict:
+    """Dataset-wide statistics used by Preprocessor, computed over rows with a target."""
+    df = df[["enrollment_total", "region", "gdp_per_capita_usd"]].dropna(subset=["enrollment_total"])
+    return {
+        "enrollment_cap": float(df["enrollment_total"].quantile(0.99)),
+        "gdp_median": df.groupby("region")["gdp_per_capita_usd"].median().to_dict(),
+    }
+
+
+def _has_target(df: pd.DataFrame) -> np.ndarray:
+    keep = df["enrollment_total"].notna().to_numpy()
+    logger.info(f"Dropped {len(keep) - keep.sum()} rows missing enrollment_total")
+    return keep
+
 
 class Preprocessor:
-    def clean(self, df: pd.DataFrame):
-        df = df.copy()
-        df.drop_duplicates(inplace=True)
-        df.fillna(0, inplace=True)
-        return df
\ No newline at end of file
+    """Cleaning steps of the ETL as a Chain, for column names already standardised.
+
+    stats, from clean_stats, come from the full dataset even when cleaning a
+    subset of its countries.
+    """
+
+    def __init__(self, stats: dict):
+        self.stats = stats
+        self.chain = Chain("clean", [
+            RowFilter("drop_missing_target", ("enrollment_total",), _has_target),
+            Transformer("cap_enrollment", ("enrollment_total",), ("enrollment_total",), self._cap_enrollment),
+            Transformer("impute_gdp", ("gdp_per_capita_usd", "region"), ("gdp_per_capita_usd",), self._impute_gdp),
+            Transformer("ffill_literacy", ("country_code", "literacy_rate"), ("literacy_rate",), self._ffill_literacy),
+        ])
+
+    def clean(self, df: pd.DataFrame) -> pd.DataFrame:
+        return self.chain(df)
+
+    def _cap_enrollment(self, df: pd.DataFrame) -> None:
+        # Cap outliers at the 99th percentile
+        df["enrollment_total"] = np.minimum(df["enrollment_total"].to_numpy(dtype=np.float64), self.stats["enrollment_cap"])
+
+    def _impute_gdp(self, df: pd.DataFrame) -> None:
+        # Missing GDP per capita takes the regional median
+        df["gdp_per_capita_usd"] = df["gdp_per_capita_usd"].fillna(df["region"].map(self.stats["gdp_median"]))
+
+    @staticmethod
+    def _ffill_literacy(df: pd.DataFrame) -> None:
+        df["literacy_rate"] = ffill_within(df["literacy_rate"].to_numpy(dtype=np.float64), df["country_code"].to_numpy())
@@ -0,0 +1,124 @@
+import json
+import os
+import shutil
+import numpy as np
+from contextlib import contextmanager
+from pathlib import Path
+from loguru import logger
+
+from src.etl.base_state import NUMERIC_FIELDS, TEXT_FIELDS, BaseState
+from src.etl.telemetry import METRICS, Counter
+from src.models.compiled import from_shared, to_shared
+
+try:
+    import fcntl
+except ImportError:  # Windows: concurrent builders race, the first rename wins
+    fcntl = None
+
+SNAPSHOT_DIR = Path("data/snapshots")
+# Snapshots older than the newest KEEP_SNAPSHOTS are pruned on publish
+KEEP_SNAPSHOTS = 4
+
+SNAPSHOT_LOADS = METRICS.register(Counter(
+    "edupredict_snapshot_loads_total",
+    "Serving snapshot loads by outcome: attached to an existing one, or built.",
+    labels=("outcome",),
+))
+
+def snapshot_path(key: tuple) -> Path:
+    """Directory for a key of content hashes (model, data, serving config)."""
+    return SNAPSHOT_DIR / "-".join(part[:16] for part in key)
+
+
+def attach(key: tuple) -> tuple | None:
+    """(BaseState, forecast paths, metadata, model) memory-mapped from the snapshot for key, if built.
+
+    Numeric arrays are read-only maps of the snapshot files, so every process
+    attached to the same snapshot shares one copy through the page cache.
+    model is None unless a compiled model was published with the snapshot.
+    """
+    path = snapshot_path(key)
+    if not (path / "meta.json").exists():
+        return None
+    meta = json.loads((path / "meta.json").read_text())
+
+    def load(name: str, mmap: bool = True) -> np.ndarray:
+        return np.load(path / f"{name}.npy", mmap_mode="r" if mmap else None)
+
+    names = [*TEXT_FIELDS, *NUMERIC_FIELDS, "position_keys", "position_values"]
+    state = BaseState.from_arrays({name: load(name, mmap=name in NUMERIC_FIELDS) for name in names})
+    model = None
+    if "model_layout" in meta:
+        arrays = [{name: load(f"model{i}.{name}") for name in fields} for i, fields in enumerate(meta["model_arrays"])]
+        model = from_shared(arrays, meta["model_layout"])
+    return state, load("paths"), meta, model
+
+
+def publish(key: tuple, state: BaseState, paths: np.ndarray, metadata: dict, model=None) -> None:
+    """Write a snapshot for key; the directory appears atomically once complete.
+
+    A compiled model is stored as node arrays too, so attached processes
+    evaluate it from the shared maps instead of each unpickling their own.
+    """
+    path = snapshot_path(key)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    tmp.mkdir(parents=True, exist_ok=True)
+    for name, arr in state.to_arrays().items():
+        np.save(tmp / f"{name}.npy", arr)
+    np.save(tmp / "paths.npy", np.ascontiguousarray(paths))
+    arrays, layout = to_shared(model)
+    if arrays is not None:
+        for i, ensemble in enumerate(arrays):
+            for name, arr in ensemble.items():
+                np.save(tmp / f"model{i}.{name}.npy", np.ascontiguousarray(arr))
+        metadata = {**metadata, "model_layout": layout, "model_arrays": [list(a) for a in arrays]}
+    (tmp / "meta.json").write_text(json.dumps({**metadata, "key": list(key)}, indent=2, default=float))
+    try:
+        os.rename(tmp, path)
+    except OSError:
+        # Another process published the same key first
+        shutil.rmtree(tmp, ignore_errors=True)
+        return
+    logger.info(f"Published snapshot {path}")
+    _prune()
+
+
+def _prune() -> None:
+    snapshots = sorted(
+        (p for p in SNAPSHOT_DIR.iterdir() if p.is_dir() and not p.name.startswith(".")),
+        key=lambda p: p.stat().st_mtime,
+    )
+    for old in snapshots[:-KEEP_SNAPSHOTS]:
+        shutil.rmtree(old, ignore_errors=True)
+
+
+def load_or_build(key: tuple, build) -> tuple:
+    """Attach to the snapshot for key, calling build() -> (state, paths, metadata, model) only if
+    no process has published it yet."""
+    snapshot = attach(key)
+    if snapshot is None:
+        with build_lock():
+            snapshot = attach(key)
+            if snapshot is None:
+                logger.info(f"No snapshot for {snapshot_path(key).name}, building it")
+                publish(key, *build())
+                snapshot = attach(key)
+                SNAPSHOT_LOADS.inc(outcome="built")
+                return snapshot
+    SNAPSHOT_LOADS.inc(outcome="attached")
+    return snapshot
+
+
+@contextmanager
+def build_lock():
+    """Serialise snapshot builds so concurrently starting workers build once."""
+    SNAPSHOT_DIR.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        yield
+        return
+    with open(SNAPSHOT_DIR / ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
@@ -0,0 +1,175 @@
+from pathlib import Path
+from typing import TYPE_CHECKING
+from loguru import logger
+
+# pandas is imported where used so the API can start without it
+if TYPE_CHECKING:
+    import pandas as pd
+
+RAW_PATH = Path("data/raw/enrollment_raw.csv")
+PROCESSED_PATH = Path("data/processed/enrollment_ml_ready.parquet")
+PROCESSED_CSV_PATH = Path("data/processed/enrollment_ml_ready.csv")
+FORECAST_PATH = Path("data/exports/forecast_output.parquet")
+FORECAST_CSV_PATH = Path("data/exports/forecast_output.csv")
+# Compact forecast paths, partitioned by scenario (see src/etl/forecast_paths.py)
+FORECAST_DIR = Path("data/exports/forecasts")
+# Validation and test metrics of the current model
+EVALUATION_PATH = Path("data/reports/evaluation.json")
+# Latest row per country in BaseState layout, written by the ETL for fast API start-up
+LATEST_STATE_PATH = Path("data/processed/latest_state.npz")
+
+# Compact on-disk dtypes. Columns that seed the recursive forecast or are
+# counts above 2**24 stay float64; model-only inputs are stored as float32,
+# which loses nothing because XGBoost evaluates features in float32.
+PROCESSED_SCHEMA = {
+    "country_code": "category",
+    "country_name": "category",
+    "iso3_code": "category",
+    "region": "category",
+    "region_code": "category",
+    "year": "int16",
+    "year_index": "int16",
+    "region_encoded": "int8",
+    "gdp_per_capita_usd": "float32",
+    "gov_edu_expenditure_pct": "float32",
+    "literacy_rate": "float32",
+    "enrollment_rate": "float32",
+    "population_school_age": "float32",
+    "enrollment_lag1": "float32",
+    "enrollment_lag3": "float32",
+    "enrollment_rolling3": "float32",
+}
+
+FORECAST_SCHEMA = {
+    "country_code": "category",
+    "country_name": "category",
+    "region": "category",
+    "model_version": "category",
+    "scenario": "category",
+    "forecast_year": "int16",
+    "horizon": "int8",
+}
+
+
+def apply_schema(df: "pd.DataFrame", schema: dict) -> "pd.DataFrame":
+    return df.astype({col: dtype for col, dtype in schema.items() if col in df.columns})
+
+
+def write_table(df: "pd.DataFrame", path: Path, schema: dict, csv_path: Path | None = None) -> None:
+    """Write df as Parquet with the compact schema, plus an optional CSV export."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    apply_schema(df, schema).to_parquet(path, index=False)
+    if csv_path is not None:
+        df.to_csv(csv_path, index=False)
+
+
+class TableWriter:
+    """Append DataFrame chunks to a Parquet file (and optional CSV export) under one schema.
+
+    The Arrow schema is fixed by the first non-empty chunk, with dictionary
+    indices widened to int32 so later chunks with more categories still fit.
+    Empty chunks are skipped; if every chunk is empty, close() writes an
+    empty table.
+    """
+
+    def __init__(self, path: Path, schema: dict, csv_path: Path | None = None):
+        self.path = path
+        self.schema = schema
+        self.csv_path = csv_path
+        self.rows = 0
+        self._writer = None
+        self._arrow_schema = None
+        self._empty = None
+
+    def write(self, df: "pd.DataFrame") -> None:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # An empty frame has no values to infer column types from
+        if df.empty:
+            self._empty = df
+            return
+        table = pa.Table.from_pandas(apply_schema(df, self.schema), preserve_index=False)
+        if self._writer is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._arrow_schema = pa.schema(
+                [pa.field(f.name, _widen(f.type)) for f in table.schema], metadata=table.schema.metadata
+            )
+            self._writer = pq.ParquetWriter(self.path, self._arrow_schema)
+        self._writer.write_table(table.cast(self._arrow_schema))
+        if self.csv_path is not None:
+            df.to_csv(self.csv_path, mode="w" if self.rows == 0 else "a", header=self.rows == 0, index=False)
+        self.rows += len(df)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        elif self._empty is not None:
+            write_table(self._empty, self.path, self.schema, csv_path=self.csv_path)
+
+    def __enter__(self) -> "TableWriter":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def _widen(dtype):
+    import pyarrow as pa
+
+    if pa.types.is_dictionary(dtype):
+        return pa.dictionary(pa.int32(), dtype.value_type)
+    # A column that is entirely missing in the first chunk is assumed to hold strings
+    if pa.types.is_null(dtype):
+        return pa.string()
+    return dtype
+
+
+def read_table(path: Path, schema: dict, columns: list | None = None, csv_path: Path | None = None) -> "pd.DataFrame":
+    """Read only `columns` from the Parquet file at path.
+
+    Falls back to csv_path (parsed with the same schema) when the Parquet
+    file has not been generated yet.
+    """
+    import pandas as pd
+
+    if path.exists():
+        if columns is not None:
+            columns = [c for c in columns if c in _parquet_columns(path)]
+        return pd.read_parquet(path, columns=columns)
+
+    if csv_path is None or not csv_path.exists():
+        raise FileNotFoundError(path)
+    logger.warning(f"{path} not found, reading {csv_path} instead")
+    header = pd.read_csv(csv_path, nrows=0).columns
+    usecols = [c for c in columns if c in header] if columns is not None else None
+    dtype = {col: t for col, t in schema.items() if col in header and not t.startswith("int")}
+    df = pd.read_csv(csv_path, usecols=usecols, dtype=dtype)
+    # usecols keeps the file's column order; Parquet returns them as requested
+    return apply_schema(df if usecols is None else df[usecols], schema)
+
+
+def _parquet_columns(path: Path) -> list:
+    import pyarrow.parquet as pq
+    return pq.read_schema(path).names
+
+
+def load_processed(columns: list | None = None) -> "pd.DataFrame":
+    return read_table(PROCESSED_PATH, PROCESSED_SCHEMA, columns, csv_path=PROCESSED_CSV_PATH)
+
+
+def load_forecasts(columns: list | None = None) -> "pd.DataFrame":
+    return read_table(FORECAST_PATH, FORECAST_SCHEMA, columns, csv_path=FORECAST_CSV_PATH)
+
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    # Convert existing CSV outputs to the columnar format in place
+    for csv_path, path, schema in [
+        (PROCESSED_CSV_PATH, PROCESSED_PATH, PROCESSED_SCHEMA),
+        (FORECAST_CSV_PATH, FORECAST_PATH, FORECAST_SCHEMA),
+    ]:
+        if csv_path.exists():
+            write_table(pd.read_csv(csv_path), path, schema)
+            logger.success(f"Wrote {path} ({path.stat().st_size / 1e6:.1f} MB, CSV {csv_path.stat().st_size / 1e6:.1f} MB)")
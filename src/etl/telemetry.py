@@ -0,0 +1,311 @@
+import json
+import os
+import platform
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from pathlib import Path
+from loguru import logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPORT_DIR = Path("data/reports")
+# Exact Python allocation peaks per span; tracemalloc slows allocation-heavy code, so it is opt-in
+TRACE_ALLOCATIONS = os.getenv("EDUPREDICT_TRACEMALLOC") == "1"
+
+# ── Run reports ────────────────────────────────────────────────────────────────
+
+_report = ContextVar("report", default=None)
+_prefix = ContextVar("prefix", default="")
+_entry = ContextVar("entry", default=None)
+# Peak RSS seen so far by the innermost open span, as a one-item list it updates in place
+_span_peak = ContextVar("span_peak", default=None)
+
+
+def rss_mb() -> float | None:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+# Largest high-water mark read before a reset_peak_rss(), which also clears ru_maxrss
+_lifetime_peak_mb = 0.0
+
+
+def process_peak_rss_mb() -> float | None:
+    """High-water mark of this process's resident set size over its whole lifetime."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return max(peak / 2**20 if platform.system() == "Darwin" else peak / 2**10, _lifetime_peak_mb)
+
+
+def reset_peak_rss() -> bool:
+    """Restart the kernel's resident set high-water mark (VmHWM) from the current RSS; Linux only."""
+    global _lifetime_peak_mb
+    _lifetime_peak_mb = max(_lifetime_peak_mb, peak_rss_mb() or 0.0)
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def peak_rss_mb() -> float | None:
+    """Resident set high-water mark since the last reset_peak_rss()."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 2**10
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+@contextmanager
+def span(name: str):
+    """Record wall time and memory of the enclosed block in the active run report.
+
+    Spans nest: a span opened inside "predict" is recorded as "predict.<name>".
+    It yields the span's report entry, filled in on exit. Outside a run report
+    it does nothing and yields None.
+
+    peak_rss_mb is the span's own peak: the kernel's high-water mark is reset
+    when a span opens, and a closing span passes its peak on to its parent.
+    Where the mark cannot be reset it is None, and only the process-wide
+    process_peak_rss_mb is meaningful.
+    """
+    report = _report.get()
+    if report is None:
+        yield None
+        return
+
+    full_name = f"{_prefix.get()}{name}"
+    entry = {"name": full_name}
+    # Appended on entry so the report lists spans in the order they opened
+    report["spans"].append(entry)
+    token = _prefix.set(f"{full_name}.")
+    entry_token = _entry.set(entry)
+    # The high-water mark so far belongs to the enclosing span; fold it in before resetting
+    parent_peak = _span_peak.get()
+    if parent_peak is not None:
+        parent_peak[0] = max(parent_peak[0], peak_rss_mb() or 0.0)
+    resettable = reset_peak_rss()
+    peak = [rss_mb() or 0.0]
+    peak_token = _span_peak.set(peak)
+    if TRACE_ALLOCATIONS:
+        tracemalloc.reset_peak()
+    start = time.perf_counter()
+    try:
+        yield entry
+    finally:
+        peak[0] = max(peak[0], peak_rss_mb() or 0.0)
+        if parent_peak is not None:
+            parent_peak[0] = max(parent_peak[0], peak[0])
+        entry.update(
+            seconds=round(time.perf_counter() - start, 6),
+            rss_mb=rss_mb(),
+            peak_rss_mb=peak[0] if resettable else None,
+            process_peak_rss_mb=process_peak_rss_mb(),
+        )
+        if TRACE_ALLOCATIONS:
+            entry["python_peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        _span_peak.reset(peak_token)
+        _entry.reset(entry_token)
+        _prefix.reset(token)
+
+
+def reporting() -> bool:
+    """Whether a run report is collecting spans in this context."""
+    return _report.get() is not None
+
+
+def annotate(**fields) -> None:
+    """Add fields to the innermost open span; outside a run report it does nothing."""
+    entry = _entry.get()
+    if entry is not None:
+        entry.update(fields)
+
+
+@contextmanager
+def traced_peak():
+    """Yield a dict whose "bytes" is set, on exit, to the peak Python allocations inside the block.
+
+    The peak is measured above what was allocated on entry. tracemalloc is
+    started for the block if it is not tracing already.
+    """
+    started = not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = {"bytes": 0}
+    try:
+        yield result
+    finally:
+        result["bytes"] = tracemalloc.get_traced_memory()[1] - base
+        if started:
+            tracemalloc.stop()
+
+
+@contextmanager
+def run_report(name: str, path: Path | None = None, **meta):
+    """Collect the spans of one pipeline run and write them as JSON when it ends.
+
+    The report goes to path, or REPORT_DIR/<name>-<UTC timestamp>.json.
+    """
+    report = {
+        "run": name,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "meta": {**meta, "pid": os.getpid(), "python": platform.python_version()},
+        "spans": [],
+    }
+    token = _report.set(report)
+    if TRACE_ALLOCATIONS:
+        tracemalloc.start()
+    try:
+        with span(name):
+            yield report
+    finally:
+        _report.reset(token)
+        if TRACE_ALLOCATIONS:
+            tracemalloc.stop()
+        report["total_seconds"] = report["spans"][0]["seconds"]
+        report["process_peak_rss_mb"] = process_peak_rss_mb()
+        if path is None:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+            path = REPORT_DIR / f"{name}-{stamp}.json"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(report, indent=2) + "\n")
+        for s in report["spans"][1:]:
+            peak = s["peak_rss_mb"] if s["peak_rss_mb"] is not None else s["process_peak_rss_mb"] or 0
+            logger.info(f"{s['name']:<36} {s['seconds']:>9.3f}s  peak RSS {peak:>8.1f} MB")
+        logger.info(f"Run report written to {path}")
+
+
+# ── Prometheus metrics ─────────────────────────────────────────────────────────
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: tuple, values: tuple) -> str:
+    if not names:
+        return ""
+    return "{" + ",".join(f'{n}="{_escape(v)}"' for n, v in zip(names, values)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: tuple = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = tuple(labels[n] for n in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in values]
+        return lines
+
+
+class Collector:
+    """Metric whose samples come from collect() -> [(label values, value)] at scrape time.
+
+    Used for values something else already tracks, such as the served model
+    version or the interval MicroBatcher's cache statistics.
+    """
+
+    def __init__(self, name: str, help: str, type: str, labels: tuple, collect):
+        self.name, self.help, self.type, self.labels, self.collect = name, help, type, labels, collect
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{self.name}{_labels(self.labels, k)} {v}" for k, v in self.collect()]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: tuple = (), buckets: tuple = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = tuple(labels[n] for n in self.labels)
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][i] += 1
+            series[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = {k: (list(c), s) for k, (c, s) in self._series.items()}
+        for key, (counts, total) in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += count
+                labels = _labels((*self.labels, "le"), (*key, bound))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, key)} {total}")
+            lines.append(f"{self.name}_count{_labels(self.labels, key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+
+METRICS = Registry()
+
+INFERENCE_SECONDS = METRICS.register(Histogram(
+    "edupredict_inference_seconds",
+    "Model predict time per recursive forecast step, by kind of batch.",
+    labels=("kind", "step"),
+))
+INFERENCE_ROWS = METRICS.register(Counter(
+    "edupredict_inference_rows_total",
+    "Rows passed to the model, by kind of batch.",
+    labels=("kind",),
+))
@@ -1,8 +1,181 @@
-from sklearn.metrics import accuracy_score, classification_report
-
-class ModelEvaluator:
-    def evaluate(self, model, X_test, y_test):
-        preds = model.predict(X_test)
-        acc = accuracy_score(y_test, preds)
-        report = classification_report(y_test, preds)
-        return acc, report
\ No newline at end of file
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from src.etl.base_state import BASE_COLUMNS, FIELD_DEFAULTS, BaseState
+from src.etl.predict import HORIZONS, SCENARIOS, load_model, project_grid
+from src.etl.storage import EVALUATION_PATH, load_processed
+from src.etl.telemetry import run_report, span
+from src.models.train import TRAIN_END, VAL_END, evaluate, load_data, split
+
+# ── Backtesting ────────────────────────────────────────────────────────────────
+# Every country-year row is a forecast origin: its values seed the recursive
+# forecast exactly as the latest row per country does in predict.run, and each
+# step is scored against the enrollment recorded for that year, if any.
+
+def origin_rows(df: pd.DataFrame) -> pd.DataFrame:
+    """Rows that can seed a forecast, with each country's inputs forward-filled as of that year.
+
+    A forecast from year t sees what latest_rows would have returned at t.
+    """
+    df = df.sort_values(["country_code", "year"])
+    inputs = [c for c in FIELD_DEFAULTS if c in df.columns]
+    df[inputs] = df.groupby("country_code", observed=True)[inputs].ffill()
+    last_year = df["year"].max()
+    return df[df["enrollment_total"].notna() & (df["year"] < last_year)].reset_index(drop=True)
+
+
+def actuals(df: pd.DataFrame, origins: pd.DataFrame, steps: int) -> np.ndarray:
+    """Recorded enrollment of every origin row's country 1..steps years later, NaN where unknown."""
+    first, last = int(df["year"].min()), int(df["year"].max())
+    wide = df.pivot_table(index="country_code", columns="year", values="enrollment_total", observed=True)
+    rows = wide.index.get_indexer(origins["country_code"])
+    wide = wide.reindex(columns=range(first, last + 1)).to_numpy(dtype=np.float64)
+
+    years = origins["year"].to_numpy()[:, None] + np.arange(1, steps + 1)
+    inside = years <= last
+    values = np.full(years.shape, np.nan)
+    values[inside] = wide[np.broadcast_to(rows[:, None], years.shape)[inside], years[inside] - first]
+    return values
+
+
+# Per-process model and origin state, built once by _init_worker
+_backtest_state = {}
+
+
+def _init_worker(model, origins: pd.DataFrame, scenarios: dict, steps: int, nthread: int) -> None:
+    if hasattr(model, "set_params"):
+        model.set_params(n_jobs=nthread)
+    _backtest_state.update(
+        model=model,
+        state=BaseState.from_frame(origins),
+        base_years=origins["year"].to_numpy(),
+        gdp_growth=[s["gdp_growth"] for s in scenarios.values()],
+        edu_adj=[s["edu_adj"] for s in scenarios.values()],
+        steps=steps,
+    )
+
+
+def _replay(positions: np.ndarray) -> np.ndarray:
+    s = _backtest_state
+    return project_grid(s["state"], s["model"], s["gdp_growth"], s["edu_adj"], s["steps"],
+                        positions=positions, base_years=s["base_years"])
+
+
+def backtest(model, df: pd.DataFrame, scenarios: dict = SCENARIOS, steps: int = max(HORIZONS),
+             workers: int = 1) -> pd.DataFrame:
+    """Replay the recursive forecaster from every historical base year of every country.
+
+    Origin years are dealt out to `workers` processes, and each advances all
+    of its (origin, country, scenario) rows in lockstep, one predict call per
+    step. Returns one row per scored forecast: origin year, horizon, actual
+    and predicted enrollment, and the split the forecast year belongs to.
+    """
+    origins = origin_rows(df)
+    steps = min(steps, int(df["year"].max() - origins["year"].min()))
+    years = origins["year"].to_numpy()
+    origin_years = np.unique(years)
+    folds = [np.flatnonzero(np.isin(years, origin_years[w::workers])) for w in range(min(workers, len(origin_years)))]
+    nthread = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"Backtesting {len(origins):,} origins from {len(origin_years)} base years, "
+                f"{len(scenarios)} scenarios x {steps} steps on {workers} worker(s)")
+
+    initargs = (model, origins, scenarios, steps, nthread)
+    paths = np.empty((len(origins), len(scenarios), steps))
+    if workers <= 1:
+        _init_worker(*initargs)
+        results = [_replay(fold) for fold in folds]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=initargs) as pool:
+            results = list(pool.map(_replay, folds))
+    for fold, result in zip(folds, results):
+        paths[fold] = result
+
+    actual = actuals(df, origins, steps)
+    row, step = np.nonzero(~np.isnan(actual))
+    n_scen = len(scenarios)
+    forecast_year = years[row] + step + 1
+    errors = pd.DataFrame({
+        "country_code": np.tile(origins["country_code"].to_numpy()[row], n_scen),
+        "region": np.tile(origins["region"].to_numpy()[row], n_scen),
+        "origin": np.tile(years[row], n_scen),
+        "horizon": np.tile(step + 1, n_scen),
+        "forecast_year": np.tile(forecast_year, n_scen),
+        "scenario": np.repeat(list(scenarios), len(row)),
+        "actual": np.tile(actual[row, step], n_scen),
+        "predicted": paths[row, :, step].T.ravel(),
+        "split": np.tile(np.select([forecast_year <= TRAIN_END, forecast_year <= VAL_END],
+                                   ["train", "validation"], "test"), n_scen),
+    })
+    return errors
+
+
+def summarize(errors: pd.DataFrame, by: list) -> pd.DataFrame:
+    """Forecast count, RMSE, MAE, median and weighted APE, and bias (mean of predicted - actual) per group.
+
+    Weighted APE is total absolute error over total actual enrollment; unlike
+    a mean APE it is not dominated by the smallest countries.
+    """
+    error = errors["predicted"] - errors["actual"]
+    scored = errors.assign(
+        error=error,
+        abs_error=error.abs(),
+        sq_error=error**2,
+        ape=(error.abs() / errors["actual"]).where(errors["actual"] > 0),
+    )
+    summary = scored.groupby(by, observed=True).agg(
+        n=("error", "size"),
+        rmse=("sq_error", "mean"),
+        mae=("abs_error", "mean"),
+        mdape=("ape", "median"),
+        wape=("abs_error", "sum"),
+        actual=("actual", "sum"),
+        bias=("error", "mean"),
+    )
+    summary["rmse"] = np.sqrt(summary["rmse"])
+    summary["wape"] = summary["wape"] / summary.pop("actual")
+    return summary.reset_index()
+
+
+def run(path: Path = EVALUATION_PATH, workers: int = 1) -> dict:
+    """Split metrics and a full-history backtest of the current model, written to path as JSON."""
+    with run_report("evaluate", workers=workers):
+        with span("load"):
+            model, metadata = load_model()
+            df = load_data()
+            history = load_processed(BASE_COLUMNS)
+        with span("splits"):
+            _, val_df, test_df = split(df)
+            metrics = [evaluate(model, d, label) for d, label in [(val_df, "Validation"), (test_df, "Test")]]
+        with span("backtest"):
+            errors = backtest(model, history, workers=workers)
+        result = {
+            "model_version": metadata["version"],
+            "metrics": [{k: v for k, v in m.items() if k not in ("residuals", "predictions")} for m in metrics],
+            "backtest": {
+                "origins": [int(errors["origin"].min()), int(errors["origin"].max())],
+                "forecasts": len(errors),
+                **{f"by_{name}": summarize(errors, by).to_dict("records")
+                   for name, by in [("horizon", ["horizon"]), ("region", ["region"]),
+                                    ("scenario", ["scenario"]), ("split", ["split"])]},
+            },
+        }
+    for row in result["backtest"]["by_horizon"]:
+        if row["horizon"] in (1, *HORIZONS):
+            logger.info(f"[Backtest h={row['horizon']:>2}] RMSE={row['rmse']:,.0f} | WAPE={row['wape']:.1%} | MdAPE={row['mdape']:.1%} | n={row['n']:,}")
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(result, indent=2, default=float) + "\n")
+    logger.success(f"Evaluation of model {metadata['version']} written to {path}")
+    return result
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Evaluate the current EduPredict model")
+    parser.add_argument("--workers", type=int, default=1, help="Processes the backtest origin years are spread across")
+    args = parser.parse_args()
+    run(workers=args.workers)
@@ -0,0 +1,134 @@
+import argparse
+import hashlib
+import json
+import os
+import shutil
+from datetime import datetime, timezone
+from pathlib import Path
+from loguru import logger
+
+REGISTRY_DIR = Path("src/models/registry")
+CURRENT_PATH = REGISTRY_DIR / "CURRENT"
+
+# Used when nothing has been registered yet; adopted as a registered version by the first register()
+LEGACY_MODEL_PATH = Path("src/models/saved/edupredict_v1.pkl")
+LEGACY_VERSION = "v1.2.0"
+
+
+def file_hash(path: Path) -> str:
+    return hashlib.sha256(path.read_bytes()).hexdigest()
+
+
+def _atomic_write(path: Path, text: str) -> None:
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(text)
+    os.replace(tmp, path)
+
+
+def versions() -> list:
+    """Registered versions, oldest first."""
+    if not REGISTRY_DIR.exists():
+        return []
+    metadata = [json.loads(p.read_text()) for p in REGISTRY_DIR.glob("*/metadata.json")]
+    return [m["version"] for m in sorted(metadata, key=lambda m: m["created_at"])]
+
+
+def _semver(version: str) -> tuple | None:
+    parts = version.lstrip("v").split(".")
+    return tuple(int(p) for p in parts) if len(parts) == 3 and all(p.isdigit() for p in parts) else None
+
+
+def next_version() -> str:
+    major, minor, patch = max(filter(None, map(_semver, [LEGACY_VERSION, *versions()])))
+    return f"v{major}.{minor}.{patch + 1}"
+
+
+def current_version() -> str | None:
+    return CURRENT_PATH.read_text().strip() if CURRENT_PATH.exists() else None
+
+
+def register(model, metadata: dict, version: str | None = None, promote: bool = True,
+             files: dict | None = None) -> str:
+    """Store model and its metadata as a new immutable version, optionally making it current.
+
+    files maps extra file names to JSON documents stored next to the model,
+    e.g. the tuning search the model's parameters came from.
+    """
+    _adopt_legacy()
+    version = version or next_version()
+    artifact_dir = REGISTRY_DIR / version
+    if artifact_dir.exists():
+        raise ValueError(f"Model version {version} is already registered.")
+    artifact_dir.mkdir(parents=True)
+
+    model_path = artifact_dir / "model.pkl"
+    import joblib
+
+    joblib.dump(model, model_path)
+    metadata = {
+        **metadata,
+        "version": version,
+        "hash": file_hash(model_path),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+    }
+    for name, document in (files or {}).items():
+        _atomic_write(artifact_dir / name, json.dumps(document, indent=2, default=float))
+    _atomic_write(artifact_dir / "metadata.json", json.dumps(metadata, indent=2, default=float))
+    logger.success(f"Registered model {version} in {artifact_dir}")
+    if promote:
+        promote_version(version)
+    return version
+
+
+def _adopt_legacy() -> None:
+    """Copy the legacy artifact into the registry as LEGACY_VERSION, once.
+
+    Pinning or rolling back to LEGACY_VERSION then keeps serving that exact
+    file and hash whatever later happens to LEGACY_MODEL_PATH.
+    """
+    artifact_dir = REGISTRY_DIR / LEGACY_VERSION
+    if artifact_dir.exists() or not LEGACY_MODEL_PATH.exists():
+        return
+    artifact_dir.mkdir(parents=True)
+    shutil.copy2(LEGACY_MODEL_PATH, artifact_dir / "model.pkl")
+    metadata = {
+        "version": LEGACY_VERSION,
+        "hash": file_hash(artifact_dir / "model.pkl"),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "source": str(LEGACY_MODEL_PATH),
+    }
+    _atomic_write(artifact_dir / "metadata.json", json.dumps(metadata, indent=2))
+    logger.info(f"Registered legacy model {LEGACY_MODEL_PATH} as {LEGACY_VERSION}")
+
+
+def promote_version(version: str) -> None:
+    if version not in versions():
+        raise ValueError(f"Unknown model version {version}.")
+    REGISTRY_DIR.mkdir(parents=True, exist_ok=True)
+    _atomic_write(CURRENT_PATH, version + "\n")
+    logger.success(f"Current model is now {version}")
+
+
+def resolve(version: str | None = None) -> tuple:
+    """(model path, metadata) for version, the current pointer, or the legacy artifact."""
+    version = version or current_version()
+    if version is None or (version == LEGACY_VERSION and not (REGISTRY_DIR / version).exists()):
+        return LEGACY_MODEL_PATH, {"version": LEGACY_VERSION, "hash": file_hash(LEGACY_MODEL_PATH)}
+    artifact_dir = REGISTRY_DIR / version
+    return artifact_dir / "model.pkl", json.loads((artifact_dir / "metadata.json").read_text())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Inspect and promote registered EduPredict models")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List registered versions")
+    promote = sub.add_parser("promote", help="Point CURRENT at a registered version")
+    promote.add_argument("version")
+    args = parser.parse_args()
+
+    if args.command == "list":
+        current = current_version()
+        for v in versions():
+            print(f"{'*' if v == current else ' '} {v}")
+    else:
+        promote_version(args.version)
@@ -0,0 +1,57 @@
+import numpy as np
+
+
+class ShardedModel:
+    """Bundle of per-shard models; every row is predicted by the model of its shard.
+
+    Rows are routed by the value in one feature column (region_encoded), so
+    callers pass the same feature matrix they would pass a single model.
+    predict groups the rows of each shard into one batched call. Values
+    without a route go to the default shard.
+    """
+
+    def __init__(self, models: dict, routes: dict, default: str, column: int):
+        self.models = models    # shard name -> model
+        self.routes = routes    # routing value -> shard name
+        self.default = default
+        self.column = column
+
+        names = list(models)
+        self._models = [models[name] for name in names]
+        self._keys = np.array(sorted(routes), dtype=np.float64)
+        self._shards = np.array([names.index(routes[key]) for key in sorted(routes)], dtype=np.intp)
+        self._default = names.index(default)
+
+    def shards(self) -> dict:
+        """{shard name: routing values it serves}; the default shard also serves unrouted values."""
+        return {name: [key for key, shard in self.routes.items() if shard == name] for name in self.models}
+
+    def map(self, fn) -> "ShardedModel":
+        """The same routing over fn(model) of every shard, e.g. a compiled evaluator."""
+        return ShardedModel({name: fn(model) for name, model in self.models.items()},
+                            self.routes, self.default, self.column)
+
+    def set_params(self, **params) -> "ShardedModel":
+        for model in self._models:
+            if hasattr(model, "set_params"):
+                model.set_params(**params)
+        return self
+
+    def route(self, values: np.ndarray) -> np.ndarray:
+        """Index into self.models of the shard each routing value belongs to."""
+        if not len(self._keys):
+            return np.full(len(values), self._default, dtype=np.intp)
+        pos = np.minimum(np.searchsorted(self._keys, values), len(self._keys) - 1)
+        return np.where(self._keys[pos] == values, self._shards[pos], self._default)
+
+    def predict(self, X) -> np.ndarray:
+        X = np.asarray(X)
+        shards = self.route(X[:, self.column])
+        # Forecast batches are usually one region; skip the gather and scatter then
+        if len(shards) and (shards == shards[0]).all():
+            return self._models[shards[0]].predict(X)
+        out = np.empty(len(X), dtype=np.float32)
+        for shard in np.unique(shards):
+            rows = np.flatnonzero(shards == shard)
+            out[rows] = self._models[shard].predict(X[rows])
+        return out
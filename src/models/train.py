@@ -1,14 +1,22 @@
+import argparse
+import itertools
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-import joblib
-from pathlib import Path
+import xgboost as xgb
 from sklearn.metrics import mean_squared_error, mean_absolute_error, r2_score
 from xgboost import XGBRegressor
 from loguru import logger
 
-DATA_PATH = Path("data/processed/enrollment_ml_ready.csv")
-MODEL_DIR = Path("src/models/saved")
-MODEL_PATH = MODEL_DIR / "edupredict_v1.pkl"
+from src.etl.feature_engineering import REGION_ENCODE
+from src.etl.storage import PROCESSED_PATH, load_processed
+from src.etl.telemetry import run_report, span
+from src.models import registry
+from src.models.sharded import ShardedModel
+
+TUNING_FILE = "tuning.json"
 
 FEATURES = [
     "year_index",
@@ -25,10 +33,39 @@ TARGET = "enrollment_total"
 TRAIN_END = 2018
 VAL_END = 2021
 
+DEFAULT_PARAMS = {
+    "n_estimators": 400,
+    "max_depth": 5,
+    "learning_rate": 0.05,
+    "subsample": 0.8,
+    "colsample_bytree": 0.8,
+    "min_child_weight": 3,
+    "reg_alpha": 0.1,
+    "reg_lambda": 1.0,
+}
+
+# ── Tuning ─────────────────────────────────────────────────────────────────────
+# Rolling-origin CV over years <= TRAIN_END: fold k trains on years <= origin and
+# validates on the following CV_WINDOW years. The validation and test years stay
+# untouched, so validation metrics and residuals remain out-of-sample.
+CV_WINDOW = 3
+CV_ORIGINS = [2006, 2009, 2012, TRAIN_END - CV_WINDOW]
+PARAM_GRID = {
+    "max_depth": [3, 5, 7],
+    "learning_rate": [0.03, 0.05, 0.1],
+    "subsample": [0.8, 1.0],
+    "colsample_bytree": [0.8, 1.0],
+    "min_child_weight": [1, 3, 5],
+    "reg_alpha": [0.1],
+    "reg_lambda": [1.0],
+}
+MAX_ROUNDS = 2000
+EARLY_STOPPING_ROUNDS = 50
+
 
 def load_data() -> pd.DataFrame:
-    logger.info(f"Loading data from {DATA_PATH}")
-    return pd.read_csv(DATA_PATH)
+    logger.info(f"Loading data from {PROCESSED_PATH}")
+    return load_processed(["year", *FEATURES, TARGET])
 
 
 def split(df: pd.DataFrame):
@@ -39,17 +76,10 @@ def split(df: pd.DataFrame):
     return train, val, test
 
 
-def train(train_df: pd.DataFrame) -> XGBRegressor:
+def train(train_df: pd.DataFrame, params: dict | None = None) -> XGBRegressor:
     logger.info("Training XGBoost model...")
     model = XGBRegressor(
-        n_estimators=400,
-        max_depth=5,
-        learning_rate=0.05,
-        subsample=0.8,
-        colsample_bytree=0.8,
-        min_child_weight=3,
-        reg_alpha=0.1,
-        reg_lambda=1.0,
+        **(params or DEFAULT_PARAMS),
         random_state=42,
         n_jobs=-1,
     )
@@ -60,6 +90,61 @@ def train(train_df: pd.DataFrame) -> XGBRegressor:
     return model
 
 
+# ── Sharded training ───────────────────────────────────────────────────────────
+# One model per REGION_MAP region with at least MIN_SHARD_ROWS training rows.
+# Smaller regions and rows without a region (aggregates such as "Arab World",
+# region_encoded=-1) share a "rest" shard. A "global" model fitted on every row
+# serves region codes no shard was trained on.
+MIN_SHARD_ROWS = 500
+GLOBAL_SHARD = "global"
+
+
+def shard_plan(regions: np.ndarray) -> dict:
+    """{shard name: region_encoded values it covers}, largest shard first."""
+    names = {v: k for k, v in REGION_ENCODE.items()}
+    counts = pd.Series(regions).value_counts()
+    plan = {names[v]: [int(v)] for v, n in counts.items() if v in names and n >= MIN_SHARD_ROWS}
+    rest = [int(v) for v in counts.index if names.get(v) not in plan]
+    if rest:
+        plan["rest"] = rest
+    return plan
+
+
+def _fit_shard(task: tuple) -> tuple:
+    name, X, y, params, nthread = task
+    model = XGBRegressor(**params, random_state=42, n_jobs=nthread)
+    model.fit(X, y)
+    return name, model
+
+
+def train_sharded(train_df: pd.DataFrame, params: dict | None = None, workers: int = 1) -> ShardedModel:
+    """One XGBoost model per region shard plus a global fallback, fitted in parallel processes.
+
+    Each of the workers gets an equal share of the cores, so shards never
+    contend for threads.
+    """
+    regions = train_df["region_encoded"].to_numpy()
+    plan = shard_plan(regions)
+    nthread = max(1, (os.cpu_count() or 1) // workers)
+    X = train_df[FEATURES].fillna(0)
+    y = train_df[TARGET]
+    tasks = [(GLOBAL_SHARD, X, y, params or DEFAULT_PARAMS, nthread)]
+    for name, values in plan.items():
+        rows = np.isin(regions, values)
+        tasks.append((name, X[rows], y[rows], params or DEFAULT_PARAMS, nthread))
+    logger.info(f"Training {len(tasks)} shards on {workers} worker(s): "
+                + ", ".join(f"{t[0]} ({len(t[1]):,} rows)" for t in tasks))
+
+    if workers <= 1:
+        models = dict(map(_fit_shard, tasks))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            models = dict(pool.map(_fit_shard, tasks))
+    logger.success("Training complete.")
+    routes = {v: name for name, values in plan.items() for v in values}
+    return ShardedModel(models, routes, GLOBAL_SHARD, FEATURES.index("region_encoded"))
+
+
 def evaluate(model: XGBRegressor, df: pd.DataFrame, label: str) -> dict:
     X = df[FEATURES].fillna(0)
     y = df[TARGET]
@@ -67,24 +152,153 @@ def evaluate(model: XGBRegressor, df: pd.DataFrame, label: str) -> dict:
     rmse = np.sqrt(mean_squared_error(y, preds))
     mae = mean_absolute_error(y, preds)
     r2 = r2_score(y, preds)
+    # Log-ratio errors, used as the multiplicative noise of forecast simulations
+    valid = (y.to_numpy() > 0) & (preds > 0)
+    predictions = preds[valid].astype(np.float64)
+    residuals = np.log(y.to_numpy()[valid]) - np.log(predictions)
     logger.info(f"[{label}] RMSE={rmse:,.0f} | MAE={mae:,.0f} | R²={r2:.4f}")
-    return {"split": label, "rmse": rmse, "mae": mae, "r2": r2}
+    return {"split": label, "rmse": rmse, "mae": mae, "r2": r2, "residuals": residuals, "predictions": predictions}
+
+
+def cv_folds(years: np.ndarray) -> list:
+    return [
+        (np.flatnonzero(years <= origin), np.flatnonzero((years > origin) & (years <= origin + CV_WINDOW)))
+        for origin in CV_ORIGINS
+    ]
+
+
+def candidate_params(n_iter: int | None = None, seed: int = 42) -> list:
+    """Every PARAM_GRID combination, or a random sample of n_iter of them."""
+    keys = list(PARAM_GRID)
+    grid = [dict(zip(keys, values)) for values in itertools.product(*PARAM_GRID.values())]
+    if n_iter is not None and n_iter < len(grid):
+        grid = random.Random(seed).sample(grid, n_iter)
+    return grid
+
+
+# Per-process training matrix, built once by _init_worker and sliced per fold
+_cv_state = {}
+
+
+def _init_worker(X: np.ndarray, y: np.ndarray, years: np.ndarray, nthread: int) -> None:
+    dtrain = xgb.DMatrix(X, label=y, feature_names=FEATURES, nthread=nthread)
+    _cv_state.update(
+        nthread=nthread,
+        folds=[(dtrain.slice(tr), dtrain.slice(va), y[va]) for tr, va in cv_folds(years)],
+    )
+
+
+def _fit_fold(task: tuple) -> dict:
+    candidate, fold, params = task
+    dtrain, dval, y_val = _cv_state["folds"][fold]
+    booster = xgb.train(
+        {**params, "objective": "reg:squarederror", "eval_metric": "rmse", "seed": 42,
+         "nthread": _cv_state["nthread"]},
+        dtrain,
+        num_boost_round=MAX_ROUNDS,
+        evals=[(dval, "val")],
+        early_stopping_rounds=EARLY_STOPPING_ROUNDS,
+        verbose_eval=False,
+    )
+    preds = booster.predict(dval, iteration_range=(0, booster.best_iteration + 1))
+    return {
+        "candidate": candidate,
+        "fold": fold,
+        "origin": CV_ORIGINS[fold],
+        "best_iteration": int(booster.best_iteration),
+        "rmse": float(np.sqrt(mean_squared_error(y_val, preds))),
+        "mae": float(mean_absolute_error(y_val, preds)),
+    }
+
+
+def tune(df: pd.DataFrame, n_iter: int | None = None, workers: int = 1) -> dict:
+    """Rolling-origin CV search with early stopping, folds spread across processes.
+
+    Returns the winning parameters (n_estimators set to the mean best round
+    across its folds) together with every candidate's per-fold metrics.
+    """
+    df = df[df["year"] <= TRAIN_END]
+    X = df[FEATURES].fillna(0).to_numpy(dtype=np.float32)
+    y = df[TARGET].to_numpy(dtype=np.float32)
+    years = df["year"].to_numpy()
+
+    candidates = candidate_params(n_iter)
+    tasks = [(c, f, params) for c, params in enumerate(candidates) for f in range(len(CV_ORIGINS))]
+    nthread = max(1, (os.cpu_count() or 1) // workers)
+    logger.info(f"Tuning {len(candidates)} candidates x {len(CV_ORIGINS)} folds on {workers} worker(s)")
 
+    if workers <= 1:
+        _init_worker(X, y, years, nthread)
+        results = [_fit_fold(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(X, y, years, nthread)) as pool:
+            results = list(pool.map(_fit_fold, tasks))
 
-def save_model(model: XGBRegressor) -> None:
-    MODEL_DIR.mkdir(parents=True, exist_ok=True)
-    joblib.dump(model, MODEL_PATH)
-    logger.success(f"Model saved to {MODEL_PATH}")
+    scores = pd.DataFrame(results)
+    summary = scores.groupby("candidate").agg(rmse=("rmse", "mean"), mae=("mae", "mean"), rounds=("best_iteration", "mean"))
+    best = int(summary["rmse"].idxmin())
+    best_params = {**candidates[best], "n_estimators": int(round(summary.loc[best, "rounds"])) + 1}
+    logger.success(f"Best CV RMSE={summary.loc[best, 'rmse']:,.0f} with {best_params}")
+    return {
+        "params": best_params,
+        "cv_rmse": float(summary.loc[best, "rmse"]),
+        "cv_mae": float(summary.loc[best, "mae"]),
+        "folds": scores[scores["candidate"] == best].drop(columns="candidate").to_dict("records"),
+        "candidates": [
+            {"params": candidates[c], "cv_rmse": float(row["rmse"]), "cv_mae": float(row["mae"])}
+            for c, row in summary.iterrows()
+        ],
+        "cv": {"origins": CV_ORIGINS, "window": CV_WINDOW, "early_stopping_rounds": EARLY_STOPPING_ROUNDS},
+    }
 
 
-def run():
-    df = load_data()
-    train_df, val_df, test_df = split(df)
-    model = train(train_df)
-    evaluate(model, val_df, "Validation")
-    evaluate(model, test_df, "Test")
-    save_model(model)
+def run(tune_params: bool = False, n_iter: int | None = None, workers: int = 1,
+        version: str | None = None, promote: bool = True, shard: bool = False):
+    with run_report("train", tune=tune_params, n_iter=n_iter, workers=workers, shard=shard):
+        with span("load_data"):
+            df = load_data()
+            train_df, val_df, test_df = split(df)
+        params, tuning = None, None
+        if tune_params:
+            with span("tune"):
+                tuning = tune(df, n_iter=n_iter, workers=workers)
+            params = tuning["params"]
+        with span("train"):
+            model = train_sharded(train_df, params, workers) if shard else train(train_df, params)
+        with span("evaluate"):
+            metrics = [evaluate(model, val_df, "Validation"), evaluate(model, test_df, "Test")]
+        # Residuals travel with the model for forecast simulation, not as summary metrics
+        errors = [(m.pop("residuals"), m.pop("predictions")) for m in metrics]
+        with span("save"):
+            return registry.register(
+                model,
+                {
+                    "features": FEATURES,
+                    "target": TARGET,
+                    "train_years": [int(train_df["year"].min()), TRAIN_END],
+                    "val_years": [TRAIN_END + 1, VAL_END],
+                    "params": params or DEFAULT_PARAMS,
+                    **({"tuning": TUNING_FILE} if tuning else {}),
+                    **({"shards": model.shards()} if shard else {}),
+                    "metrics": metrics,
+                    "val_residuals": errors[0][0].tolist(),
+                    "val_predictions": errors[0][1].tolist(),
+                },
+                version=version,
+                promote=promote,
+                # The search travels with the version trained from it
+                files={TUNING_FILE: tuning} if tuning else None,
+            )
 
 
 if __name__ == "__main__":
-    run()
+    parser = argparse.ArgumentParser(description="Train the EduPredict model")
+    parser.add_argument("--tune", action="store_true", help="Select hyperparameters by rolling-origin CV first")
+    parser.add_argument("--n-iter", type=int, default=None, help="Random-search this many grid points instead of all")
+    parser.add_argument("--workers", type=int, default=1, help="Processes used to evaluate CV folds or fit shards")
+    parser.add_argument("--shard-by-region", action="store_true", help="Train one model per region and save them as a bundle")
+    parser.add_argument("--version", default=None, help="Registry version to create (default: next patch version)")
+    parser.add_argument("--no-promote", action="store_true", help="Register the model without making it current")
+    args = parser.parse_args()
+    run(tune_params=args.tune, n_iter=args.n_iter, workers=args.workers, version=args.version, promote=not args.no_promote,
+        shard=args.shard_by_region)
@@ -0,0 +1,294 @@
+import argparse
+import ast
+import hashlib
+import importlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from loguru import logger
+
+from src.etl.forecast_paths import output_files
+from src.etl.predict import SCENARIOS, SIM_PATHS
+from src.etl.storage import (
+    EVALUATION_PATH,
+    FORECAST_CSV_PATH,
+    FORECAST_PATH,
+    LATEST_STATE_PATH,
+    PROCESSED_CSV_PATH,
+    PROCESSED_PATH,
+    RAW_PATH,
+)
+from src.models.registry import CURRENT_PATH, REGISTRY_DIR
+
+STATE_PATH = Path("data/.orchestrator.json")
+# Stages run in parallel worker processes when their dependencies allow it
+DEFAULT_JOBS = 2
+# Files modified this recently are re-hashed next time: a rewrite within the
+# same mtime tick could otherwise keep a stale cached hash
+RACY_SECONDS = 2.0
+# Bytes read at a time when hashing a file
+HASH_CHUNK = 1 << 20
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One step of the DAG, run as target(**params, **options) in a worker process.
+
+    It is skipped when a previous run recorded the same key (a hash of its
+    input files, the source of every project module its target imports, and
+    params) and its outputs are still the files that run produced. options,
+    e.g. worker counts, do not change the outputs and are not part of the key.
+    When registers is set, the target returns the model version it registered
+    and that immutable artifact is recorded as an output, not the CURRENT
+    pointer, which a manual promote or rollback may move.
+    """
+
+    name: str
+    target: str  # "module:function"
+    deps: tuple = ()
+    inputs: tuple = ()
+    outputs: tuple = ()
+    params: dict = field(default_factory=dict)
+    options: dict = field(default_factory=dict)
+    registers: bool = False
+
+
+def stages(n_paths: int, tune: bool, n_iter: int | None, workers: int, refresh: bool, shard: bool = False,
+           compact: bool = False) -> list:
+    # The compact store also exports forecast_output for existing consumers
+    forecasts = (FORECAST_PATH, FORECAST_CSV_PATH, *(output_files(list(SCENARIOS)) if compact else ()))
+    return [
+        # Remote data has no input files to key on, so fetch only runs when asked for and then
+        # always runs; its own page cache makes a rerun cheap and an unchanged raw file skips the ETL
+        Stage("fetch", "fetch_data:run", outputs=(RAW_PATH,), options={"refresh": refresh}),
+        Stage("etl", "src.etl.pipeline:run", deps=("fetch",), inputs=(RAW_PATH,),
+              outputs=(PROCESSED_PATH, PROCESSED_CSV_PATH, LATEST_STATE_PATH), options={"workers": workers}),
+        Stage("train", "src.models.train:run", deps=("etl",), inputs=(PROCESSED_PATH,), registers=True,
+              params={"tune_params": tune, "n_iter": n_iter, "shard": shard}, options={"workers": workers}),
+        Stage("evaluate", "src.models.evaluate:run", deps=("etl", "train"), inputs=(PROCESSED_PATH, CURRENT_PATH),
+              outputs=(EVALUATION_PATH,), options={"path": EVALUATION_PATH, "workers": workers}),
+        Stage("predict", "src.etl.predict:run", deps=("etl", "train"), inputs=(PROCESSED_PATH, CURRENT_PATH),
+              outputs=forecasts, params={"n_paths": n_paths, "compact": compact}),
+    ]
+
+
+class FileHashes:
+    """sha256 of files, cached by (size, mtime) so unchanged files are not re-read."""
+
+    def __init__(self, cache: dict):
+        self.cache = cache
+
+    def __call__(self, path: Path) -> str | None:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+        cached = self.cache.get(str(path))
+        if cached and cached[:2] == [st.st_size, st.st_mtime_ns]:
+            return cached[2]
+        sha = hashlib.sha256()
+        with open(path, "rb") as f:
+            while chunk := f.read(HASH_CHUNK):
+                sha.update(chunk)
+        digest = sha.hexdigest()
+        if time.time() - st.st_mtime > RACY_SECONDS:
+            self.cache[str(path)] = [st.st_size, st.st_mtime_ns, digest]
+        return digest
+
+
+def _module_path(name: str) -> Path | None:
+    path = Path(*name.split("."))
+    for candidate in (path.with_suffix(".py"), path / "__init__.py"):
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def code_files(module: str) -> list:
+    """Source files of module and every project module it imports, directly or not.
+
+    Imports inside functions count too, so lazily imported code such as the
+    trainer that load_residuals falls back on is part of the closure.
+    Installed packages are not followed.
+    """
+    seen, todo = {}, [module]
+    while todo:
+        name = todo.pop()
+        path = _module_path(name)
+        if path is None or name in seen:
+            continue
+        seen[name] = path
+        for node in ast.walk(ast.parse(path.read_text(), str(path))):
+            if isinstance(node, ast.Import):
+                names = [alias.name for alias in node.names]
+            elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+                names = [node.module, *(f"{node.module}.{alias.name}" for alias in node.names)]
+            else:
+                continue
+            # "import a.b.c" also runs a and a.b
+            todo.extend(".".join(n.split(".")[:i]) for n in names for i in range(1, n.count(".") + 2))
+    return sorted(str(p) for p in seen.values())
+
+
+def stage_key(stage: Stage, hashes: FileHashes) -> str:
+    payload = {
+        "inputs": {str(p): hashes(p) for p in stage.inputs},
+        "code": {p: hashes(Path(p)) for p in code_files(stage.target.split(":")[0])},
+        "params": stage.params,
+    }
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def up_to_date(stage: Stage, key: str, record: dict | None, hashes: FileHashes) -> bool:
+    return (
+        record is not None
+        and record["key"] == key
+        and all(hashes(Path(p)) == digest for p, digest in record["outputs"].items())
+    )
+
+
+def select(all_stages: list, targets: list, fetch: bool) -> list:
+    """targets and everything upstream of them, in DAG order; fetch only if named or requested."""
+    by_name = {s.name: s for s in all_stages}
+    unknown = set(targets) - set(by_name)
+    if unknown:
+        raise SystemExit(f"Unknown stage(s): {', '.join(sorted(unknown))}. Stages: {', '.join(by_name)}")
+    wanted, todo = set(), list(targets or by_name)
+    while todo:
+        name = todo.pop()
+        if name not in wanted:
+            wanted.add(name)
+            todo.extend(by_name[name].deps)
+    if not fetch and "fetch" not in targets:
+        wanted.discard("fetch")
+    return [s for s in all_stages if s.name in wanted]
+
+
+def load_state() -> dict:
+    if STATE_PATH.exists():
+        return json.loads(STATE_PATH.read_text())
+    return {"files": {}, "stages": {}}
+
+
+def save_state(state: dict) -> None:
+    STATE_PATH.parent.mkdir(parents=True, exist_ok=True)
+    tmp = STATE_PATH.with_name(f".{STATE_PATH.name}.tmp")
+    tmp.write_text(json.dumps(state, indent=2))
+    os.replace(tmp, STATE_PATH)
+
+
+def _call(target: str, kwargs: dict, registers: bool) -> tuple:
+    module, name = target.split(":")
+    start = time.perf_counter()
+    result = getattr(importlib.import_module(module), name)(**kwargs)
+    # Only a registered version comes back; other results stay in the worker
+    return time.perf_counter() - start, result if registers else None
+
+
+def outputs_of(stage: Stage, result) -> list:
+    if stage.registers:
+        return [*stage.outputs, REGISTRY_DIR / result / "model.pkl"]
+    return list(stage.outputs)
+
+
+def run(selected: list, force: set, jobs: int = DEFAULT_JOBS, dry_run: bool = False) -> dict:
+    """Run the selected stages, each as soon as its dependencies are done.
+
+    Returns {stage: "skipped" | "ran" | "failed" | "blocked" | "would run"}.
+    """
+    state = load_state()
+    hashes = FileHashes(state["files"])
+    names = {s.name for s in selected}
+    pending = {s.name: s for s in selected}
+    status, running = {}, {}
+
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        while pending or running:
+            progressed = True
+            while progressed:
+                progressed = False
+                for name, stage in list(pending.items()):
+                    deps = [d for d in stage.deps if d in names]
+                    if any(status.get(d) in ("failed", "blocked") for d in deps):
+                        status[name] = "blocked"
+                    elif all(status.get(d) in ("skipped", "ran", "would run") for d in deps):
+                        key = stage_key(stage, hashes)
+                        fresh = name not in force and up_to_date(stage, key, state["stages"].get(name), hashes)
+                        if dry_run:
+                            upstream = any(status[d] == "would run" for d in deps)
+                            status[name] = "skipped" if fresh and not upstream else "would run"
+                        elif fresh:
+                            status[name] = "skipped"
+                            logger.info(f"{name}: up to date, skipped")
+                        else:
+                            logger.info(f"{name}: running {stage.target}")
+                            kwargs = {**stage.params, **stage.options}
+                            future = pool.submit(_call, stage.target, kwargs, stage.registers)
+                            running[future] = (stage, key)
+                            status[name] = "running"
+                    else:
+                        continue
+                    del pending[name]
+                    progressed = True
+
+            if not running:
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                stage, key = running.pop(future)
+                try:
+                    seconds, result = future.result()
+                except Exception as e:
+                    status[stage.name] = "failed"
+                    logger.error(f"{stage.name}: failed: {e!r}")
+                    continue
+                status[stage.name] = "ran"
+                state["stages"][stage.name] = {
+                    "key": key,
+                    "outputs": {str(p): hashes(p) for p in outputs_of(stage, result)},
+                    "seconds": round(seconds, 3),
+                    "finished_at": datetime.now(timezone.utc).isoformat(),
+                }
+                logger.success(f"{stage.name}: done in {seconds:.1f}s")
+                save_state(state)
+
+    if not dry_run:
+        save_state(state)
+    return status
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the EduPredict pipeline as a DAG, skipping up-to-date stages")
+    parser.add_argument("targets", nargs="*", help="Stages to bring up to date, with their upstream (default: all)")
+    parser.add_argument("--fetch", action="store_true", help="Also download fresh World Bank data first")
+    parser.add_argument("--refresh", action="store_true", help="Revalidate every cached World Bank page")
+    parser.add_argument("--force", nargs="*", default=None, metavar="STAGE",
+                        help="Rerun these stages (all selected ones if none are named) even when up to date")
+    parser.add_argument("--dry-run", action="store_true", help="Only report which stages would run")
+    parser.add_argument("--jobs", type=int, default=DEFAULT_JOBS, help="Stages run in parallel")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes inside the ETL, tuning and backtest")
+    parser.add_argument("--tune", action="store_true", help="Tune hyperparameters before training")
+    parser.add_argument("--shard-by-region", action="store_true", help="Train one model per region")
+    parser.add_argument("--compact", action="store_true", help="Write forecasts as compact per-scenario paths")
+    parser.add_argument("--n-iter", type=int, default=None, help="Random-search this many grid points when tuning")
+    parser.add_argument("--paths", type=int, default=SIM_PATHS, help="Monte Carlo paths per country and scenario")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    all_stages = stages(args.paths, args.tune, args.n_iter, args.workers, args.refresh, args.shard_by_region,
+                        args.compact)
+    selected = select(all_stages, args.targets, args.fetch)
+    force = {s.name for s in selected} if args.force == [] else set(args.force or ())
+    if args.fetch or "fetch" in args.targets:
+        force.add("fetch")
+    status = run(selected, force, args.jobs, args.dry_run)
+    for name, outcome in status.items():
+        logger.info(f"{name:<10} {outcome}")
+    logger.info(f"Finished in {time.perf_counter() - start:.2f}s")
+    if any(outcome in ("failed", "blocked") for outcome in status.values()):
+        sys.exit(1)
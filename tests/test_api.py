@@ -0,0 +1,284 @@
+import time
+from pathlib import Path
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+from xgboost import XGBRegressor
+
+from app import main
+from src.etl import snapshot
+from src.etl.predict import load_model
+from src.models import registry
+from src.models.compiled import CompiledEnsemble
+
+ROOT = Path(__file__).resolve().parents[1]
+
+
+def wait_for(condition, timeout: float = 60.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.05)
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    """The API over the repository's processed data and legacy model, with a scratch registry and snapshots."""
+    tmp = tmp_path_factory.mktemp("api")
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(ROOT)
+        mp.setattr(snapshot, "SNAPSHOT_DIR", tmp / "snapshots")
+        mp.setattr(registry, "REGISTRY_DIR", tmp / "registry")
+        mp.setattr(registry, "CURRENT_PATH", tmp / "registry" / "CURRENT")
+        mp.setattr(main, "RELOAD_INTERVAL_SECONDS", 0.05)
+        with TestClient(main.app) as client:
+            wait_for(lambda: client.get("/ready").status_code == 200)
+            yield client
+
+
+def test_predict(client):
+    res = main.resources
+    pos = res.base_state.lookup("US")
+    body = client.post("/predict", json={"country_code": "us", "horizon": 10, "scenario": "optimistic"}).json()
+
+    assert body["country_code"] == "US" and body["country_name"] == "United States"
+    assert body["scenario"] == "optimistic" and body["model_version"] == res.version
+    points = body["forecasts"]
+    assert [p["forecast_year"] for p in points] == list(range(main.BASE_YEAR + 1, main.BASE_YEAR + 11))
+    predicted = [p["predicted_enrollment"] for p in points]
+    np.testing.assert_array_equal(predicted, np.round(res.paths[pos, main.SCENARIO_INDEX["optimistic"], :10]))
+    assert all(p["lower_bound"] <= p["predicted_enrollment"] <= p["upper_bound"] for p in points)
+
+
+def test_predict_serves_repeats_from_cache(client):
+    request = {"country_code": "FR", "horizon": 15, "n_paths": 300}
+    first = client.post("/predict", json=request).json()
+    hits = main.intervals.stats["hit"]
+    # A shorter horizon is a prefix of the same cached simulation
+    second = client.post("/predict", json={**request, "horizon": 5}).json()
+    assert main.intervals.stats["hit"] == hits + 1
+    assert second["forecasts"] == first["forecasts"][:5]
+
+
+@pytest.mark.parametrize("request_body, status", [
+    ({"country_code": "XXX"}, 404),
+    ({"country_code": "US", "horizon": 7}, 422),
+    ({"country_code": "US", "scenario": "utopian"}, 422),
+    ({"country_code": "US", "n_paths": 10}, 422),
+])
+def test_predict_rejects_bad_requests(client, request_body, status):
+    assert client.post("/predict", json=request_body).status_code == status
+
+
+def test_sweep_grid_matches_scenario_paths(client):
+    res = main.resources
+    body = client.post("/scenarios/sweep", json={
+        "country_codes": ["US", "FR"], "gdp_growth": [-0.01, 0.0, 0.015], "edu_adj": [-0.003, 0.0, 0.005],
+        "horizon": 10,
+    }).json()
+
+    assert body["model_version"] == res.version
+    assert body["forecast_years"] == list(range(main.BASE_YEAR + 1, main.BASE_YEAR + 11))
+    rows = list(zip(body["country_code"], body["gdp_growth"], body["edu_adj"]))
+    assert len(rows) == len(body["predicted_enrollment"]) == 2 * 9
+    assert rows[:3] == [("US", -0.01, -0.003), ("US", -0.01, 0.0), ("US", -0.01, 0.005)]
+    # Grid points equal to a named scenario reproduce its precomputed path
+    for code in ("US", "FR"):
+        for name, scenario in main.SCENARIOS.items():
+            path = body["predicted_enrollment"][rows.index((code, scenario["gdp_growth"], scenario["edu_adj"]))]
+            expected = res.paths[res.base_state.lookup(code), main.SCENARIO_INDEX[name], :10]
+            np.testing.assert_allclose(path, np.round(expected))
+
+
+def test_sweep_by_region(client):
+    state = main.resources.base_state
+    region = state.regions[0]
+    body = client.post("/scenarios/sweep", json={"region": region, "gdp_growth": [0.0], "edu_adj": [0.0, 0.01]}).json()
+    assert sorted(set(body["country_code"])) == sorted(state.codes[state.regions == region])
+    assert all(len(path) == main.MAX_HORIZON for path in body["predicted_enrollment"])
+
+
+@pytest.mark.parametrize("request_body, status", [
+    ({"country_codes": ["US"], "region": "Other", "gdp_growth": [0.0], "edu_adj": [0.0]}, 422),
+    ({"gdp_growth": [0.0], "edu_adj": [0.0]}, 422),
+    ({"country_codes": ["US"], "gdp_growth": [], "edu_adj": [0.0]}, 422),
+    ({"country_codes": ["US", "XXX"], "gdp_growth": [0.0], "edu_adj": [0.0]}, 404),
+    ({"region": "Atlantis", "gdp_growth": [0.0], "edu_adj": [0.0]}, 404),
+    ({"country_codes": ["US", "FR"], "gdp_growth": [0.0] * 3, "edu_adj": [0.0] * 4}, 422),
+])
+def test_sweep_rejects_bad_requests(client, monkeypatch, request_body, status):
+    # The last case is 2 countries x 12 grid points, above this limit
+    monkeypatch.setattr(main, "MAX_SWEEP_ROWS", 20)
+    assert client.post("/scenarios/sweep", json=request_body).status_code == status
+
+
+def test_ready_waits_for_snapshot_and_model(client, monkeypatch):
+    res = main.resources
+    assert client.get("/ready").json() == {
+        "ready": True, "snapshot_loaded": True, "model_loaded": True, "model_version": res.version, "error": None,
+    }
+
+    # Snapshot attached, model still loading in the background
+    cold = main.Resources(res.version, res.key, res.base_state, res.paths)
+    monkeypatch.setattr(main, "resources", cold)
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json()["snapshot_loaded"] and not response.json()["model_loaded"]
+    assert client.get("/health").json() == {"status": "ok", "model_loaded": True, "model_version": res.version}
+
+    # Nothing loaded: the registry watcher keeps retrying, and failing, meanwhile
+    def fail(version=None):
+        raise RuntimeError("no model")
+
+    monkeypatch.setattr(main, "build_resources", fail)
+    monkeypatch.setattr(main, "resources", None)
+    monkeypatch.setattr(main, "load_error", "no model")
+    response = client.get("/ready")
+    assert response.status_code == 503
+    assert response.json() == {
+        "ready": False, "snapshot_loaded": False, "model_loaded": False, "model_version": None, "error": "no model",
+    }
+    assert client.post("/predict", json={"country_code": "US"}).status_code == 503
+
+
+def test_api_imports_no_heavy_libraries():
+    import subprocess
+    import sys
+
+    code = "import sys, app.main; print(sorted(m for m in ('pandas', 'xgboost', 'sklearn') if m in sys.modules))"
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == "[]"
+
+
+def read_export(response) -> "pd.DataFrame":
+    import io
+    import pandas as pd
+    import pyarrow as pa
+
+    if response.headers["content-type"].startswith("application/vnd.apache.arrow.stream"):
+        return pa.ipc.open_stream(response.content).read_all().to_pandas()
+    if response.headers["content-type"].startswith("application/x-ndjson"):
+        return pd.read_json(io.BytesIO(response.content), lines=True, dtype=False)
+    return pd.read_csv(io.BytesIO(response.content), keep_default_na=False)
+
+
+def test_forecasts_stream_every_format_alike(client, monkeypatch):
+    import pandas as pd
+
+    # Several chunks, the last one partial
+    monkeypatch.setattr(main, "EXPORT_CHUNK_COUNTRIES", 50)
+    res = main.resources
+    expected = pd.DataFrame(main.forecast_columns(
+        res.base_state, res.paths, res.version, np.arange(len(res.base_state)), list(main.SCENARIOS),
+        list(range(len(main.SCENARIOS))), main.HORIZONS,
+    ))[[c for c in main.COLUMNS if c not in main.BOUND_COLUMNS]]
+
+    for fmt, extension in [("csv", "csv"), ("ndjson", "ndjson"), ("arrow", "arrows")]:
+        response = client.get("/forecasts", params={"format": fmt})
+        assert response.status_code == 200
+        assert response.headers["content-disposition"] == f'attachment; filename="forecasts-{res.version}.{extension}"'
+        got = read_export(response)
+        assert list(got.columns) == list(expected.columns)
+        pd.testing.assert_frame_equal(got.astype(str), expected.astype(str), check_dtype=False)
+
+
+def test_forecasts_bounds_match_predict(client):
+    request = {"scenario": "pessimistic", "horizon": 10, "include_bounds": "true", "n_paths": 200}
+    got = read_export(client.get("/forecasts", params={**request, "format": "ndjson"}))
+    state = main.resources.base_state
+    assert len(got) == len(state) * 10 and set(got["scenario"]) == {"pessimistic"}
+
+    us = got[got["country_code"] == "US"]
+    points = client.post("/predict", json={"country_code": "US", "horizon": 10, "scenario": "pessimistic",
+                                            "n_paths": 200}).json()["forecasts"]
+    assert us["lower_bound"].tolist() == [p["lower_bound"] for p in points]
+    assert us["upper_bound"].tolist() == [p["upper_bound"] for p in points]
+    assert (got["lower_bound"] <= got["predicted_enrollment"]).all()
+    assert (got["predicted_enrollment"] <= got["upper_bound"]).all()
+
+
+@pytest.mark.parametrize("params, status", [
+    ({"horizon": 7}, 422),
+    ({"region": "Atlantis"}, 404),
+    ({"format": "xml"}, 422),
+    ({"scenario": "utopian"}, 422),
+])
+def test_forecasts_rejects_bad_requests(client, params, status):
+    assert client.get("/forecasts", params=params).status_code == status
+
+
+def test_openapi_examples_are_served(client):
+    schemas = client.get("/openapi.json").json()["components"]["schemas"]
+
+    def example(name: str) -> dict:
+        return {field: spec["example"] for field, spec in schemas[name]["properties"].items() if "example" in spec}
+
+    assert client.post("/predict", json=example("PredictRequest")).status_code == 200
+    body = client.post("/scenarios/sweep", json=example("SweepRequest")).json()
+    assert sorted(set(body["country_code"])) == ["FR", "US"]
+
+
+def scrape(client) -> dict:
+    """{sample name with labels: value} from /metrics."""
+    text = client.get("/metrics").text
+    return {line.rsplit(" ", 1)[0]: float(line.rsplit(" ", 1)[1]) for line in text.splitlines() if not line.startswith("#")}
+
+
+def test_metrics_count_predict_requests_and_inference_rows(client):
+    request_count = 'edupredict_http_request_duration_seconds_count{route="/predict",method="POST",status="200"}'
+    rows = 'edupredict_inference_rows_total{kind="simulation"}'
+    before = scrape(client)
+    # A path count no other test uses, so the interval is simulated rather than served from cache
+    assert client.post("/predict", json={"country_code": "DE", "n_paths": 137}).status_code == 200
+    after = scrape(client)
+
+    assert after[request_count] == before.get(request_count, 0) + 1
+    assert after[rows] > before.get(rows, 0)
+    assert after['edupredict_interval_cache_requests_total{result="miss"}'] >= 1
+    assert after[f'edupredict_model_info{{version="{main.resources.version}"}}'] == 1
+    assert 'edupredict_inference_seconds_count{kind="simulation",step="1"}' in after
+
+
+@pytest.mark.parametrize("backend, shared", [("xgboost", False), ("compiled", True)])
+def test_only_the_compiled_backend_is_shared_by_workers(tmp_path, monkeypatch, backend, shared):
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", tmp_path / "snapshots")
+    monkeypatch.setattr(registry, "REGISTRY_DIR", tmp_path / "registry")
+    monkeypatch.setattr(registry, "CURRENT_PATH", tmp_path / "registry" / "CURRENT")
+    monkeypatch.setattr(main, "INFERENCE_BACKEND", backend)
+    monkeypatch.setattr(main, "load_model", lambda version=None: load_model(backend, version))
+
+    # The first worker builds the snapshot, the second attaches to it
+    first, second = main.build_resources(), main.build_resources()
+    assert first.key == second.key
+    for res in (first, second):
+        assert (res.shared_model is not None) == shared
+    if shared:
+        assert isinstance(second.model, CompiledEnsemble) and isinstance(second.model.feature, np.memmap)
+    else:
+        assert isinstance(second.model, XGBRegressor) and second.model is not first.model
+
+
+def test_hot_reload_follows_promote_and_rollback(client):
+    import joblib
+
+    def served() -> str:
+        return client.post("/predict", json={"country_code": "US"}).json()["model_version"]
+
+    assert served() == registry.LEGACY_VERSION
+    good = registry.register(joblib.load(registry.LEGACY_MODEL_PATH), {"source": "test"})
+    wait_for(lambda: served() == good)
+    assert client.get("/ready").json() == {
+        "ready": True, "snapshot_loaded": True, "model_loaded": True, "model_version": good, "error": None,
+    }
+
+    # A version that fails to load is reported, and the previous one keeps serving
+    broken = registry.register({"not": "a model"}, {"source": "test"})
+    wait_for(lambda: client.get("/ready").json()["error"] is not None)
+    assert served() == good
+
+    registry.promote_version(registry.LEGACY_VERSION)
+    wait_for(lambda: served() == registry.LEGACY_VERSION)
+    assert client.get("/ready").json()["error"] is None
+    assert broken in registry.versions()
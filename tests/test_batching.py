@@ -0,0 +1,110 @@
+import asyncio
+import gc
+import threading
+import weakref
+
+import pytest
+
+from app.batching import MicroBatcher
+
+
+class Model:
+    """A stand-in group: run(model, items) squares each item and records the call."""
+
+    def __init__(self, version: str = "v1"):
+        self.version = version
+        self.calls = []
+
+
+def square(model: Model, items: list) -> list:
+    model.calls.append(list(items))
+    return [x * x for x in items]
+
+
+def batcher(run=square, **kwargs) -> MicroBatcher:
+    return MicroBatcher("test", run, window=0.01, max_rows=kwargs.pop("max_rows", 100), **kwargs)
+
+
+def test_concurrent_submits_share_one_batch():
+    model, b = Model(), batcher()
+
+    async def main():
+        results = await asyncio.gather(*(b.submit(model, x) for x in [1, 2, 3, 2, 1]))
+        cached = await b.submit(model, 3)
+        return results, cached
+
+    results, cached = asyncio.run(main())
+    assert results == [1, 4, 9, 4, 1]
+    assert cached == 9
+    assert model.calls == [[1, 2, 3]]
+    assert b.stats == {"miss": 3, "shared": 2, "hit": 1}
+
+
+def test_batches_respect_max_rows():
+    model, b = Model(), batcher(max_rows=4, rows=lambda item: 2)
+
+    async def main():
+        return await asyncio.gather(*(b.submit(model, x) for x in range(5)))
+
+    assert asyncio.run(main()) == [0, 1, 4, 9, 16]
+    assert model.calls == [[0, 1], [2, 3], [4]]
+
+
+@pytest.mark.parametrize("run", [
+    lambda model, items: 1 / 0,
+    # Fewer results than items fails in the fan-out, after the run itself succeeded
+    lambda model, items: [0] * (len(items) - 1),
+])
+def test_failed_batch_fails_every_request_and_keeps_draining(run):
+    model, b = Model(), batcher(run)
+
+    async def main():
+        failed = await asyncio.gather(*(b.submit(model, x) for x in [1, 2, 3]), return_exceptions=True)
+        b.run = square
+        return failed, await b.submit(model, 4)
+
+    failed, after = asyncio.run(main())
+    assert all(isinstance(e, Exception) for e in failed)
+    assert after == 16
+
+
+def test_cancelled_request_does_not_cancel_shared_work():
+    model = Model()
+    started, release = threading.Event(), threading.Event()
+
+    def slow(model, items):
+        started.set()
+        release.wait(5)
+        return square(model, items)
+
+    b = batcher(slow)
+
+    async def main():
+        first = asyncio.create_task(b.submit(model, 3))
+        second = asyncio.create_task(b.submit(model, 3))
+        await asyncio.to_thread(started.wait, 5)
+        first.cancel()
+        release.set()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        return await second, await b.submit(model, 3)
+
+    assert asyncio.run(main()) == (9, 9)
+    assert model.calls == [[3]]
+
+
+def test_cache_does_not_keep_superseded_groups_alive():
+    b = batcher(group_key=lambda model: model.version)
+
+    async def main():
+        old = Model("v1")
+        await b.submit(old, 2)
+        return weakref.ref(old)
+
+    old = asyncio.run(main())
+    gc.collect()
+    assert old() is None
+    # A new object for the same version reuses the cached result
+    model = Model("v1")
+    assert asyncio.run(b.submit(model, 2)) == 4
+    assert model.calls == []
@@ -0,0 +1,40 @@
+import copy
+import json
+
+from benchmarks.run import DEFAULT_TOLERANCE, HIGHER_IS_BETTER, baseline_path, compare
+
+
+def scaled(report: dict, factor: float) -> dict:
+    """report with every timing multiplied by factor, and throughput divided by it."""
+    report = copy.deepcopy(report)
+    for metrics in report["results"].values():
+        for metric, value in metrics.items():
+            if isinstance(value, float):
+                metrics[metric] = value / factor if metric in HIGHER_IS_BETTER else value * factor
+    return report
+
+
+def test_compare_flags_regressions_beyond_tolerance():
+    baseline = json.loads(baseline_path(500, 34).read_text())
+    assert compare(baseline, baseline, DEFAULT_TOLERANCE) == []
+    assert compare(scaled(baseline, 1 + DEFAULT_TOLERANCE / 2), baseline, DEFAULT_TOLERANCE) == []
+    # Faster is never a regression
+    assert compare(scaled(baseline, 0.5), baseline, DEFAULT_TOLERANCE) == []
+
+    slower = scaled(baseline, 2)
+    regressions = compare(slower, baseline, DEFAULT_TOLERANCE)
+    flagged = {line.split(":")[0] for line in regressions}
+    assert "pipeline.transform.seconds" in flagged
+    assert any(name.endswith(".rps") for name in flagged)
+    assert not any(name.endswith((".requests", ".errors", ".concurrency")) for name in flagged)
+
+    # One slow stage is reported alone, with its change
+    one = copy.deepcopy(baseline)
+    one["results"]["train.train"]["seconds"] *= 1.5
+    assert compare(one, baseline, DEFAULT_TOLERANCE) == [
+        f"train.train.seconds: {baseline['results']['train.train']['seconds']:.4g} -> "
+        f"{one['results']['train.train']['seconds']:.4g} (+50%)"
+    ]
+    # Results missing from the current run are not counted as regressions
+    del one["results"]["train.train"]
+    assert compare(one, baseline, DEFAULT_TOLERANCE) == []
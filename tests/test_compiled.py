@@ -0,0 +1,124 @@
+from pathlib import Path
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from xgboost import XGBRegressor
+
+from src.etl.predict import FEATURES
+from src.models import compiled as compiled_module
+from src.models.compiled import CompiledEnsemble, _tree_depth
+from src.models.sharded import ShardedModel
+
+ROOT = Path(__file__).resolve().parents[1]
+REGION = FEATURES.index("region_encoded")
+
+
+@pytest.fixture(scope="module")
+def model():
+    return joblib.load(ROOT / "src/models/saved/edupredict_v1.pkl")
+
+
+@pytest.fixture(scope="module")
+def rows():
+    df = pd.read_csv(ROOT / "data/processed/enrollment_ml_ready.csv")
+    return df[FEATURES].to_numpy(dtype=np.float32), df["enrollment_total"].to_numpy(dtype=np.float32)
+
+
+def with_missing(X: np.ndarray, share: float = 0.3, seed: int = 0) -> np.ndarray:
+    X = X.copy()
+    X[np.random.default_rng(seed).random(X.shape) < share] = np.nan
+    return X
+
+
+def test_matches_booster_on_real_rows(model, rows):
+    X, _ = rows
+    np.testing.assert_array_equal(CompiledEnsemble.from_model(model).predict(X), model.predict(X))
+
+
+def test_matches_booster_on_missing_features(model, rows):
+    X, _ = rows
+    # The real rows already lack some lags; blank out more so every feature takes its default branch
+    assert np.isnan(X).any()
+    X = with_missing(X[:2000])
+    compiled = CompiledEnsemble.from_model(model)
+    assert compiled.default_left.any() and not compiled.default_left.all()
+    np.testing.assert_array_equal(compiled.predict(X), model.predict(X))
+    all_missing = np.full((3, len(FEATURES)), np.nan, dtype=np.float32)
+    np.testing.assert_array_equal(compiled.predict(all_missing), model.predict(all_missing))
+
+
+def test_single_row(model, rows):
+    X, _ = rows
+    compiled = CompiledEnsemble.from_model(model)
+    for row in X[:20]:
+        np.testing.assert_array_equal(compiled.predict(row), model.predict(row[None]))
+
+
+def test_large_batches_are_walked_in_blocks(model, rows, monkeypatch):
+    X, _ = rows
+    compiled = CompiledEnsemble.from_model(model)
+    expected = compiled.predict(X)
+    # Blocks of 3 rows, leaving a ragged last block
+    monkeypatch.setattr(compiled_module, "MAX_BLOCK_NODES", 3 * compiled.n_trees + 1)
+    np.testing.assert_array_equal(compiled.predict(X), expected)
+
+
+def test_tree_depth_does_not_rely_on_node_order():
+    # 0 -> (3, 4), 3 -> (1, 2), 1 -> (5, 6): node 1 is a child of node 3
+    left = np.array([3, 5, -1, 1, -1, -1, -1])
+    right = np.array([4, 6, -1, 2, -1, -1, -1])
+    assert _tree_depth(left, right) == 3
+    assert _tree_depth(np.array([-1]), np.array([-1])) == 0
+
+
+def test_sharded_model_compiles_to_same_backend(rows):
+    X, y = rows
+    X = X.copy()
+    # Three routing values, the last one unrouted and served by the default shard
+    X[:, REGION] = np.arange(len(X)) % 3
+    models = {
+        name: XGBRegressor(n_estimators=30, max_depth=4, random_state=0).fit(X[X[:, REGION] == value], y[X[:, REGION] == value])
+        for name, value in [("a", 0), ("b", 1)]
+    }
+    sharded = ShardedModel(models, routes={0: "a", 1: "b"}, default="b", column=REGION)
+    compiled = sharded.map(CompiledEnsemble.from_model)
+    assert all(isinstance(m, CompiledEnsemble) for m in compiled.models.values())
+
+    for batch in (X, with_missing(X), X[X[:, REGION] == 0]):
+        np.testing.assert_array_equal(compiled.predict(batch), sharded.predict(batch))
+
+
+def test_snapshot_shares_compiled_models(model, rows, tmp_path, monkeypatch):
+    from src.etl import snapshot
+    from src.etl.base_state import BaseState, latest_rows
+
+    monkeypatch.setattr(snapshot, "SNAPSHOT_DIR", tmp_path)
+    X, _ = rows
+    state = BaseState.from_frame(latest_rows(pd.read_csv(ROOT / "data/processed/enrollment_ml_ready.csv")))
+    compiled = CompiledEnsemble.from_model(model)
+    bundle = ShardedModel({"a": compiled, "b": compiled}, routes={0.0: "a"}, default="b", column=REGION)
+
+    for i, shared in enumerate([compiled, bundle]):
+        key = (f"{i:016d}", "data", "config")
+        snapshot.publish(key, state, np.zeros((len(state), 1)), {}, shared)
+        attached = snapshot.attach(key)[3]
+        nodes = attached if isinstance(attached, CompiledEnsemble) else attached.models["a"]
+        assert isinstance(nodes.feature, np.memmap)
+        np.testing.assert_array_equal(attached.predict(X), model.predict(X))
+
+    # A pickled booster cannot be rebuilt from arrays, so attached workers load their own
+    snapshot.publish(("2" * 16, "data", "config"), state, np.zeros((len(state), 1)), {}, model)
+    assert snapshot.attach(("2" * 16, "data", "config"))[3] is None
+
+
+def test_load_compiles_the_current_registered_model(model, rows, tmp_path, monkeypatch):
+    from src.models import registry
+
+    monkeypatch.setattr(registry, "REGISTRY_DIR", tmp_path)
+    monkeypatch.setattr(registry, "CURRENT_PATH", tmp_path / "CURRENT")
+    X, y = rows
+    retrained = XGBRegressor(n_estimators=10, max_depth=3, random_state=0).fit(X, y)
+    registry.register(retrained, {})
+    np.testing.assert_array_equal(CompiledEnsemble.load().predict(X), retrained.predict(X))
+    np.testing.assert_array_equal(CompiledEnsemble.load(registry.LEGACY_MODEL_PATH).predict(X), model.predict(X))
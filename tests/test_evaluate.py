@@ -0,0 +1,89 @@
+from pathlib import Path
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.etl.base_state import BASE_COLUMNS
+from src.models import evaluate
+from src.models.train import TRAIN_END, VAL_END
+
+ROOT = Path(__file__).resolve().parents[1]
+YEARS = range(2014, 2024)
+
+
+@pytest.fixture(scope="module")
+def model():
+    return joblib.load(ROOT / "src/models/saved/edupredict_v1.pkl")
+
+
+@pytest.fixture(scope="module")
+def panel():
+    rng = np.random.default_rng(0)
+    rows = []
+    for i, (code, region) in enumerate([("AA", "Europe"), ("BB", "Africa"), ("CC", "Asia")]):
+        for year in YEARS:
+            rows.append({
+                "country_code": code, "country_name": f"Country {code}", "region": region, "year": year,
+                # Distinct per country and year, so a misaligned lookup cannot match by accident
+                "enrollment_total": 1e6 * (i + 1) + 1e3 * (year - 2000),
+                "gdp_per_capita_log": np.log1p(5000 * (i + 1)), "edu_expenditure_lag1": 4.0 + rng.random(),
+                "population_school_age": 4e6 * (i + 1), "region_encoded": i,
+            })
+    df = pd.DataFrame(rows)
+    # Gaps: no recorded enrollment for BB in 2017 and 2020, and CC's expenditure goes unreported in 2022
+    df.loc[(df["country_code"] == "BB") & df["year"].isin([2017, 2020]), "enrollment_total"] = np.nan
+    df.loc[(df["country_code"] == "CC") & (df["year"] == 2022), "edu_expenditure_lag1"] = np.nan
+    return df[[c for c in BASE_COLUMNS if c in df.columns]]
+
+
+def test_forecasts_are_scored_against_the_target_year(model, panel):
+    scenarios = {"baseline": {"gdp_growth": 0.02, "edu_adj": 0.0}, "high": {"gdp_growth": 0.05, "edu_adj": 0.5}}
+    errors = evaluate.backtest(model, panel, scenarios, steps=5)
+
+    recorded = panel.set_index(["country_code", "year"])["enrollment_total"]
+    assert (errors["forecast_year"] == errors["origin"] + errors["horizon"]).all()
+    expected = recorded.loc[list(zip(errors["country_code"], errors["forecast_year"]))].to_numpy()
+    np.testing.assert_array_equal(errors["actual"].to_numpy(), expected)
+    assert errors["actual"].notna().all() and errors["horizon"].between(1, 5).all()
+
+    # Origins without a recorded enrollment seed nothing; the last year has nothing left to score
+    origins = errors[["country_code", "origin"]].drop_duplicates()
+    assert not origins.isin({"country_code": ["BB"], "origin": [2017, 2020]}).all(axis=1).any()
+    assert errors["origin"].max() == max(YEARS) - 1
+
+    split = np.select([errors["forecast_year"] <= TRAIN_END, errors["forecast_year"] <= VAL_END],
+                      ["train", "validation"], "test")
+    assert (errors["split"] == split).all() and set(split) == {"train", "validation", "test"}
+
+    # Both scenarios score the same forecasts, each with its own paths
+    per_scenario = [g.drop(columns=["scenario", "predicted"]).reset_index(drop=True) for _, g in errors.groupby("scenario")]
+    pd.testing.assert_frame_equal(*per_scenario)
+    assert (errors["predicted"] > 0).all()
+
+
+def test_parallel_backtest_matches_serial(model, panel):
+    serial = evaluate.backtest(model, panel, steps=4)
+    parallel = evaluate.backtest(model, panel, steps=4, workers=3)
+    pd.testing.assert_frame_equal(parallel, serial)
+
+
+def test_summarize_metrics():
+    errors = pd.DataFrame({
+        "horizon": [1, 1, 1, 2, 2],
+        "actual": [100.0, 200.0, 0.0, 50.0, 50.0],
+        "predicted": [110.0, 170.0, 10.0, 50.0, 40.0],
+    })
+    summary = evaluate.summarize(errors, ["horizon"]).set_index("horizon")
+
+    # h=1 errors 10, -30, 10; the zero actual has no APE
+    assert summary.loc[1, "n"] == 3
+    assert summary.loc[1, "rmse"] == pytest.approx(np.sqrt((100 + 900 + 100) / 3))
+    assert summary.loc[1, "mae"] == pytest.approx(50 / 3)
+    assert summary.loc[1, "mdape"] == pytest.approx((0.10 + 0.15) / 2)
+    assert summary.loc[1, "wape"] == pytest.approx(50 / 300)
+    assert summary.loc[1, "bias"] == pytest.approx(-10 / 3)
+    # h=2 errors 0, -10
+    assert summary.loc[2, ["n", "rmse", "mae", "mdape", "wape", "bias"]].tolist() == pytest.approx(
+        [2, np.sqrt(50), 5, 0.1, 0.1, -5])
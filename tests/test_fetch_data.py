@@ -0,0 +1,143 @@
+import json
+import threading
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import fetch_data
+
+PAGES = 2
+COUNTRIES = [("US", "United States", "USA"), ("FR", "France", "FRA"), ("IN", "India", "IND")]
+YEARS = range(2018, 2024)
+
+
+def page_body(code: str, page: int, scale: float = 1.0) -> list:
+    """One recorded page: every country for half of the years, in the World Bank API layout."""
+    years = list(YEARS)[page - 1::PAGES]
+    items = [
+        {"country": {"id": cid, "value": name}, "countryiso3code": iso3, "date": str(year),
+         "value": scale * (len(code) * 1000 + i * 100 + year)}
+        for i, (cid, name, iso3) in enumerate(COUNTRIES) for year in years
+    ]
+    return [{"page": page, "pages": PAGES, "per_page": fetch_data.PER_PAGE, "total": PAGES * len(items)}, items]
+
+
+class StubServer(ThreadingHTTPServer):
+    """Replays page_body() for every indicator, with scripted failures and ETag revalidation."""
+
+    def __init__(self, scale: float = 1.0):
+        super().__init__(("127.0.0.1", 0), ReplayHandler)
+        self.scale = scale
+        self.failures = {}      # (code, page) -> number of 503s left; -1 fails forever
+        self.requests = []      # (code, page, status)
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def statuses(self) -> Counter:
+        return Counter(status for *_, status in self.requests)
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        url = urlparse(self.path)
+        code = url.path.rsplit("/", 1)[-1]
+        page = int(parse_qs(url.query)["page"][0])
+        body = json.dumps(page_body(code, page, self.server.scale)).encode()
+        etag = f'"{code}-{page}-{self.server.scale}"'
+
+        with self.server.lock:
+            left = self.server.failures.get((code, page), 0)
+            if left:
+                self.server.failures[(code, page)] = left - 1 if left > 0 else left
+            status = 503 if left else 304 if self.headers.get("If-None-Match") == etag else 200
+            self.server.requests.append((code, page, status))
+
+        self.send_response(status)
+        if status == 200:
+            self.send_header("ETag", etag)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if status == 200:
+            self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub(monkeypatch, tmp_path):
+    monkeypatch.setattr(fetch_data, "CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(fetch_data, "BACKOFF_SECONDS", 0)
+    servers = []
+
+    def start(scale: float = 1.0) -> StubServer:
+        server = StubServer(scale)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def test_fetches_every_page_of_every_indicator(stub):
+    server = stub()
+    combined = fetch_data.fetch_all(server.base_url, workers=4)
+    assert len(server.requests) == len(fetch_data.INDICATORS) * PAGES
+    assert len(combined) == len(COUNTRIES) * len(YEARS)
+    assert set(fetch_data.INDICATORS.values()) <= set(combined.columns)
+    assert combined[list(fetch_data.INDICATORS.values())].notna().all().all()
+
+
+def test_retries_503(stub):
+    server = stub()
+    server.failures[("SP.POP.TOTL", 1)] = 2
+    combined = fetch_data.fetch_all(server.base_url, workers=4)
+    assert [s for c, p, s in server.requests if (c, p) == ("SP.POP.TOTL", 1)] == [503, 503, 200]
+    assert combined["population_total"].notna().all()
+
+
+def test_revalidation_reuses_cached_body(stub):
+    server = stub()
+    first = fetch_data.fetch_all(server.base_url, workers=4)
+    server.requests.clear()
+    # Within CACHE_MAX_AGE no request is made at all
+    fetch_data.fetch_all(server.base_url, workers=4)
+    assert server.requests == []
+
+    revalidated = fetch_data.fetch_all(server.base_url, workers=4, max_age=0)
+    assert server.statuses() == {304: len(fetch_data.INDICATORS) * PAGES}
+    assert revalidated.equals(first)
+
+
+def test_interrupted_fetch_resumes_from_cache(stub):
+    server = stub()
+    server.failures[("SE.ADT.LITR.ZS", 1)] = -1
+    with pytest.raises(RuntimeError, match="SE.ADT.LITR.ZS page 1"):
+        fetch_data.fetch_all(server.base_url, workers=4)
+    fetched = {(c, p) for c, p, s in server.requests if s == 200}
+    assert fetched
+
+    server.failures.clear()
+    server.requests.clear()
+    resumed = fetch_data.fetch_all(server.base_url, workers=4)
+    requested = {(c, p) for c, p, _ in server.requests}
+    assert ("SE.ADT.LITR.ZS", 1) in requested
+    assert not requested & fetched
+    assert resumed["literacy_rate"].notna().all()
+
+
+def test_cache_is_keyed_on_the_api_root(stub):
+    recorded, other = stub(), stub(scale=2.0)
+    first = fetch_data.fetch_all(recorded.base_url, workers=4)
+    second = fetch_data.fetch_all(other.base_url, workers=4)
+    assert len(other.requests) == len(fetch_data.INDICATORS) * PAGES
+    assert (second["population_total"] == 2 * first["population_total"]).all()
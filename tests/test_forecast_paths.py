@@ -0,0 +1,94 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.etl import forecast_paths, predict, telemetry
+from src.etl.forecast_paths import PathWriter, long_columns
+
+ROOT = Path(__file__).resolve().parents[1]
+CODES = np.array(["AAA", "BBB", "CCC", "DDD", "EEE"])
+NAMES = np.array(["Alpha", "Beta", "Gamma", "Delta", "Epsilon"])
+REGIONS = np.array(["North", "South", "North", "East", "South"])
+SCENARIOS = ["baseline", "optimistic", "pessimistic"]
+HORIZONS = [5, 10, 15]
+STEPS = 15
+
+
+@pytest.fixture
+def arrays():
+    rng = np.random.default_rng(1)
+    paths = rng.uniform(1e4, 1e8, (len(CODES), len(SCENARIOS), STEPS))
+    return paths, paths * rng.uniform(0.8, 1.0, paths.shape), paths * rng.uniform(1.0, 1.2, paths.shape)
+
+
+def write_store(directory: Path, arrays, chunks=(2, 5)) -> PathWriter:
+    paths, lower, upper = arrays
+    with PathWriter(directory, CODES, NAMES, REGIONS, SCENARIOS, STEPS, model_version="v1.2.3",
+                    base_year=2024, horizons=HORIZONS) as writer:
+        for start, stop in zip((0, *chunks), chunks):
+            writer.write(paths[start:stop], lower[start:stop], upper[start:stop])
+    return writer
+
+
+def test_read_round_trips_written_paths(tmp_path, arrays):
+    write_store(tmp_path, arrays)
+    stored = forecast_paths.read(tmp_path)
+    assert stored.codes.tolist() == CODES.tolist() and stored.regions.tolist() == REGIONS.tolist()
+    assert stored.manifest["countries"] == len(CODES) and stored.scenarios == SCENARIOS
+    for got, expected in zip((stored.predicted, stored.lower, stored.upper), arrays):
+        np.testing.assert_array_equal(got, np.round(expected).astype(np.int64))
+
+    # Only the requested partitions and countries are read
+    subset = forecast_paths.read(tmp_path, ["pessimistic"], codes=["DDD", "BBB"])
+    assert subset.codes.tolist() == ["BBB", "DDD"] and subset.scenarios == ["pessimistic"]
+    np.testing.assert_array_equal(subset.upper[:, 0], stored.upper[[1, 3], 2])
+
+
+def test_frames_follow_the_forecast_output_layout(tmp_path, arrays):
+    write_store(tmp_path, arrays)
+    frame = forecast_paths.read(tmp_path).to_frame()
+    expected = pd.DataFrame(long_columns(CODES, NAMES, REGIONS, SCENARIOS, 2024, HORIZONS, "v1.2.3", *arrays))
+    pd.testing.assert_frame_equal(frame, expected)
+    assert len(frame) == len(CODES) * len(SCENARIOS) * sum(HORIZONS)
+
+    # Per (country, scenario): horizon 5 lists 2025-2029, then horizon 10 restarts at 2025
+    block = frame[(frame["country_code"] == "CCC") & (frame["scenario"] == "optimistic")]
+    assert block["forecast_year"].tolist() == [*range(2025, 2030), *range(2025, 2035), *range(2025, 2040)]
+    assert block["horizon"].tolist() == [5] * 5 + [10] * 10 + [15] * 15
+    np.testing.assert_array_equal(block["predicted_enrollment"].to_numpy()[5:15], np.round(arrays[0][2, 1, :10]))
+
+    one = forecast_paths.read(tmp_path).horizon(10, "baseline")
+    pd.testing.assert_frame_equal(one.reset_index(drop=True), frame[(frame["horizon"] == 10)
+                                  & (frame["scenario"] == "baseline")].reset_index(drop=True))
+
+
+def test_interrupted_write_keeps_the_previous_store(tmp_path, arrays):
+    write_store(tmp_path, arrays)
+    before = forecast_paths.read(tmp_path).to_frame()
+    paths, lower, upper = (a * 2 for a in arrays)
+    with PathWriter(tmp_path, CODES, NAMES, REGIONS, SCENARIOS, STEPS, model_version="v9", base_year=2024,
+                    horizons=HORIZONS) as writer:
+        writer.write(paths[:2], lower[:2], upper[:2])
+    pd.testing.assert_frame_equal(forecast_paths.read(tmp_path).to_frame(), before)
+    assert not list(tmp_path.rglob(".*.tmp"))
+
+
+def test_compact_run_exports_the_legacy_output(tmp_path, monkeypatch):
+    monkeypatch.chdir(ROOT)
+    monkeypatch.setattr(telemetry, "REPORT_DIR", tmp_path / "reports")
+    monkeypatch.setattr(predict, "FORECAST_DIR", tmp_path / "forecasts")
+    outputs = {}
+    for compact in (False, True):
+        out = tmp_path / ("compact" if compact else "legacy")
+        out.mkdir()
+        monkeypatch.setattr(predict, "FORECAST_PATH", out / "forecast_output.parquet")
+        monkeypatch.setattr(predict, "FORECAST_CSV_PATH", out / "forecast_output.csv")
+        predict.run(n_paths=100, compact=compact)
+        outputs[compact] = out
+
+    legacy, compact = outputs[False], outputs[True]
+    pd.testing.assert_frame_equal(pd.read_parquet(compact / "forecast_output.parquet"),
+                                  pd.read_parquet(legacy / "forecast_output.parquet"))
+    assert (compact / "forecast_output.csv").read_bytes() == (legacy / "forecast_output.csv").read_bytes()
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.etl import forecast_paths
+from src.etl.forecast_store import ForecastStore, format_thousands
+from src.etl.storage import FORECAST_SCHEMA, write_table
+
+CODES = ["AAA", "BBB", "CCC", "DDD"]
+NAMES = ["Alpha", "Beta", "Gamma", "Delta"]
+REGIONS = ["North", "South", "North", "East"]
+SCENARIOS = ["baseline", "optimistic", "pessimistic"]
+STEPS = 15
+
+
+@pytest.fixture(scope="module")
+def stores(tmp_path_factory):
+    """The same forecasts as a compact store, forecast_output.parquet and an in-memory CSV table."""
+    directory = tmp_path_factory.mktemp("forecasts")
+    rng = np.random.default_rng(0)
+    paths = rng.uniform(1e5, 1e7, (len(CODES), len(SCENARIOS), STEPS))
+    with forecast_paths.PathWriter(directory, CODES, NAMES, REGIONS, SCENARIOS, STEPS,
+                                   model_version="v1.2.3", base_year=2024, horizons=[5, 10, 15]) as writer:
+        writer.write(paths[:3], paths[:3] * 0.9, paths[:3] * 1.1)
+        writer.write(paths[3:], paths[3:] * 0.9, paths[3:] * 1.1)
+    parquet = directory / "forecast_output.parquet"
+    frame = forecast_paths.read(directory).to_frame()
+    write_table(frame, parquet, FORECAST_SCHEMA)
+    return {
+        "compact": ForecastStore.from_paths(directory),
+        "parquet": ForecastStore.from_parquet(parquet),
+        "frame": ForecastStore.from_frame(frame),
+    }
+
+
+@pytest.mark.parametrize("source", ["compact", "parquet", "frame"])
+def test_sources_agree(stores, source):
+    store, reference = stores[source], stores["frame"]
+    assert store.regions == ["East", "North", "South"]
+    assert store.countries(["North", "East"]) == ["Alpha", "Delta", "Gamma"]
+    assert store.scenarios == SCENARIOS and store.horizons == [5, 10, 15]
+    for country, horizon, scenario in [("Beta", 10, None), ("Delta", 5, "pessimistic"), ("Alpha", 15, "baseline")]:
+        got = store.select(country, horizon, scenario)
+        expected = reference.select(country, horizon, scenario)
+        assert len(got) == horizon * (1 if scenario else len(SCENARIOS))
+        assert got["forecast_year"].tolist()[:horizon] == list(range(2025, 2025 + horizon))
+        pd.testing.assert_frame_equal(got.astype(str), expected.astype(str))
+    assert store.select("Nowhere", 10).empty
+
+
+def test_compact_store_reads_only_the_selected_country(stores, monkeypatch):
+    read = []
+    original = forecast_paths.read
+    monkeypatch.setattr(forecast_paths, "read", lambda *args, **kwargs: read.append(kwargs) or original(*args, **kwargs))
+    stores["compact"].select("Gamma", 5, "optimistic")
+    assert read == [{"codes": ["CCC"]}]
+
+
+def test_format_thousands():
+    values = pd.Series([1234567.4, -9876.5, 0.2, np.nan, 999.5])
+    assert format_thousands(values).tolist() == ["1,234,567", "-9,876", "0", "", "1,000"]
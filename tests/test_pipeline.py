@@ -0,0 +1,124 @@
+import json
+
+import pandas as pd
+import pytest
+
+from benchmarks.synthetic import synthetic_raw
+from src.etl import pipeline, telemetry
+from src.etl.preprocessing import clean_stats
+from src.etl.storage import PROCESSED_SCHEMA, apply_schema
+
+# 100x the World Bank panel: 256 countries with about 28 years each
+COUNTRIES = 100 * 256
+YEARS = 28
+
+
+@pytest.fixture(scope="module")
+def raw() -> pd.DataFrame:
+    return synthetic_raw(COUNTRIES, YEARS)
+
+
+@pytest.fixture(scope="module")
+def serial(raw) -> pd.DataFrame:
+    return pipeline.transform(raw.copy())
+
+
+@pytest.fixture
+def partition_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "PARTITION_CACHE_PATH", tmp_path / "partition_cache.parquet")
+    monkeypatch.setattr(pipeline, "MANIFEST_PATH", tmp_path / "partition_manifest.json")
+
+
+def test_parallel_transform_matches_serial(raw, serial):
+    pd.testing.assert_frame_equal(pipeline.transform(raw.copy(), workers=3), serial)
+
+
+def test_shards_hold_whole_countries(raw):
+    shards = pipeline.shard_by_country(raw, 3)
+    assert sum(len(s) for s in shards) == len(raw)
+    codes = [set(s["country_code"]) for s in shards]
+    assert all(not (a & b) for i, a in enumerate(codes) for b in codes[i + 1:])
+
+
+def test_incremental_build_matches_full_rebuild(raw, serial, partition_cache, monkeypatch):
+    expected = serial.reset_index(drop=True)
+    pd.testing.assert_frame_equal(pipeline.build_incremental(raw.copy()), expected)
+
+    # One new year for one country moves the enrollment cap. Its GDP is missing, so no
+    # regional median moves, and only that country and those with rows above the cap recompute
+    new_year = raw[raw["country_code"] == "C00007"].tail(1).assign(year=lambda d: d["year"] + 1,
+                                                                   gdp_per_capita_usd=float("nan"))
+    updated = pd.concat([raw, new_year], ignore_index=True)
+    cap = min(clean_stats(raw)["enrollment_cap"], clean_stats(updated)["enrollment_cap"])
+    affected = set(raw.loc[raw["enrollment_total"] > cap, "country_code"]) | {"C00007"}
+
+    transformed = []
+    transform = pipeline.transform
+
+    def recording_transform(df, *args, **kwargs):
+        transformed.append(set(df["country_code"]))
+        return transform(df, *args, **kwargs)
+
+    monkeypatch.setattr(pipeline, "transform", recording_transform)
+    result = pipeline.build_incremental(updated.copy())
+    pd.testing.assert_frame_equal(result, transform(updated.copy()).reset_index(drop=True))
+    assert transformed == [affected]
+    assert len(affected) < COUNTRIES // 10
+
+
+def test_stream_transform_matches_transform(raw, serial, tmp_path):
+    raw_path, out_path = tmp_path / "raw.csv", tmp_path / "processed.parquet"
+    raw.to_csv(raw_path, index=False)
+    rows = pipeline.stream_transform(raw_path, out_path, chunksize=100_000)
+
+    streamed = pd.read_parquet(out_path)
+    expected = apply_schema(serial, PROCESSED_SCHEMA).reset_index(drop=True)
+    assert rows == len(expected)
+    # Chunks are written with their own category dictionaries
+    pd.testing.assert_frame_equal(streamed, expected, check_categorical=False)
+
+
+@pytest.mark.parametrize("chunksize", [1, 2, 7])
+def test_stream_transform_small_chunks(tmp_path, chunksize):
+    # With tiny chunks the first ones produce no rows: every row is carried into the next chunk
+    raw = synthetic_raw(5, 6)
+    raw_path, out_path = tmp_path / "raw.csv", tmp_path / "processed.parquet"
+    raw.to_csv(raw_path, index=False)
+    pipeline.stream_transform(raw_path, out_path, tmp_path / "processed.csv", chunksize=chunksize)
+
+    expected = apply_schema(pipeline.transform(raw.copy()), PROCESSED_SCHEMA).reset_index(drop=True)
+    pd.testing.assert_frame_equal(pd.read_parquet(out_path), expected, check_categorical=False)
+    assert len(pd.read_csv(tmp_path / "processed.csv")) == len(expected)
+
+
+def test_stream_clean_stats_matches_clean_stats(raw, tmp_path):
+    path = tmp_path / "raw.csv"
+    sample = raw.head(50_000).copy()
+    sample.loc[sample.index[::7], "enrollment_total"] = float("nan")
+    sample.to_csv(path, index=False)
+
+    streamed = pipeline.stream_clean_stats(path, chunksize=5_000)
+    expected = clean_stats(pipeline.standardise_columns(pd.read_csv(path)))
+    assert streamed["enrollment_cap"] == expected["enrollment_cap"]
+    pd.testing.assert_series_equal(pd.Series(streamed["gdp_median"]), pd.Series(expected["gdp_median"]), check_exact=True)
+
+
+def test_transform_leaves_its_input_unchanged():
+    # Already sorted with every target present, so the chain takes no rows and works on a shallow copy
+    raw = synthetic_raw(20, 8).sort_values(["country_code", "year"], ignore_index=True)
+    raw = raw[raw["enrollment_total"].notna()].reset_index(drop=True)
+    before = raw.copy()
+    out = pipeline.transform(raw)
+    pd.testing.assert_frame_equal(raw, before)
+    assert "enrollment_lag1" in out.columns and "enrollment_lag1" not in raw.columns
+
+
+@pytest.mark.skipif(not telemetry.reset_peak_rss(), reason="needs a resettable VmHWM (Linux)")
+def test_run_report_records_chain_memory_multiple(raw, tmp_path):
+    path = tmp_path / "report.json"
+    with telemetry.run_report("etl", path=path):
+        pipeline.transform(raw.copy())
+    spans = {s["name"]: s for s in json.loads(path.read_text())["spans"]}
+    chain = spans["etl.chain.clean+features"]
+    assert chain["memory_measure"] == "rss"
+    assert chain["input_mb"] > 0 and chain["memory_multiple"] >= 0
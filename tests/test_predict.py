@@ -0,0 +1,70 @@
+from pathlib import Path
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.etl import predict
+from src.etl.base_state import BaseState, latest_rows
+from src.etl.predict import SCENARIOS, Residuals
+
+ROOT = Path(__file__).resolve().parents[1]
+STEPS = 15
+N_PATHS = 200
+
+
+@pytest.fixture(scope="module")
+def model():
+    return joblib.load(ROOT / "src/models/saved/edupredict_v1.pkl")
+
+
+@pytest.fixture(scope="module")
+def state():
+    df = pd.read_csv(ROOT / "data/processed/enrollment_ml_ready.csv")
+    return BaseState.from_frame(latest_rows(df))
+
+
+@pytest.fixture(scope="module")
+def residuals():
+    rng = np.random.default_rng(0)
+    predictions = np.exp(rng.uniform(np.log(1e4), np.log(1e8), 400))
+    # Small countries get much larger relative errors than large ones
+    residuals = rng.normal(0, np.where(predictions < 1e6, 0.2, 0.02))
+    return Residuals.from_validation(residuals, predictions)
+
+
+def test_residuals_are_binned_by_prediction_size():
+    predictions = np.array([1e3, 2e3, 1e5, 2e5, 1e7, 2e7, 1e9, 2e9])
+    residuals = np.arange(8.0)
+    binned = Residuals.from_validation(residuals, predictions, n_bins=4)
+    assert binned.counts.tolist() == [2, 2, 2, 2]
+    assert binned.starts.tolist() == [0, 2, 4, 6]
+
+    # A prediction draws only the residuals of predictions of its own size
+    rng = np.random.default_rng(0)
+    for pred, expected in [(1.5e3, {0, 1}), (1.5e5, {2, 3}), (1.5e9, {6, 7}), (0.0, {0, 1})]:
+        assert set(binned.draw(np.full(200, pred), rng).tolist()) == expected
+
+
+def test_intervals_contain_the_point_forecast(state, model, residuals):
+    positions = np.arange(0, len(state), 9)
+    point = predict.project_batch(state, model, SCENARIOS, STEPS)[positions]
+    lower, upper = predict.simulate_intervals(state, model, SCENARIOS, STEPS, residuals, N_PATHS, positions)
+
+    assert lower.shape == upper.shape == point.shape
+    assert (lower <= point).all() and (point <= upper).all()
+    # Simulated noise gives a real interval, not the point forecast again
+    assert (upper - lower > 0).mean() > 0.99
+    # Uncertainty compounds over the horizon
+    width = (upper - lower) / point
+    assert np.median(width[..., -1]) > np.median(width[..., 0])
+
+
+def test_request_intervals_match_batch_simulation(state, model, residuals):
+    requests = [(3, SCENARIOS["optimistic"], N_PATHS), (11, SCENARIOS["baseline"], 2 * N_PATHS)]
+    bounds = predict.simulate_requests(state, model, requests, STEPS, residuals)
+    for (pos, scenario, n_paths), (lower, upper) in zip(requests, bounds):
+        expected = predict.simulate_intervals(state, model, {"s": scenario}, STEPS, residuals, n_paths, [pos])
+        np.testing.assert_allclose(lower, expected[0][0, 0])
+        np.testing.assert_allclose(upper, expected[1][0, 0])
+        assert (lower <= upper).all()
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from src.models import registry
+
+
+@pytest.fixture
+def scratch(tmp_path, monkeypatch):
+    legacy = tmp_path / "saved" / "edupredict_v1.pkl"
+    legacy.parent.mkdir()
+    legacy.write_bytes(b"legacy model")
+    monkeypatch.setattr(registry, "REGISTRY_DIR", tmp_path / "registry")
+    monkeypatch.setattr(registry, "CURRENT_PATH", tmp_path / "registry" / "CURRENT")
+    monkeypatch.setattr(registry, "LEGACY_MODEL_PATH", legacy)
+    return legacy
+
+
+def test_unregistered_registry_serves_the_legacy_model(scratch):
+    assert registry.versions() == [] and registry.current_version() is None
+    assert registry.resolve() == (scratch, {"version": registry.LEGACY_VERSION, "hash": registry.file_hash(scratch)})
+
+
+def test_promote_and_rollback(scratch):
+    first = registry.register({"trees": 1}, {"metrics": [1.0]})
+    second = registry.register({"trees": 2}, {"metrics": [2.0]}, promote=False)
+
+    # The legacy artifact is adopted first, and versions count up from it
+    assert registry.versions() == [registry.LEGACY_VERSION, "v1.2.1", "v1.2.2"]
+    assert (first, second) == ("v1.2.1", "v1.2.2")
+    assert registry.current_version() == first
+
+    registry.promote_version(second)
+    path, metadata = registry.resolve()
+    assert metadata["version"] == second and metadata["hash"] == registry.file_hash(path)
+    assert metadata["metrics"] == [2.0]
+
+    # Rolling back to the legacy version keeps serving the adopted copy whatever happens to the original
+    registry.promote_version(registry.LEGACY_VERSION)
+    scratch.write_bytes(b"overwritten by a retrain")
+    path, metadata = registry.resolve()
+    assert path.read_bytes() == b"legacy model"
+    assert metadata["hash"] == registry.file_hash(path)
+
+    with pytest.raises(ValueError, match="Unknown model version"):
+        registry.promote_version("v9.9.9")
+    assert registry.current_version() == registry.LEGACY_VERSION
+    with pytest.raises(ValueError, match="already registered"):
+        registry.register({"trees": 3}, {}, version=second)
+    assert json.loads((registry.REGISTRY_DIR / second / "metadata.json").read_text())["metrics"] == [2.0]
@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+from loguru import logger
+
+from src.etl import storage
+from src.etl.storage import PROCESSED_SCHEMA, load_processed, read_table, write_table
+
+ROOT = Path(__file__).resolve().parents[1]
+COLUMNS = ["country_code", "region", "year", "region_encoded", "enrollment_total", "enrollment_lag1"]
+
+
+@pytest.fixture
+def processed(monkeypatch):
+    monkeypatch.chdir(ROOT)
+    return pd.read_csv(storage.PROCESSED_CSV_PATH)
+
+
+@pytest.fixture
+def warnings():
+    messages = []
+    sink = logger.add(messages.append, level="WARNING", format="{message}")
+    yield messages
+    logger.remove(sink)
+
+
+def test_parquet_round_trip_keeps_the_schema(processed, tmp_path):
+    path = tmp_path / "processed.parquet"
+    write_table(processed, path, PROCESSED_SCHEMA)
+    df = read_table(path, PROCESSED_SCHEMA)
+
+    assert df.columns.tolist() == processed.columns.tolist()
+    for column, dtype in PROCESSED_SCHEMA.items():
+        if column in df.columns:
+            assert str(df[column].dtype) == dtype, column
+    # Counts stay float64, and float32 inputs hold the same values up to rounding
+    assert df["enrollment_total"].dtype == "float64"
+    pd.testing.assert_series_equal(df["enrollment_total"], processed["enrollment_total"])
+    pd.testing.assert_series_equal(df["enrollment_lag1"], processed["enrollment_lag1"], check_dtype=False, rtol=1e-6)
+    assert df["country_code"].astype(str).tolist() == processed["country_code"].tolist()
+
+
+def test_parquet_reads_only_requested_columns(processed, tmp_path, monkeypatch):
+    path = tmp_path / "processed.parquet"
+    write_table(processed, path, PROCESSED_SCHEMA)
+    requested = []
+    read_parquet = pd.read_parquet
+    monkeypatch.setattr(pd, "read_parquet", lambda p, columns=None: requested.append(columns) or read_parquet(p, columns=columns))
+
+    # Columns the file does not have are dropped before reading
+    df = read_table(path, PROCESSED_SCHEMA, [*COLUMNS, "not_a_column"])
+    assert requested == [COLUMNS]
+    assert df.columns.tolist() == COLUMNS and len(df) == len(processed)
+
+
+def test_csv_fallback_matches_parquet(processed, tmp_path, monkeypatch, warnings):
+    # This checkout ships only the CSV, so load_processed takes the fallback
+    assert not storage.PROCESSED_PATH.exists()
+    from_csv = load_processed(COLUMNS)
+    assert warnings == [f"{storage.PROCESSED_PATH} not found, reading {storage.PROCESSED_CSV_PATH} instead\n"]
+
+    path = tmp_path / "processed.parquet"
+    write_table(processed, path, PROCESSED_SCHEMA)
+    monkeypatch.setattr(storage, "PROCESSED_PATH", path)
+    from_parquet = load_processed(COLUMNS)
+    assert from_csv.columns.tolist() == from_parquet.columns.tolist() == COLUMNS
+    assert from_csv.dtypes.astype(str).tolist() == from_parquet.dtypes.astype(str).tolist()
+    pd.testing.assert_frame_equal(from_csv, from_parquet)
+
+
+def test_missing_table_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        read_table(tmp_path / "missing.parquet", PROCESSED_SCHEMA, csv_path=tmp_path / "missing.csv")
@@ -0,0 +1,42 @@
+import json
+import mmap
+
+import numpy as np
+import pytest
+
+from src.etl import telemetry
+from src.etl.telemetry import run_report, span
+
+pytestmark = pytest.mark.skipif(not telemetry.reset_peak_rss(), reason="needs a resettable VmHWM (Linux)")
+
+
+def allocate(mb: int) -> None:
+    # A fresh anonymous mapping: malloc could hand back memory earlier tests freed but kept resident
+    block = mmap.mmap(-1, mb * 2**20)
+    view = np.frombuffer(block, dtype=np.uint8)
+    view[:] = 1
+    del view
+    block.close()
+
+
+def test_span_peaks_do_not_carry_over(tmp_path):
+    path = tmp_path / "report.json"
+    with run_report("memory", path=path):
+        with span("heavy"):
+            allocate(400)
+        with span("light"):
+            pass
+        with span("outer"):
+            with span("inner"):
+                allocate(200)
+            with span("after"):
+                pass
+
+    spans = {s["name"]: s for s in json.loads(path.read_text())["spans"]}
+    heavy, light = spans["memory.heavy"]["peak_rss_mb"], spans["memory.light"]["peak_rss_mb"]
+    assert heavy - light > 300
+    # An enclosing span reports the largest peak of its children, the run the largest overall
+    assert spans["memory.outer"]["peak_rss_mb"] == spans["memory.outer.inner"]["peak_rss_mb"]
+    assert spans["memory.outer.inner"]["peak_rss_mb"] - spans["memory.outer.after"]["peak_rss_mb"] > 150
+    assert spans["memory"]["peak_rss_mb"] == heavy
+    assert spans["memory.light"]["process_peak_rss_mb"] >= heavy
@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+
+from benchmarks.synthetic import synthetic_raw
+from src.etl import pipeline, telemetry
+from src.models import registry, train
+
+REGION = train.FEATURES.index("region_encoded")
+
+
+def test_unseen_regions_use_the_global_model():
+    df = pipeline.transform(synthetic_raw(300, 20))
+    assert df["region_encoded"].value_counts().min() >= train.MIN_SHARD_ROWS
+    model = train.train_sharded(df, {**train.DEFAULT_PARAMS, "n_estimators": 20})
+
+    # Every region is large enough for its own shard, so there is no "rest" shard to fall back on
+    assert "rest" not in model.models
+    assert model.shards()[train.GLOBAL_SHARD] == []
+    X = df[train.FEATURES].fillna(0).to_numpy(dtype=np.float64)
+    X[:, REGION] = 99
+    np.testing.assert_array_equal(model.predict(X), model.models[train.GLOBAL_SHARD].predict(X))
+
+
+def test_cv_folds_roll_forward_inside_the_training_years():
+    years = np.repeat(np.arange(2000, 2024), 3)
+    folds = train.cv_folds(years)
+    assert len(folds) == len(train.CV_ORIGINS)
+    for origin, (fit, val) in zip(train.CV_ORIGINS, folds):
+        assert years[fit].max() == origin and years[fit].min() == years.min()
+        assert sorted(set(years[val])) == list(range(origin + 1, origin + train.CV_WINDOW + 1))
+        assert years[np.concatenate([fit, val])].max() <= train.TRAIN_END
+
+
+def test_tune_fits_the_early_stopped_round_count(monkeypatch):
+    df = pipeline.transform(synthetic_raw(40, 24))
+    monkeypatch.setattr(train, "PARAM_GRID", {**{k: v[:1] for k, v in train.PARAM_GRID.items()}, "learning_rate": [0.5]})
+    monkeypatch.setattr(train, "EARLY_STOPPING_ROUNDS", 5)
+    result = train.tune(df.assign(year=df["year"].astype(int)))
+
+    rounds = [fold["best_iteration"] for fold in result["folds"]]
+    assert [fold["origin"] for fold in result["folds"]] == train.CV_ORIGINS
+    assert max(rounds) + train.EARLY_STOPPING_ROUNDS < train.MAX_ROUNDS
+    assert result["params"]["n_estimators"] == int(round(np.mean(rounds))) + 1
+    assert result["params"]["learning_rate"] == 0.5 and len(result["candidates"]) == 1
+
+
+def test_tuning_is_stored_with_the_registered_version(tmp_path, monkeypatch):
+    df = pipeline.transform(synthetic_raw(40, 24))
+    monkeypatch.setattr(train, "load_data", lambda: df)
+    monkeypatch.setattr(train, "PARAM_GRID", {**{k: v[:1] for k, v in train.PARAM_GRID.items()}, "learning_rate": [0.5]})
+    monkeypatch.setattr(train, "EARLY_STOPPING_ROUNDS", 5)
+    monkeypatch.setattr(telemetry, "REPORT_DIR", tmp_path / "reports")
+    monkeypatch.setattr(registry, "REGISTRY_DIR", tmp_path / "registry")
+    monkeypatch.setattr(registry, "CURRENT_PATH", tmp_path / "registry" / "CURRENT")
+    monkeypatch.setattr(registry, "LEGACY_MODEL_PATH", tmp_path / "missing.pkl")
+
+    tuned = train.run(tune_params=True)
+    plain = train.run()
+    _, metadata = registry.resolve(tuned)
+    tuning = json.loads((registry.REGISTRY_DIR / tuned / metadata["tuning"]).read_text())
+    assert tuning["params"] == metadata["params"]
+    assert "tuning" not in registry.resolve(plain)[1]
+    assert not (registry.REGISTRY_DIR / plain / train.TUNING_FILE).exists()